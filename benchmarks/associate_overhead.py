@@ -0,0 +1,80 @@
+"""Client-side overhead of associate_bulletin per window, with the endpoints stubbed.
+
+    python benchmarks/associate_overhead.py [n_arrivals ...]
+
+The endpoint methods are replaced with cheap local stand-ins. The time spent
+inside them is subtracted from the wall time, so what remains is the loop
+itself: start time stepping, window bookkeeping and collecting origins.
+"""
+import contextlib
+import io
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from randl_client import Randl
+from randl_client.windowing import WindowIndex
+from wire_format import synthetic_bulletin
+
+
+class StubRandl(Randl):
+    # Windows come from a local index. DML, beamsearch and octree return fixed
+    # shapes. Every third window gets a weak beam, so both the next-arrival
+    # step and the 12 minute jump get exercised.
+    def __init__(self, bulletin):
+        Randl.__init__(self)
+        self.index = WindowIndex(bulletin)
+        self.dml = pd.DataFrame({"LAT_ORIG": np.zeros(50), "LON_ORIG": np.zeros(50)})
+        self.stub_time = 0.0
+        self.windows = 0
+
+    @contextlib.contextmanager
+    def _stub(self):
+        t = time.perf_counter()
+        yield
+        self.stub_time += time.perf_counter() - t
+
+    def window_catalog(self, bulletin, config=None):
+        with self._stub():
+            self.windows += 1
+            window = self._config(config).window
+            return self.index.window(window.start, window.length, window.min_phases)
+
+    def dml_prediction(self, window, config=None):
+        return self.dml
+
+    def beamsearch(self, window, dml_predictions, config=None):
+        with self._stub():
+            arids = window["ARID"].tolist()
+            score = 0.5 if arids[0] % 3 == 0 else 0.9
+            return {"used_arids": arids[:8], "score": score, "unscaled_centroid": [0.0, 0.0, 10.0],
+                    "time": window["TIME_ARRIV"].iloc[0]}
+
+    def octree_search(self, bulletin, beam_x, beam_y, beam_z, beam_time, config=None):
+        with self._stub():
+            return {"used_arids": [], "unscaled_loc": [beam_y, beam_x, beam_z], "time": beam_time,
+                    "confidence": 0.9}
+
+
+def bench(n):
+    bulletin = synthetic_bulletin(n)
+    client = StubRandl(bulletin)
+    t = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        origins = client.associate_bulletin(bulletin, verbose=False)
+    wall = time.perf_counter() - t
+    overhead = wall - client.stub_time
+    return {"n_arrivals": n, "windows": client.windows, "origins": len(origins), "wall_s": wall,
+            "stub_s": client.stub_time, "overhead_s": overhead,
+            "overhead_us_per_window": overhead / max(client.windows, 1) * 1e6}
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [100000]
+    results = pd.DataFrame([bench(n) for n in sizes])
+    pd.set_option("display.width", 200)
+    print(results.to_string(index=False, float_format=lambda v: "%.3f" % v))
@@ -0,0 +1,60 @@
+"""Memory and common-operation cost of the string and compact bulletin layouts.
+
+    python benchmarks/bulletin_memory.py [n_arrivals ...]
+
+Prints randl_client.compact.memory_report per size, followed by sort, isin
+filter and window start time parsing on both layouts.
+"""
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from randl_client.compact import compact_bulletin, memory_report
+from randl_client.windowing import arrival_start_times
+from wire_format import synthetic_bulletin
+
+
+def timed(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t)
+    return best
+
+
+def bench(n):
+    bulletin = synthetic_bulletin(n)
+    # station coordinates as a real bulletin carries them, to a few decimals
+    bulletin["LAT_STA"] = bulletin["LAT_STA"].round(4)
+    bulletin["LON_STA"] = bulletin["LON_STA"].round(4)
+    compact = compact_bulletin(bulletin)
+    arids = np.random.default_rng(1).choice(bulletin["ARID"].to_numpy(), n // 10, replace=False)
+
+    rows = []
+    for layout, frame in (("string", bulletin), ("compact", compact)):
+        shuffled = frame.sample(frac=1, random_state=0)
+        rows.append({"n_arrivals": n, "layout": layout,
+                     "MB": frame.memory_usage(deep=True).sum() / 1e6,
+                     "sort_ms": timed(lambda: shuffled.sort_values(by=["TIME_ARRIV"])) * 1000,
+                     "isin_ms": timed(lambda: frame[~frame["ARID"].isin(arids)]) * 1000,
+                     "station_filter_ms": timed(lambda: frame[frame["STA"] == "ST0003"]) * 1000,
+                     "start_times_ms": timed(lambda: arrival_start_times(frame)) * 1000})
+    return memory_report(bulletin), pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [100000, 1000000]
+    pd.set_option("display.width", 200)
+    timings = []
+    for n in sizes:
+        report, rows = bench(n)
+        print("n_arrivals =", n)
+        print(report.to_string(float_format=lambda v: "%.3f" % v))
+        print()
+        timings.append(rows)
+    print(pd.concat(timings, ignore_index=True).to_string(index=False, float_format=lambda v: "%.1f" % v))
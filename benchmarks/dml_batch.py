@@ -0,0 +1,85 @@
+"""DML predictions one window per request vs batched with dml_prediction_batch.
+
+    python benchmarks/dml_batch.py [n_events] [n_workers]
+
+Runs the mock server with a fixed cost per DML request (model loading and
+request overhead, 200 ms) plus 10 ms of inference per window, so batching
+saves the fixed part. Compares, with and without batching:
+  - predictions for the windows of a bulletin, a request per window vs
+    dml_prediction_batch
+  - associate_bulletin with pipeline_depth=4, where the prefetched windows'
+    predictions are batched (batch_dml=True)
+  - associate_bulletin_parallel over daily partitions on n_workers threads,
+    where the partitions' predictions are batched together
+"""
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import mock_server
+import pandas as pd
+from randl_client import Randl
+
+args = ["--latency", "dml_flex_handler=200", "--latency", "window=20", "--latency", "default=10",
+        "--dml-window-ms", "10"]
+
+
+def dml_requests(client):
+    return sum(r.calls for e, r in client.transport.metrics.summary().iterrows() if e.startswith("dml_"))
+
+
+def run(client, label, fn):
+    client.transport.metrics.reset()
+    t = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = fn()
+    return {"case": label, "dml_requests": dml_requests(client), "seconds": time.perf_counter() - t}, result
+
+
+def main(n_events=40, n_workers=8):
+    process, url = mock_server.start(args=args)
+    try:
+        client = Randl()
+        client.url_base = url
+        client.enable_metrics()
+        client.set_bulletin_n_events(n_events)
+        bulletin = client.create_bulletin().sort_values("TIME_ARRIV").reset_index(drop=True)
+        windows = [bulletin.iloc[lo:lo + 60] for lo in range(0, len(bulletin), 60)]
+
+        rows = []
+        row, single = run(client, "windows, one request each", lambda: [client.dml_prediction(w) for w in windows])
+        rows.append(row)
+        row, batched = run(client, "windows, dml_prediction_batch", lambda: client.dml_prediction_batch(windows))
+        row["same"] = all(a.equals(b) for a, b in zip(single, batched))
+        rows.append(row)
+
+        for batch in (False, True):
+            row, origins = run(client, "associate_bulletin, pipelined" + (", batched" if batch else ""),
+                               lambda: client.associate_bulletin(bulletin.copy(), pipeline_depth=4, batch_dml=batch,
+                                                                 verbose=False, metrics_report=False))
+            if batch:
+                row["same"] = origins.equals(serial)
+            serial = origins
+            rows.append(row)
+
+        for batch in (False, True):
+            row, origins = run(client, "parallel, %d threads" % n_workers + (", batched" if batch else ""),
+                               lambda: client.associate_bulletin_parallel(bulletin.copy(), n_workers=n_workers,
+                                                                          batch_dml=batch))
+            if batch:
+                row["same"] = origins.equals(parallel)
+            parallel = origins
+            rows.append(row)
+    finally:
+        process.terminate()
+
+    print("%d events, %d arrivals, %d windows" % (n_events, len(bulletin), len(windows)))
+    print(pd.DataFrame(rows).fillna("").to_string(index=False, float_format=lambda v: "%.2f" % v))
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:3]])
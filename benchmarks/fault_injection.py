@@ -0,0 +1,125 @@
+"""Retry, deadline and circuit breaker behaviour against a fault-injecting stand-in server.
+
+    python benchmarks/fault_injection.py [n_calls]
+
+The stand-in server answers /version and echoes POSTed surrogate inputs back
+as the result. Per request it fails at random with 503 (with Retry-After),
+500, a stall longer than the read timeout, or a dropped connection, in the
+proportions given in FAULTS. One phase has an outage window in which every
+request gets 503. The script prints call outcomes, attempts and circuit
+breaker openings for each scenario.
+"""
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from randl_client import Randl, RandlError
+
+FAULTS = {"503": 0.10, "500": 0.05, "stall": 0.03, "drop": 0.02}
+STATE = {"outage_until": 0.0, "stall": 1.0, "requests": 0}
+
+
+class FaultHandler(BaseHTTPRequestHandler):
+    def log_message(self, *a):
+        pass
+
+    def _send(self, obj, code=200, headers=None):
+        body = json.dumps(obj).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._send({"version": "fault-1"})
+
+    def do_POST(self):
+        raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        STATE["requests"] += 1
+        if time.monotonic() < STATE["outage_until"]:
+            return self._send({"detail": "overloaded"}, 503, {"Retry-After": "0.2"})
+        r = random.random()
+        for fault, p in FAULTS.items():
+            if r < p:
+                break
+            r -= p
+        else:
+            fault = None
+        if fault == "503":
+            return self._send({"detail": "overloaded"}, 503, {"Retry-After": "0.05"})
+        if fault == "500":
+            return self._send({"detail": "internal error"}, 500)
+        if fault == "drop":
+            self.connection.shutdown(socket.SHUT_RDWR)
+            return
+        if fault == "stall":
+            time.sleep(STATE["stall"])
+        try:
+            self._send({"result": json.loads(raw)["inputs"]})
+        except (BrokenPipeError, ConnectionResetError):
+            # the client gave up on a stalled request
+            pass
+
+
+def start():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FaultHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "http://127.0.0.1:%d/randl/" % server.server_address[1]
+
+
+def run(client, n_calls, label):
+    outcomes = Counter()
+    STATE["requests"] = 0
+    t = time.perf_counter()
+    for i in range(n_calls):
+        try:
+            client.taup_surrogate([[float(i)]])
+            outcomes["ok"] += 1
+        except RandlError as e:
+            outcomes[type(e).__name__] += 1
+    breaker = client.transport.breaker
+    print("%-28s %s  requests=%d  breaker_opened=%s  %.1f s" % (
+        label, dict(outcomes), STATE["requests"], breaker.opened if breaker is not None else "-",
+        time.perf_counter() - t))
+
+
+if __name__ == "__main__":
+    n_calls = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    random.seed(0)
+    server, url = start()
+
+    def client():
+        c = Randl()
+        c.url_base = url
+        c.set_timeout("taup_surrogate", (1, 0.3))
+        c.set_backoff(0.02, max_backoff=0.5)
+        return c
+
+    c = client()
+    c.set_max_attempts(1)
+    run(c, n_calls, "no retries")
+
+    run(client(), n_calls, "3 attempts (default)")
+
+    c = client()
+    c.set_max_attempts(6)
+    c.set_deadline(1.0)
+    run(c, n_calls, "6 attempts, 1 s deadline")
+
+    # a 2 s outage in the middle: the breaker opens and requests wait it out
+    c = client()
+    c.set_max_attempts(4)
+    c.set_circuit_breaker(failure_threshold=3, reset_timeout=0.5)
+    threading.Timer(0.3, lambda: STATE.update(outage_until=time.monotonic() + 2.0)).start()
+    run(c, n_calls, "outage, breaker 3/0.5 s")
+    server.shutdown()
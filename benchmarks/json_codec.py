@@ -0,0 +1,78 @@
+"""JSON encode/decode time with the json module and with orjson.
+
+    python benchmarks/json_codec.py [n_arrivals ...]
+
+Compares JsonCodec(fast=False) (json.dumps over to_dict(), json.loads and
+pd.read_json) with the orjson path on the largest payloads of a run: the
+bulletin sent to /window, the window sent to the DML handler, and the frames
+those endpoints return. "same" checks that both paths give the same request
+JSON and the same result frame.
+"""
+import json
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from randl_client import Randl
+from randl_client.codec import JsonCodec, read_frame, orjson
+from wire_format import synthetic_bulletin
+
+
+def timed(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t)
+    return best, out
+
+
+def same_frames(a, b):
+    try:
+        pd.testing.assert_frame_equal(a, b, check_exact=False, rtol=1e-12)
+        return True
+    except AssertionError:
+        return False
+
+
+def bench(n):
+    client = Randl()
+    bulletin = synthetic_bulletin(n)
+    window = bulletin.iloc[:max(500, n // 10)]
+    rng = np.random.default_rng(0)
+    dml = pd.DataFrame({"LAT_ORIG": rng.normal(10, 1, len(window)), "LON_ORIG": rng.normal(20, 1, len(window)),
+                        "DEPTH_ORIG": rng.uniform(0, 50, len(window))})
+    requests = {"window": client._window_catalog_request(bulletin)[1],
+                "dml": client._dml_prediction_request(window)[1]}
+    results = {"window": bulletin, "dml": dml}
+    slow, fast = JsonCodec(fast=False), JsonCodec()
+
+    rows = []
+    for endpoint in requests:
+        req = requests[endpoint]
+        slow_t, slow_body = timed(lambda: slow.encode(req)[0])
+        fast_t, fast_body = timed(lambda: fast.encode(req)[0])
+        rows.append({"n_arrivals": n, "endpoint": endpoint, "payload": "request", "MiB": len(slow_body) / 2 ** 20,
+                     "json_ms": slow_t * 1000, "orjson_ms": fast_t * 1000,
+                     "same": json.loads(slow_body) == json.loads(fast_body)})
+
+        body = json.dumps({"result": results[endpoint].to_json()}).encode()
+        slow_t, slow_frame = timed(lambda: read_frame(slow.decode(body)["result"], fast=False))
+        fast_t, fast_frame = timed(lambda: read_frame(fast.decode(body)["result"]))
+        rows.append({"n_arrivals": n, "endpoint": endpoint, "payload": "result", "MiB": len(body) / 2 ** 20,
+                     "json_ms": slow_t * 1000, "orjson_ms": fast_t * 1000, "same": same_frames(slow_frame, fast_frame)})
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    if orjson is None:
+        sys.exit("orjson is not installed")
+    sizes = [int(a) for a in sys.argv[1:]] or [100000, 1000000]
+    results = pd.concat([bench(n) for n in sizes], ignore_index=True)
+    results["speedup"] = results.json_ms / results.orjson_ms
+    pd.set_option("display.width", 200)
+    print(results.to_string(index=False, float_format=lambda v: "%.1f" % v))
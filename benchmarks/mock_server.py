@@ -0,0 +1,367 @@
+"""Local stand-in for the RaNDL server, for benchmarks and offline use.
+
+    python benchmarks/mock_server.py [--port 8011] [--latency MS] [--latency ENDPOINT=MS ...]
+                                     [--bandwidth MIB_PER_S] [--dml-rows N] [--pad-kib N]
+                                     [--dml-window-ms MS] [--no-dml-batch]
+                                     [--fault ENDPOINT=FAULT[xN] ...] [--retry-after S] [--stall-ms MS]
+
+Implements the /randl/* endpoints the client calls, with synthetic results of
+the shape the real server returns: windows are the arrivals inside the
+window, beamsearch picks the window's first arrivals, octree_search takes the
+arrivals in the 700 s after the beam time, and the DML, surrogate and
+conversion endpoints return rows of plausible numbers. Nothing is located for
+real, so results are only good for timing the client.
+
+Every POST sleeps for the endpoint's latency plus, with --bandwidth, the time
+its request and response bodies would take on a link of that speed.
+--dml-rows sets the size of DML prediction frames and --pad-kib adds that
+much filler to every POST response. The batched DML endpoints
+(dml_*_handler_batch) predict each WINDOW_ID of the catalog as the single
+window endpoint would; they take that endpoint's latency plus --dml-window-ms
+per window, and --no-dml-batch leaves them out (404). Requests and responses can be JSON or
+the columnar msgpack format; bulletin sessions are kept in memory.
+
+--fault makes the first N POSTs to ENDPOINT (all of them without xN) fail:
+FAULT is an HTTP status to answer with (429 and 503 carry a Retry-After of
+--retry-after seconds), "stall" to wait --stall-ms before answering, or
+"drop" to close the connection without a response.
+
+start() runs a server in a subprocess and returns (process, base_url).
+"""
+import argparse
+import gzip
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from io import StringIO
+from urllib.request import urlopen
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from randl_client import util
+from randl_client.codec import encode_frame, decode_frame
+from randl_client.compact import parse_times
+
+CONFIG = {"latency": {"default": 0.0}, "bandwidth": None, "dml_rows": 250, "pad_bytes": 0, "dml_window": 0.0,
+          "dml_batch": True, "faults": {}, "retry_after": 1.0, "stall": 1.0}
+SESSIONS = {}
+SESSIONS_LOCK = threading.Lock()
+FAULTS_LOCK = threading.Lock()
+
+
+def synthetic_bulletin(n_events=1, n_stations=100, start="2024-05-01T00:00:00", end="2024-05-11T00:00:00", seed=555,
+                       drop_fraction=0.0):
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp(start)
+    span = (pd.Timestamp(end) - start).total_seconds()
+    sta_lat = rng.uniform(-60, 60, n_stations)
+    sta_lon = rng.uniform(-180, 180, n_stations)
+    orig_time = start + pd.to_timedelta(np.sort(rng.uniform(0, max(span - 3600, 0), n_events)), unit="s")
+    event = np.repeat(np.arange(n_events), n_stations)
+    sta = np.tile(np.arange(n_stations), n_events)
+    arrival = orig_time[event] + pd.to_timedelta(rng.uniform(30, 600, len(event)), unit="s")
+    keep = rng.uniform(size=len(event)) >= drop_fraction
+    b = pd.DataFrame({"STA": ["ST%03d" % s for s in sta], "STA_LAT": sta_lat[sta], "STA_LON": sta_lon[sta],
+                      "TIME": arrival.astype(str), "ORIG_TIME": orig_time[event].astype(str),
+                      "ORIG_LAT": rng.uniform(-60, 60, n_events)[event], "ORIG_LON": rng.uniform(-180, 180, n_events)[event],
+                      "IPHASE": "P", "ARID": np.arange(len(event))})[keep]
+    return b.reset_index(drop=True)
+
+
+class Catalog:
+    # A bulletin as the server keeps it: sorted by arrival time, with the
+    # times parsed once
+    def __init__(self, frame):
+        frame = frame.copy()
+        frame["_t"] = parse_times(frame["TIME_ARRIV"].astype(str)).to_numpy(dtype="datetime64[ns]")
+        self.frame = frame.sort_values("_t", kind="stable").reset_index(drop=True)
+        self.times = self.frame["_t"].to_numpy()
+
+    def between(self, start, end):
+        lo = np.searchsorted(self.times, np.datetime64(pd.Timestamp(start)), side="left")
+        hi = np.searchsorted(self.times, np.datetime64(pd.Timestamp(end)), side="right")
+        return self.frame.iloc[lo:hi].drop(columns="_t")
+
+
+def as_frame(value):
+    if isinstance(value, dict) and value.get("__frame__"):
+        return decode_frame(value)
+    if isinstance(value, str):
+        return pd.read_json(StringIO(value))
+    return pd.DataFrame(value)
+
+
+def catalog(req, key):
+    if key + "_handle" in req:
+        with SESSIONS_LOCK:
+            return SESSIONS[req[key + "_handle"]]
+    return Catalog(as_frame(req[key]))
+
+
+def _rows(inputs):
+    return np.atleast_2d(np.asarray(inputs, dtype=np.float64))
+
+
+def _columns(req, names):
+    return np.broadcast_arrays(*[np.atleast_1d(np.asarray(req[n], dtype=np.float64)) for n in names])
+
+
+def _scalar_or_list(values):
+    return [v.tolist() if len(v) > 1 else float(v[0]) for v in values]
+
+
+def dml_predictions(w):
+    rng = np.random.default_rng(len(w))
+    n = CONFIG["dml_rows"]
+    return pd.DataFrame({"LAT_ORIG": rng.normal(10, 1, n), "LON_ORIG": rng.normal(20, 1, n),
+                         "DEPTH_ORIG": rng.uniform(0, 50, n)})
+
+
+def handle_post(endpoint, req, frame):
+    if endpoint == "bulletin_upload":
+        with SESSIONS_LOCK:
+            SESSIONS[req["handle"]] = Catalog(as_frame(req["catalog"]))
+        return {"handle": req["handle"]}
+    if endpoint == "bulletin_delta":
+        with SESSIONS_LOCK:
+            b = SESSIONS[req["handle"]].frame.drop(columns="_t")
+        b = b[~b.ARID.isin(req["remove_arids"])]
+        if "append" in req:
+            b = pd.concat([b, as_frame(req["append"])], ignore_index=True)
+        with SESSIONS_LOCK:
+            SESSIONS[req["new_handle"]] = Catalog(b)
+        return {"handle": req["new_handle"]}
+    if endpoint == "bulletin_release":
+        with SESSIONS_LOCK:
+            SESSIONS.pop(req["handle"], None)
+        return True
+    if endpoint == "create_bulletin":
+        return frame(synthetic_bulletin(int(req["n_events"]), int(req["n_stations"]), req["datetime_start"],
+                                        req["datetime_end"], int(req["seed"]), float(req["drop_fraction"])))
+    if endpoint == "window":
+        start = pd.Timestamp(req["start_time"])
+        w = catalog(req, "catalog").between(start, start + pd.Timedelta(seconds=float(req["window_length"])))
+        if len(w) < int(req["min_phases_needed"]):
+            w = w.iloc[0:0]
+        return frame(w)
+    if endpoint in ("dml_flex_handler", "dml_pwave_handler"):
+        return frame(dml_predictions(as_frame(req["catalog"])))
+    if endpoint in ("dml_flex_handler_batch", "dml_pwave_handler_batch") and CONFIG["dml_batch"]:
+        c = as_frame(req["catalog"])
+        return frame(pd.concat([dml_predictions(w.drop(columns="WINDOW_ID")).assign(WINDOW_ID=i)
+                                for i, w in c.groupby("WINDOW_ID", sort=False)], ignore_index=True))
+    if endpoint == "beamsearch":
+        w = as_frame(req["window"])
+        first = parse_times(w.TIME_ARRIV.astype(str)).min()
+        return {"used_arids": [int(a) for a in w.ARID][:10], "score": 0.9, "unscaled_centroid": [10.0, 20.0, 5.0],
+                "time": str(first - pd.Timedelta(seconds=30))}
+    if endpoint == "octree_search":
+        beam_time = pd.Timestamp(req["beam_time"])
+        used = catalog(req, "bulletin").between(beam_time, beam_time + pd.Timedelta(seconds=700))
+        return {"used_arids": [int(a) for a in used.ARID], "unscaled_loc": [20.0, 10.0, 5.0], "time": str(beam_time),
+                "confidence": 0.95}
+    if endpoint == "octree_bulletin_refinement":
+        b = catalog(req, "bulletin")
+        origins = as_frame(req["predictions"])
+        times = parse_times(origins["Beamsearch_time"].astype(str))
+        origins["oct_lon"], origins["oct_lat"], origins["oct_depth"] = 20.0, 10.0, 5.0
+        origins["oct_time"] = times.astype(str)
+        origins["oct_arids"] = [[int(a) for a in b.between(t, t + pd.Timedelta(seconds=700)).ARID] for t in times]
+        origins["oct_confidence"] = 0.95
+        return frame(origins)
+    if endpoint in ("taup_surrogate", "baz_surrogate"):
+        rows = _rows(req["inputs"])
+        return np.sqrt((rows ** 2).sum(axis=1, keepdims=True)).tolist()
+    if endpoint == "baz_geo_surrogate":
+        values = _columns(req, ["source_lat", "source_lon", "st_lat", "st_lon"])
+        baz = np.degrees(np.arctan2(values[3] - values[1], values[2] - values[0])) % 360
+        return baz.tolist() if isinstance(req["source_lat"], list) else float(baz[0])
+    conversions = {"lonlat_to_geocentric": (util.lonlat_to_geocentric, ["lon", "lat", "elev"]),
+                   "geocentric_to_lonlat": (util.geocentric_to_lonlat, ["x", "y", "z"]),
+                   "scale_geocentric": (util.scale_geocentric, ["x", "y", "z"]),
+                   "unscale_geocentric": (util.unscale_geocentric, ["x", "y", "z"])}
+    if endpoint in conversions:
+        fn, names = conversions[endpoint]
+        return _scalar_or_list(fn(*_columns(req, names)))
+    if endpoint in ("scale_time", "unscale_time"):
+        fn = util.scale_time if endpoint == "scale_time" else util.unscale_time
+        values = fn(_columns(req, ["time"])[0])
+        return values.tolist() if isinstance(req["time"], list) else float(values[0])
+    raise KeyError(endpoint)
+
+
+# The fault to inject into this POST to endpoint, if one is still due
+def take_fault(endpoint):
+    with FAULTS_LOCK:
+        spec = CONFIG["faults"].get(endpoint)
+        if spec is None or spec[1] == 0:
+            return None
+        if spec[1] is not None:
+            spec[1] -= 1
+        return spec[0]
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body go out as separate writes; with Nagle on, keep-alive
+    # connections would wait ~40 ms for the delayed ACK on every response
+    disable_nagle_algorithm = True
+
+    def log_message(self, *a):
+        pass
+
+    def _send(self, obj, code=200, columnar=False, delay=None, headers=None):
+        if columnar:
+            import msgpack
+            body = msgpack.packb(obj, use_bin_type=True)
+            content_type = "application/x-msgpack"
+        else:
+            body = json.dumps(obj).encode()
+            content_type = "application/json"
+        if delay is not None:
+            delay(len(body))
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        endpoint = self.path.rstrip("/").rsplit("/", 1)[-1]
+        if endpoint == "version":
+            return self._send({"version": "mock-1"})
+        if endpoint == "constants":
+            return self._send({"Earth radius": 6378.137})
+        if endpoint == "wire_formats":
+            return self._send({"formats": ["json", "columnar"], "compression": ["gzip"]})
+        self._send({"detail": "Not Found"}, 404)
+
+    def do_POST(self):
+        started = time.perf_counter()
+        endpoint = self.path.rstrip("/").rsplit("/", 1)[-1]
+        raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.headers.get("Content-Encoding") == "gzip":
+            raw = gzip.decompress(raw)
+        elif self.headers.get("Content-Encoding") == "zstd":
+            import zstandard
+            raw = zstandard.ZstdDecompressor().decompress(raw)
+        if self.headers.get("Content-Type", "").startswith("application/x-msgpack"):
+            import msgpack
+            req = msgpack.unpackb(raw, raw=False)
+        else:
+            req = json.loads(raw)
+
+        fault = take_fault(endpoint)
+        if fault == "drop":
+            self.close_connection = True
+            self.connection.shutdown(socket.SHUT_RDWR)
+            return
+        if fault == "stall":
+            time.sleep(CONFIG["stall"])
+        elif fault is not None:
+            status = int(fault)
+            headers = {"Retry-After": str(CONFIG["retry_after"])} if status in (429, 503) else None
+            return self._send({"detail": "injected fault"}, status, headers=headers)
+
+        columnar = "application/x-msgpack" in self.headers.get("accept", "")
+        frame = encode_frame if columnar else (lambda df: df.to_json())
+        try:
+            result = handle_post(endpoint, req, frame)
+        except KeyError as e:
+            return self._send({"detail": "Unknown endpoint or missing field: %s" % e}, 404)
+        response = {"result": result}
+        if CONFIG["pad_bytes"]:
+            response["pad"] = "x" * CONFIG["pad_bytes"]
+
+        # latency and transfer time are waited out less what handling took
+        def delay(response_bytes):
+            latency = CONFIG["latency"]
+            if endpoint.endswith("_batch"):
+                windows = len(set(as_frame(req["catalog"])["WINDOW_ID"]))
+                seconds = latency.get(endpoint, latency.get(endpoint[:-6], latency["default"]))
+                seconds += windows * CONFIG["dml_window"]
+            else:
+                seconds = latency.get(endpoint, latency["default"])
+                if endpoint.startswith("dml_"):
+                    seconds += CONFIG["dml_window"]
+            if CONFIG["bandwidth"]:
+                seconds += (len(raw) + response_bytes) / CONFIG["bandwidth"]
+            time.sleep(max(seconds - (time.perf_counter() - started), 0))
+        self._send(response, columnar=columnar, delay=delay)
+
+
+def serve(port=8011, host="127.0.0.1"):
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    print("Mock RaNDL server on http://%s:%d/randl/" % (host, server.server_address[1]), flush=True)
+    server.serve_forever()
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Local stand-in RaNDL server")
+    p.add_argument("--port", type=int, default=8011)
+    p.add_argument("--latency", action="append", default=[],
+                   help="milliseconds added to every POST, or ENDPOINT=MS for one endpoint")
+    p.add_argument("--bandwidth", type=float, default=None, help="simulated link speed in MiB/s")
+    p.add_argument("--dml-rows", type=int, default=250)
+    p.add_argument("--pad-kib", type=float, default=0)
+    p.add_argument("--dml-window-ms", type=float, default=0, help="DML inference time per window")
+    p.add_argument("--no-dml-batch", action="store_true", help="no batched DML endpoints")
+    p.add_argument("--fault", action="append", default=[],
+                   help="ENDPOINT=FAULT[xN]: the first N POSTs to ENDPOINT get an HTTP status, stall or drop")
+    p.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429 and 503")
+    p.add_argument("--stall-ms", type=float, default=1000, help="how long a stall fault waits")
+    return p.parse_args(argv)
+
+
+def configure(args):
+    for spec in args.latency:
+        endpoint, _, ms = spec.rpartition("=")
+        CONFIG["latency"][endpoint or "default"] = float(ms) / 1000
+    CONFIG["bandwidth"] = args.bandwidth * (1 << 20) if args.bandwidth else None
+    CONFIG["dml_rows"] = args.dml_rows
+    CONFIG["pad_bytes"] = int(args.pad_kib * 1024)
+    CONFIG["dml_window"] = args.dml_window_ms / 1000
+    CONFIG["dml_batch"] = not args.no_dml_batch
+    for spec in args.fault:
+        endpoint, _, fault = spec.partition("=")
+        fault, _, count = fault.partition("x")
+        CONFIG["faults"][endpoint] = [fault, int(count) if count else None]
+    CONFIG["retry_after"] = args.retry_after
+    CONFIG["stall"] = args.stall_ms / 1000
+
+
+# Runs the server in its own process, so it doesn't compete with the client
+# being measured for the GIL; extra arguments are passed on the command line
+def start(port=0, args=(), timeout=30):
+    if port == 0:
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--port", str(port)] + list(args),
+                               stdout=subprocess.DEVNULL)
+    url = "http://127.0.0.1:%d/randl/" % port
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            urlopen(url + "version", timeout=1).read()
+            return process, url
+        except OSError:
+            if process.poll() is not None or time.monotonic() > deadline:
+                process.kill()
+                raise RuntimeError("mock server did not start")
+            time.sleep(0.1)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    configure(args)
+    serve(args.port)
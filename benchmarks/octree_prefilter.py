@@ -0,0 +1,82 @@
+"""Size of the octree_search bulletin with and without client-side prefiltering.
+
+    python benchmarks/octree_prefilter.py [n_events ...]
+
+Builds a bulletin whose arrivals follow the P travel time envelope from
+randomly placed events to 200 stations, one event every 5 minutes, and for
+each event's true origin compares the full bulletin with the prefiltered
+subset: rows, encoded request bytes, the time to build the subset, and how
+many of the event's own arrivals the subset kept (recall, should be 1.0).
+"""
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from randl_client import Randl
+from randl_client.codec import JsonCodec
+from randl_client.prefilter import BulletinFilter, travel_time_bounds
+
+
+def stations(n, rng):
+    return rng.uniform(-70, 70, n), rng.uniform(-180, 180, n)
+
+
+def distance(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    cos = np.sin(lat1) * np.sin(lat2) + np.cos(lat1) * np.cos(lat2) * np.cos(lon1 - lon2)
+    return np.degrees(np.arccos(np.clip(cos, -1, 1)))
+
+
+def physical_bulletin(n_events, n_stations=200, seed=0):
+    rng = np.random.default_rng(seed)
+    sta_lat, sta_lon = stations(n_stations, rng)
+    ev_lat, ev_lon = rng.uniform(-60, 60, n_events), rng.uniform(-180, 180, n_events)
+    ev_time = pd.Timestamp("2024-05-01") + pd.to_timedelta(np.arange(n_events) * 300.0, unit="s")
+    event = np.repeat(np.arange(n_events), n_stations)
+    sta = np.tile(np.arange(n_stations), n_events)
+    d = distance(ev_lat[event], ev_lon[event], sta_lat[sta], sta_lon[sta])
+    early, late = travel_time_bounds(d)
+    tt = early + rng.uniform(0, 1, len(d)) * (late - early)
+    # stations beyond 100 degrees mostly don't record the event
+    seen = (d < 100) | (rng.uniform(size=len(d)) < 0.2)
+    b = pd.DataFrame({"STA": ["ST%03d" % s for s in sta], "LAT_STA": sta_lat[sta], "LON_STA": sta_lon[sta],
+                      "TIME_ARRIV": (ev_time[event] + pd.to_timedelta(tt, unit="s")).astype(str),
+                      "ORIG_TIME": ev_time[event].astype(str), "ORIG_LAT": ev_lat[event], "ORIG_LON": ev_lon[event],
+                      "IPHASE": "P", "ARID": np.arange(len(event)), "BACK_AZIMUTH": 0, "EVENT": event})[seen]
+    b = b.sort_values("TIME_ARRIV").reset_index(drop=True)
+    return b, ev_lat, ev_lon, ev_time
+
+
+def bench(n_events):
+    bulletin, ev_lat, ev_lon, ev_time = physical_bulletin(n_events)
+    client = Randl()
+    codec = JsonCodec()
+    t = time.perf_counter()
+    index = BulletinFilter(bulletin)
+    build = time.perf_counter() - t
+
+    sample = range(0, n_events, max(1, n_events // 50))
+    rows, recall, query = [], [], []
+    for e in sample:
+        t = time.perf_counter()
+        subset = index.subset(ev_lat[e], ev_lon[e], ev_time[e], client.window_length)
+        query.append(time.perf_counter() - t)
+        rows.append(len(subset))
+        recall.append((subset.EVENT == e).sum() / (bulletin.EVENT == e).sum())
+
+    e = sample[0]
+    full_bytes = len(codec.encode(client._octree_search_request(bulletin, ev_lat[e], ev_lon[e], 0.0, str(ev_time[e]))[1])[0])
+    client.set_octree_prefilter(True)
+    subset_bytes = len(codec.encode(client._octree_search_request(bulletin, ev_lat[e], ev_lon[e], 0.0,
+                                                                  str(ev_time[e]))[1])[0])
+    return {"arrivals": len(bulletin), "build_ms": 1000 * build, "query_ms": 1000 * np.median(query),
+            "subset_rows": int(np.median(rows)), "min_recall": float(np.min(recall)),
+            "full_kib": full_bytes / 1024, "subset_kib": subset_bytes / 1024}
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [100, 1000, 5000]
+    print(pd.DataFrame([bench(n) for n in sizes]).round(2).to_string(index=False))
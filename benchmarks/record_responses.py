@@ -0,0 +1,127 @@
+"""Record a RaNDL server's /window and surrogate answers as test fixtures.
+
+    python benchmarks/record_responses.py URL [API_KEY]
+
+Asks the server at URL for a synthetic bulletin (create_bulletin, 4 events of
+100 stations) and sends /window requests over it, and over the same bulletin
+with every other arrival time written without fractional seconds: windows
+through the bulletin, the last start time, starts past the end and before the
+first arrival, a window in the widest gap between events, and min_phases either
+side of a window's size. Each is sent with exclude_associated_phases off and
+on. Writes tests/fixtures/window/<server version>.json with the bulletins, the
+window settings and the ARIDs returned, which tests/test_windowing.py compares
+WindowIndex against.
+
+Then sends 2000 random station/source rows to /taup_surrogate and
+/baz_surrogate and builds the lookup tables use_surrogate_tables would for the
+server. Writes tests/fixtures/surrogates/<server version>.json with the rows
+and answers, and the tables to tests/fixtures/surrogates/tables, which
+tests/test_surrogate_tables.py checks the tables' answers against.
+"""
+import json
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(here, ".."))
+from randl_client import Randl
+from randl_client import surrogate_tables
+from randl_client.compact import parse_times
+from randl_client.windowing import arrival_start_times
+
+fixtures = os.path.join(here, "..", "tests", "fixtures")
+
+
+def frame_json(frame):
+    return json.loads(frame.to_json(orient="split", index=False))
+
+
+def json_frame(value):
+    return pd.DataFrame(value["data"], columns=value["columns"])
+
+
+# The bulletin with every other arrival time on a whole second and written
+# without fractional seconds
+def mixed_precision(bulletin):
+    times = parse_times(bulletin.TIME_ARRIV.astype(str))
+    return bulletin.assign(TIME_ARRIV=[t.floor("s").strftime('%Y-%m-%d %H:%M:%S') if i % 2 else
+                                       t.strftime('%Y-%m-%d %H:%M:%S.%f') for i, t in enumerate(times)])
+
+
+# Window settings covering the bulletin and its edge cases
+def window_cases(bulletin):
+    start_times = arrival_start_times(bulletin)
+    first, last = pd.Timestamp(start_times[0]), pd.Timestamp(start_times[-1])
+    widest = int(np.argmax(np.diff(start_times))) if len(start_times) > 1 else 0
+    starts = [(pd.Timestamp(t), 1800, 5) for t in start_times[::7]]
+    starts += [(last, 1800, p) for p in (0, 1, 2, 5)]
+    starts += [(last + pd.Timedelta(seconds=1), 1800, 0), (first - pd.Timedelta(days=1), 1800, 0),
+               (pd.Timestamp(start_times[widest]) + pd.Timedelta(seconds=1), 600, 0)]
+    in_first = int(np.searchsorted(start_times, (first + pd.Timedelta(seconds=1800)).to_datetime64(), side='right'))
+    starts += [(first, 1800, p) for p in (in_first, in_first + 1)]
+    return [{"start": start.strftime('%Y-%m-%d %H:%M:%S.%f'), "length": length, "min_phases": int(min_phases),
+             "exclude_associated_phases": exclude}
+            for start, length, min_phases in starts for exclude in (False, True)]
+
+
+def record_window(client, n_events=4):
+    config = client.config.override(bulletin={"n_events": n_events})
+    bulletin = client.create_bulletin(config)
+    recording = {"url": client.url_base, "version": client.version(), "bulletins": {}, "windows": {}}
+    for name, b in (("uniform", bulletin), ("mixed", mixed_precision(bulletin))):
+        # what is sent is what the fixture holds
+        stored = frame_json(b)
+        b = json_frame(stored)
+        windows = []
+        for case in window_cases(b):
+            window = client.window_catalog(b, client.config.override(window=case))
+            windows.append({"window": case, "arids": [int(a) for a in window.ARID] if len(window) else []})
+        recording["bulletins"][name] = stored
+        recording["windows"][name] = windows
+    return recording
+
+
+# The server's answers for n_rows random rows, and its tables (built with
+# the given grids, the client's by default) saved in table_directory. The
+# answers come from the server, not from tables the client already has.
+def record_surrogates(client, table_directory, n_rows=2000, seed=1, grids=None,
+                      endpoints=("taup_surrogate", "baz_surrogate")):
+    rows = surrogate_tables.random_rows(n_rows, seed=seed)
+    recording = {"url": client.url_base, "version": client.version(), "rows": rows.tolist(), "endpoints": {}}
+    for endpoint in endpoints:
+        client.surrogate_tables.pop(endpoint, None)
+        outputs = getattr(client, endpoint + "_batch")(rows)
+        grid = (grids or surrogate_tables.grids)[endpoint]
+        table = surrogate_tables.load_or_build(client, endpoint, table_directory, grid, validate=0)
+        recording["endpoints"][endpoint] = {"outputs": outputs.tolist(), "table": table.name()}
+    return recording
+
+
+def save(recording, name):
+    directory = os.path.join(fixtures, name)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, str(recording["version"]).replace("/", "_") + ".json")
+    with open(path, "w") as f:
+        json.dump(recording, f)
+    return path
+
+
+def main(url, api_key=""):
+    client = Randl()
+    client.url_base = url
+    client.api_key = api_key
+    recording = record_window(client)
+    path = save(recording, "window")
+    print("Recorded", sum(len(w) for w in recording["windows"].values()), "windows to", path)
+    recording = record_surrogates(client, os.path.join(fixtures, "surrogates", "tables"))
+    path = save(recording, "surrogates")
+    print("Recorded", len(recording["rows"]), "surrogate rows per endpoint to", path)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    main(*sys.argv[1:3])
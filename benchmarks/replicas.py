@@ -0,0 +1,85 @@
+"""Throughput across several server replicas, and failover from a dead one.
+
+    python benchmarks/replicas.py [n_calls] [service_ms]
+
+Each stand-in replica answers one request at a time and takes service_ms to
+answer a surrogate call, so a single replica caps throughput at about
+1000 / service_ms calls per second. The script sends n_calls surrogate calls
+from 16 threads to 1, 2 and 4 replicas with each strategy, then to 3 live
+replicas plus one URL nothing listens on, and prints calls per second and
+how requests were spread.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from randl_client import Randl
+
+SERVICE = {"seconds": 0.02}
+
+
+class ReplicaHandler(BaseHTTPRequestHandler):
+    def log_message(self, *a):
+        pass
+
+    def _send(self, obj):
+        body = json.dumps(obj).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._send({"version": "replica-1"})
+
+    def do_POST(self):
+        raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(SERVICE["seconds"])
+        self._send({"result": json.loads(raw)["inputs"]})
+
+
+class Replica(HTTPServer):
+    request_queue_size = 64
+
+
+def start():
+    server = Replica(("127.0.0.1", 0), ReplicaHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "http://127.0.0.1:%d/randl/" % server.server_address[1]
+
+
+def run(urls, n_calls, strategy="least_outstanding", label=None):
+    client = Randl()
+    client.set_servers(urls, strategy=strategy, health_interval=5.0)
+    client.set_timeout("taup_surrogate", (0.5, 10))
+    with ThreadPoolExecutor(16) as pool:
+        t = time.perf_counter()
+        list(pool.map(lambda i: client.taup_surrogate([[float(i)]]), range(n_calls)))
+        elapsed = time.perf_counter() - t
+    stats = client.server_stats() or {urls[0]: {"requests": n_calls, "failures": 0}}
+    spread = " ".join("%d/%d" % (s["requests"], s["failures"]) for s in stats.values())
+    print("%-34s %7.1f calls/s   requests/failures per server: %s" % (
+        label or "%d x %s" % (len(urls), strategy), n_calls / elapsed, spread))
+    client.close()
+
+
+if __name__ == "__main__":
+    n_calls = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    SERVICE["seconds"] = (float(sys.argv[2]) if len(sys.argv) > 2 else 20) / 1000
+    replicas = [start() for _ in range(4)]
+    urls = [url for _, url in replicas]
+
+    for strategy in ("least_outstanding", "round_robin"):
+        for n in (1, 2, 4):
+            run(urls[:n], n_calls, strategy)
+
+    # port 9 (discard) on localhost: connections are refused
+    run(urls[:3] + ["http://127.0.0.1:9/randl/"], n_calls, label="3 live + 1 dead")
+    for server, _ in replicas:
+        server.shutdown()
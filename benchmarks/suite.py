@@ -0,0 +1,287 @@
+"""Offline benchmark suite: client latency and throughput against the local mock server.
+
+    python benchmarks/suite.py [--sizes 1000 100000 1000000] [--output results.json]
+                               [--compare baseline.json] [--tolerance 0.25] [mock server options]
+
+Starts benchmarks/mock_server.py in a subprocess and measures, with the
+client's own call metrics:
+
+  endpoints    latency percentiles (total and per stage) and payload sizes of
+               each endpoint over --calls sequential calls, and calls/s with
+               --concurrency threads. Endpoints that carry the bulletin
+               (window, octree_search, bulletin_upload) are measured at every
+               bulletin size, with fewer calls for the larger ones.
+  end_to_end   associate_bulletin on synthetic bulletins of each size, sending
+               the bulletin with every request ('full', sizes up to
+               --full-max only) and with a bulletin session and local windowing
+               ('session').
+
+Results are written as JSON. With --compare, every result is matched with
+the same result in a baseline file and the run exits with status 1 if any
+p50 latency or end-to-end wall time got more than --tolerance slower (plus
+2 ms or 0.1 s, below which differences are noise).
+Latency, bandwidth and payload size options are passed to the mock server
+(see mock_server.py).
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from randl_client import Randl
+from randl_client.randl_client import client_version
+import mock_server
+
+
+# Arrivals grouped into events 15 minutes apart, each seen by every station,
+# so association finds about one origin per event. Station count grows with
+# the bulletin so that 1M arrivals are ~1000 events rather than ~20000.
+def e2e_bulletin(n, seed=0):
+    rng = np.random.default_rng(seed)
+    n_stations = int(np.clip(n // 1000, 50, 1000))
+    n_events = -(-n // n_stations)
+    sta_lat = rng.uniform(-60, 60, n_stations)
+    sta_lon = rng.uniform(-180, 180, n_stations)
+    orig_time = pd.Timestamp("2024-05-01") + pd.to_timedelta(np.arange(n_events) * 900.0, unit="s")
+    event = np.repeat(np.arange(n_events), n_stations)[:n]
+    sta = np.tile(np.arange(n_stations), n_events)[:n]
+    arrival = orig_time[event] + pd.to_timedelta(rng.uniform(30, 600, n), unit="s")
+    return pd.DataFrame({
+        "STA": np.array(["ST%04d" % s for s in range(n_stations)])[sta],
+        "LAT_STA": sta_lat[sta],
+        "LON_STA": sta_lon[sta],
+        "TIME_ARRIV": arrival.astype(str),
+        "ORIG_TIME": orig_time[event].astype(str),
+        "ORIG_LAT": rng.uniform(-60, 60, n_events)[event],
+        "ORIG_LON": rng.uniform(-180, 180, n_events)[event],
+        "IPHASE": "P",
+        "ARID": np.arange(n),
+        "BACK_AZIMUTH": 0,
+    })
+
+
+def client_for(url, wire_format):
+    client = Randl()
+    client.url_base = url
+    client.set_wire_format(wire_format)
+    client.enable_metrics()
+    return client
+
+
+# Stage percentiles of one endpoint's calls since mark, from the client metrics
+def call_stats(client, endpoint, mark):
+    s = client.metrics_summary(since=mark).loc[endpoint]
+    stats = {"calls": int(s.calls), "errors": int(s.errors)}
+    for stage in ("total", "serialize", "network", "deserialize"):
+        for q in (50, 95, 99):
+            stats["%s_p%d_ms" % (stage, q)] = round(float(s["%s_p%d_ms" % (stage, q)]), 3)
+    stats["p50_ms"] = stats["total_p50_ms"]
+    stats["request_kib"] = round(float(s.request_kib), 2)
+    stats["response_kib"] = round(float(s.response_kib), 2)
+    return stats
+
+
+def bench_endpoint(client, name, endpoint, fn, calls, concurrency, warmup=True):
+    if warmup:
+        fn()  # warm up connections and caches
+    mark = client.transport.metrics.mark()
+    for _ in range(calls):
+        fn()
+    result = {"benchmark": "endpoint/" + name, "endpoint": endpoint}
+    result.update(call_stats(client, endpoint, mark))
+    if concurrency > 1:
+        n = max(calls, concurrency * 4)
+        with ThreadPoolExecutor(concurrency) as pool:
+            t = time.perf_counter()
+            list(pool.map(lambda _: fn(), range(n)))
+            result["throughput_per_s"] = round(n / (time.perf_counter() - t), 2)
+    print("  %-34s p50 %8.2f ms  p95 %8.2f ms  %s" % (
+        name, result["total_p50_ms"], result["total_p95_ms"],
+        "%.1f calls/s" % result["throughput_per_s"] if "throughput_per_s" in result else ""))
+    return result
+
+
+def endpoint_benchmarks(client, sizes, calls, concurrency):
+    print("Endpoints")
+    results = []
+    rng = np.random.default_rng(0)
+    window = e2e_bulletin(500)
+    dml = client.dml_prediction(window)
+    rows = rng.uniform(-1, 1, (1000, 6))
+    many_rows = rng.uniform(-1, 1, (100000, 6))
+    lon, lat = rng.uniform(-180, 180, 10000), rng.uniform(-90, 90, 10000)
+    fixed = [
+        ("version", "version", client.version),
+        ("dml_prediction 500 arrivals", "dml_flex_handler", lambda: client.dml_prediction(window)),
+        ("beamsearch 500 arrivals", "beamsearch", lambda: client.beamsearch(window, dml)),
+        ("taup_surrogate 1k rows", "taup_surrogate", lambda: client.taup_surrogate(rows.tolist())),
+        ("taup_surrogate_batch 100k rows", "taup_surrogate", lambda: client.taup_surrogate_batch(many_rows)),
+        ("lonlat_to_geocentric_batch 10k", "lonlat_to_geocentric", lambda: client.lonlat_to_geocentric_batch(lon, lat)),
+        ("baz_geo_surrogate", "baz_geo_surrogate", lambda: client.baz_geo_surrogate(10.0, 20.0, 30.0, 40.0)),
+    ]
+    for name, endpoint, fn in fixed:
+        results.append(bench_endpoint(client, name, endpoint, fn, calls, concurrency))
+
+    for n in sizes:
+        bulletin = e2e_bulletin(n)
+        beam_time = bulletin.TIME_ARRIV.iloc[len(bulletin) // 2]
+        client.set_window_start(bulletin.TIME_ARRIV.iloc[0])
+        client.set_window_length(1800)
+        # requests carrying the bulletin get fewer calls, no warm-up and no
+        # concurrent run; the session benchmarks use the uploaded handle
+        n_calls = max(2, calls * 1000 // n)
+        handles = []
+        print(" %d arrivals" % n)
+        per_size = [
+            ("bulletin_upload", "bulletin_upload", lambda: handles.append(client.upload_bulletin(bulletin)), n_calls, 1),
+            ("window full bulletin", "window", lambda: client.window_catalog(bulletin), n_calls, 1),
+            ("window session", "window", lambda: client.window_catalog(handles[-1]), calls, concurrency),
+            ("octree_search full bulletin", "octree_search",
+             lambda: client.octree_search(bulletin, 10.0, 20.0, 5.0, beam_time), n_calls, 1),
+            ("octree_search session", "octree_search",
+             lambda: client.octree_search(handles[-1], 10.0, 20.0, 5.0, beam_time), calls, concurrency),
+        ]
+        for name, endpoint, fn, k, c in per_size:
+            result = bench_endpoint(client, name, endpoint, fn, k, c, warmup=c > 1)
+            result["arrivals"] = n
+            results.append(result)
+        client.release_bulletin(handles[-1])
+    return results
+
+
+def end_to_end_benchmarks(url, wire_format, sizes, modes, full_max):
+    print("End to end")
+    results = []
+    options = {"full": {}, "session": {"use_session": True, "local_windowing": True}}
+    for n in sizes:
+        bulletin = e2e_bulletin(n)
+        for mode in modes:
+            if mode == "full" and n > full_max:
+                continue
+            client = client_for(url, wire_format)
+            mark = client.transport.metrics.mark()
+            t = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                origins = client.associate_bulletin(bulletin.copy(), verbose=False, metrics_report=False,
+                                                    **options[mode])
+            wall = time.perf_counter() - t
+            calls = client.transport.metrics.frame(mark)
+            by_endpoint = calls.groupby("endpoint")
+            windows = int((calls.endpoint.isin(["dml_flex_handler", "dml_pwave_handler"])).sum())
+            result = {"benchmark": "end_to_end/" + mode, "arrivals": n, "wall_s": round(wall, 3),
+                      "origins": len(origins), "windows": windows,
+                      "ms_per_window": round(1000 * wall / max(windows, 1), 3),
+                      "calls": {k: int(v) for k, v in by_endpoint.size().items()},
+                      "endpoint_s": {k: round(float(v), 3) for k, v in by_endpoint.total.sum().items()},
+                      "client_s": round(wall - float(calls.network.sum()), 3)}
+            print("  %-8s %8d arrivals  %8.2f s  %5d windows  %5d origins  %7.2f ms/window  client %.2f s" % (
+                mode, n, wall, windows, len(origins), result["ms_per_window"], result["client_s"]))
+            results.append(result)
+            client.close()
+    return results
+
+
+def metadata(args):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "client_version": client_version, "commit": commit,
+            "python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__,
+            "platform": platform.platform(), "wire_format": args.wire_format, "sizes": args.sizes,
+            "calls": args.calls, "concurrency": args.concurrency, "server_args": server_args(args)}
+
+
+def server_args(args):
+    out = []
+    for spec in args.latency:
+        out += ["--latency", spec]
+    if args.bandwidth:
+        out += ["--bandwidth", str(args.bandwidth)]
+    return out + ["--dml-rows", str(args.dml_rows), "--pad-kib", str(args.pad_kib)]
+
+
+def result_key(result):
+    return result["benchmark"], result.get("arrivals")
+
+
+# differences below these are timer and scheduling noise
+noise_floor = {"p50_ms": 2.0, "wall_s": 0.1}
+
+
+# Results more than tolerance slower than in the baseline: (key, metric, old, new)
+def regressions(results, baseline, tolerance):
+    old = {result_key(r): r for r in baseline["results"]}
+    slower = []
+    for r in results:
+        base = old.get(result_key(r))
+        if base is None:
+            continue
+        metric = "wall_s" if "wall_s" in r else "p50_ms"
+        if base.get(metric) and r[metric] > base[metric] * (1 + tolerance) + noise_floor[metric]:
+            slower.append((result_key(r), metric, base[metric], r[metric]))
+    return slower
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Offline benchmarks of the RaNDL client against a local mock server")
+    p.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000])
+    p.add_argument("--calls", type=int, default=50, help="sequential calls per endpoint")
+    p.add_argument("--concurrency", type=int, default=8)
+    p.add_argument("--modes", nargs="+", default=["full", "session"], choices=["full", "session"])
+    p.add_argument("--full-max", type=int, default=10000,
+                   help="largest bulletin associated with the bulletin sent in every request")
+    p.add_argument("--skip-endpoints", action="store_true")
+    p.add_argument("--skip-e2e", action="store_true")
+    p.add_argument("--wire-format", default="json", choices=["json", "columnar"])
+    p.add_argument("--output", default="benchmark_results.json")
+    p.add_argument("--compare", default=None, help="baseline results file")
+    p.add_argument("--tolerance", type=float, default=0.25)
+    p.add_argument("--latency", action="append", default=[])
+    p.add_argument("--bandwidth", type=float, default=None)
+    p.add_argument("--dml-rows", type=int, default=250)
+    p.add_argument("--pad-kib", type=float, default=0)
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    process, url = mock_server.start(args=server_args(args))
+    try:
+        results = []
+        if not args.skip_endpoints:
+            results += endpoint_benchmarks(client_for(url, args.wire_format), args.sizes, args.calls,
+                                           args.concurrency)
+        if not args.skip_e2e:
+            results += end_to_end_benchmarks(url, args.wire_format, args.sizes, args.modes, args.full_max)
+    finally:
+        process.kill()
+
+    with open(args.output, "w") as f:
+        json.dump({"meta": metadata(args), "results": results}, f, indent=1)
+    print("Results written to", args.output)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            slower = regressions(results, json.load(f), args.tolerance)
+        for key, metric, old, new in slower:
+            print("REGRESSION %s %s: %s %.3f -> %.3f" % (key[0], "" if key[1] is None else key[1], metric, old, new))
+        if slower:
+            return 1
+        print("No regressions beyond %d%%" % (100 * args.tolerance))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""taup/baz surrogate queries answered by the server vs from local lookup tables.
+
+    python benchmarks/surrogate_tables.py [n_rows] [tolerance] [URL]
+
+Builds the lookup tables for the server at URL (by default a mock server) with
+use_surrogate_tables, saving them to a temporary directory, and loads them
+again memory-mapped as a second client would. Then sends n_rows random
+station/source pairs through taup_surrogate_batch and baz_surrogate_batch with
+and without the tables and reports the time per row, the share answered
+locally and the largest difference from the server's answers.
+
+The mock's surrogates don't follow the source-station geometry, so its tables
+fail validation and use_surrogate_tables leaves them out. Against the mock the
+tables are installed anyway and answer every row they cover, which times the
+lookups; the differences then only show how far the mock is from a table.
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import mock_server
+import numpy as np
+import pandas as pd
+from randl_client import Randl
+from randl_client import surrogate_tables
+from randl_client.surrogate_tables import random_rows
+
+endpoints = ("taup_surrogate", "baz_surrogate")
+
+
+def timed(fn):
+    t = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - t
+
+
+def main(n_rows=100000, tolerance=1e-3, url=None):
+    process = None
+    if url is None:
+        process, url = mock_server.start(args=["--latency", "default=5"])
+    directory = tempfile.mkdtemp()
+    try:
+        client = Randl()
+        client.url_base = url
+        _, build = timed(lambda: client.use_surrogate_tables(directory, tolerance))
+        loaded = Randl()
+        loaded.url_base = url
+        _, load = timed(lambda: loaded.use_surrogate_tables(directory, tolerance))
+        print("tables built in %.1f s, loaded in %.1f ms" % (build, load * 1000))
+        if process is not None:
+            for endpoint in endpoints:
+                loaded.surrogate_tables[endpoint] = surrogate_tables.load_or_build(loaded, endpoint, directory)
+            loaded.surrogate_tolerance = float("inf")
+
+        rows = random_rows(n_rows, seed=1)
+        results = []
+        for endpoint in endpoints:
+            table = loaded.surrogate_tables.get(endpoint)
+            if table is None:
+                continue
+            batch = getattr(loaded, endpoint + "_batch")
+            loaded.surrogate_tables.pop(endpoint)
+            remote, remote_s = timed(lambda: batch(rows))
+            loaded.surrogate_tables[endpoint] = table
+            table.local = table.remote = 0
+            local, local_s = timed(lambda: batch(rows))
+            results.append({"endpoint": endpoint, "table_mib": (table.values.nbytes + table.error.nbytes) / 2 ** 20,
+                            "server_us_per_row": remote_s / n_rows * 1e6,
+                            "table_us_per_row": local_s / n_rows * 1e6, "speedup": remote_s / local_s,
+                            "local_share": table.local / n_rows,
+                            "max_difference": float(np.abs(local - remote.reshape(local.shape)).max())})
+    finally:
+        if process is not None:
+            process.terminate()
+
+    print("%d rows, tolerance %g" % (n_rows, tolerance))
+    print(pd.DataFrame(results).to_string(index=False, float_format=lambda v: "%.3g" % v))
+
+
+if __name__ == "__main__":
+    main(*[t(a) for t, a in zip((int, float, str), sys.argv[1:4])])
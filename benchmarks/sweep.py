@@ -0,0 +1,53 @@
+"""Grid search over beam/octree settings: a loop over associate_bulletin vs Randl.sweep.
+
+    python benchmarks/sweep.py [n_events] [n_workers]
+
+Runs the mock server with per-endpoint latencies (DML being the slowest, as
+on the real server) and sweeps a 3 x 3 grid of beam width and octree location
+samples, first by calling the setters and associate_bulletin for each
+configuration, then with one sweep() call.
+"""
+import itertools
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import mock_server
+from randl_client import Randl
+
+grid = {"beamwidth": [3, 5, 7], "octree_loc_samples": [7, 11, 15]}
+latency = ["window=50", "dml_flex_handler=300", "beamsearch=50", "octree_search=100", "default=10"]
+
+
+def main(n_events=20, n_workers=4):
+    process, url = mock_server.start(args=[a for spec in latency for a in ("--latency", spec)])
+    try:
+        client = Randl()
+        client.url_base = url
+        client.set_bulletin_n_events(n_events)
+        bulletin = client.create_bulletin()
+
+        t = time.perf_counter()
+        loop_origins = 0
+        for width, samples in itertools.product(grid["beamwidth"], grid["octree_loc_samples"]):
+            client.set_beamwidth(width)
+            client.set_octree_loc_samples(samples)
+            loop_origins += len(client.associate_bulletin(bulletin, verbose=False))
+        loop = time.perf_counter() - t
+
+        t = time.perf_counter()
+        table = client.sweep(bulletin, grid, n_workers=n_workers)
+        swept = time.perf_counter() - t
+        sweep_origins = int(table.drop_duplicates("config").n_origins.sum())
+    finally:
+        process.terminate()
+
+    print("\n%d configurations, %d events" % (len(grid["beamwidth"]) * len(grid["octree_loc_samples"]), n_events))
+    print("loop:  %6.1f s  %d origins" % (loop, loop_origins))
+    print("sweep: %6.1f s  %d origins  (%.1fx)" % (swept, sweep_origins, loop / swept))
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:3]])
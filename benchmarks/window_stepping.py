@@ -0,0 +1,94 @@
+"""Requests and recall of associate_bulletin's window stepping policies.
+
+    python benchmarks/window_stepping.py [n_events] [swarm_events]
+
+Builds a bulletin of events recorded by 40 stations each over a 10 minute
+spread of travel times, with background noise arrivals: isolated events hours
+apart (long sparse stretches) and a swarm of events 1-4 minutes apart. The
+endpoints are stubbed with an "ideal" server: windows come from a local index,
+a beam forms on the event with most arrivals in the window and is weak unless
+that event's first arrival is among the window's first ones, and the octree
+search associates the event's arrivals in the window. For each stepping policy
+it reports the /window and DML requests made and the share of events found.
+"""
+import contextlib
+import io
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from randl_client import Randl
+from randl_client.stepping import policies
+from randl_client.windowing import WindowIndex
+
+
+def event_bulletin(n_events=40, swarm_events=20, n_stations=40, noise_per_hour=4, seed=0):
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp("2024-05-01")
+    isolated = np.sort(rng.uniform(0, 3 * 3600 * n_events, n_events))
+    swarm = isolated[n_events // 2] + 3600 + np.cumsum(rng.uniform(60, 240, swarm_events))
+    origin_times = np.concatenate([isolated, swarm])
+    event = np.repeat(np.arange(len(origin_times)), n_stations)
+    arrival = origin_times[event] + rng.uniform(0, 600, len(event))
+    span = origin_times.max() + 3600
+    noise = rng.uniform(0, span, int(noise_per_hour * span / 3600))
+    times = np.concatenate([arrival, noise])
+    b = pd.DataFrame({"STA": "ST", "TIME_ARRIV": (start + pd.to_timedelta(times, unit="s")).astype(str),
+                      "EVENT": np.concatenate([event, np.full(len(noise), -1)])})
+    b = b.sort_values("TIME_ARRIV").reset_index(drop=True)
+    b["ARID"] = np.arange(len(b))
+    return b, len(origin_times)
+
+
+class IdealRandl(Randl):
+    def __init__(self, bulletin):
+        Randl.__init__(self)
+        self.index = WindowIndex(bulletin)
+        self.event = bulletin.set_index("ARID").EVENT
+        self.calls = {"window": 0, "dml": 0}
+
+    def window_catalog(self, bulletin, config=None):
+        self.calls["window"] += 1
+        window = self._config(config).window
+        return self.index.window(window.start, window.length, window.min_phases)
+
+    def dml_prediction(self, window, config=None):
+        self.calls["dml"] += 1
+        return pd.DataFrame({"LAT_ORIG": np.zeros(len(window)), "LON_ORIG": np.zeros(len(window))})
+
+    def beamsearch(self, window, dml_predictions, config=None):
+        events = self.event.loc[window.ARID].to_numpy()
+        counts = pd.Series(events[events >= 0]).value_counts()
+        if len(counts) == 0:
+            return {"used_arids": [], "score": 0.0}
+        best = counts.index[0]
+        arids = window.ARID[events == best].tolist()
+        onset = int(np.flatnonzero(events == best)[0])
+        return {"used_arids": arids, "score": 0.9 if onset < 5 else 0.5, "unscaled_centroid": [0.0, 0.0, float(best)],
+                "time": window.TIME_ARRIV.iloc[onset]}
+
+    def octree_search(self, bulletin, beam_x, beam_y, beam_z, beam_time, config=None):
+        arids = self.event.index[self.event.to_numpy() == int(beam_z)].tolist()
+        return {"used_arids": arids, "unscaled_loc": [beam_y, beam_x, beam_z], "time": beam_time, "confidence": 0.9}
+
+
+def bench(bulletin, n_events, stepping):
+    client = IdealRandl(bulletin)
+    t = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        origins = client.associate_bulletin(bulletin.copy(), verbose=False, metrics_report=False, stepping=stepping)
+    elapsed = time.perf_counter() - t
+    found = origins.oct_depth.astype(int).unique() if len(origins) else []
+    return {"stepping": stepping, "window_requests": client.calls["window"], "dml_requests": client.calls["dml"],
+            "origins": len(origins), "recall": len(found) / n_events, "client_s": elapsed}
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    bulletin, n_events = event_bulletin(*args)
+    print(len(bulletin), "arrivals,", n_events, "events")
+    results = pd.DataFrame([bench(bulletin, n_events, p) for p in policies])
+    print(results.to_string(index=False, float_format=lambda v: "%.2f" % v))
@@ -0,0 +1,103 @@
+"""Bytes on the wire and encode/decode time of the JSON and columnar codecs.
+
+    python benchmarks/wire_format.py [n_arrivals ...]
+
+Request bodies are built with the same request builders Randl uses; the
+response side measures decoding the frame each endpoint returns.
+"""
+import gzip
+import json
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+import msgpack
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from randl_client import Randl
+from randl_client.codec import JsonCodec, ColumnarCodec, encode_frame, read_frame
+
+
+def synthetic_bulletin(n, seed=0):
+    rng = np.random.default_rng(seed)
+    start = np.datetime64("2024-05-01T00:00:00")
+    times = np.sort(start + (rng.uniform(0, 30 * 86400, n) * 1e6).astype("timedelta64[us]"))
+    n_sta = max(10, n // 1000)
+    sta = rng.integers(0, n_sta, n)
+    sta_lat = rng.uniform(-60, 60, n_sta)
+    sta_lon = rng.uniform(-180, 180, n_sta)
+    return pd.DataFrame({
+        "STA": ["ST%04d" % s for s in sta],
+        "LAT_STA": sta_lat[sta],
+        "LON_STA": sta_lon[sta],
+        "TIME_ARRIV": [str(pd.Timestamp(t)) for t in times],
+        "ORIG_TIME": [str(pd.Timestamp(t)) for t in times],
+        "ORIG_LAT": rng.uniform(-60, 60, n),
+        "ORIG_LON": rng.uniform(-180, 180, n),
+        "IPHASE": "P",
+        "ARID": np.arange(n),
+        "BACK_AZIMUTH": 0,
+    })
+
+
+def requests_for(client, bulletin):
+    window = bulletin.iloc[:min(len(bulletin), 500)]
+    dml = pd.DataFrame({"LAT_ORIG": np.random.uniform(-60, 60, 250), "LON_ORIG": np.random.uniform(-180, 180, 250)})
+    origins = pd.DataFrame({"Window_start": ["2024-05-01 00:00:00"] * 50, "Window_end": ["2024-05-01 00:30:00"] * 50,
+                            "Beamsearch_time": ["2024-05-01 00:01:00"] * 50, "Beam_lat": np.zeros(50), "Beam_lon": np.zeros(50)})
+    return {
+        "window": (client._window_catalog_request(bulletin)[1], window),
+        "dml": (client._dml_prediction_request(window)[1], dml),
+        "beamsearch": (client._beamsearch_request(window, dml)[1], None),
+        "octree_search": (client._octree_search_request(bulletin, 0.0, 0.0, 0.0, "2024-05-01 00:01:00")[1], None),
+        "octree_bulletin_refinement": (client._octree_bulletin_refinement_request(bulletin, origins)[1], origins),
+    }
+
+
+def timed(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t)
+    return best, out
+
+
+def bench(n):
+    client = Randl()
+    bulletin = synthetic_bulletin(n)
+    codecs = {"json": JsonCodec(), "json+gzip": None, "columnar": ColumnarCodec(),
+              "columnar+gzip": ColumnarCodec("gzip")}
+    try:
+        codecs["columnar+zstd"] = ColumnarCodec("zstd")
+    except ImportError:
+        pass
+
+    rows = []
+    for endpoint, (req, result_frame) in requests_for(client, bulletin).items():
+        for name, codec in codecs.items():
+            if name == "json+gzip":
+                enc_t, body = timed(lambda: gzip.compress(JsonCodec().encode(req)[0], compresslevel=1))
+            else:
+                enc_t, (body, _) = timed(lambda: codec.encode(req))
+
+            dec_t = float("nan")
+            if result_frame is not None:
+                if name.startswith("json"):
+                    payload = result_frame.to_json()
+                    dec_t, _ = timed(lambda: read_frame(json.loads(json.dumps({"result": payload}))["result"]))
+                else:
+                    packed = msgpack.packb({"result": encode_frame(result_frame)}, use_bin_type=True)
+                    dec_t, _ = timed(lambda: read_frame(msgpack.unpackb(packed, raw=False)["result"]))
+
+            rows.append({"n_arrivals": n, "endpoint": endpoint, "codec": name, "request_bytes": len(body),
+                         "encode_ms": enc_t * 1000, "response_decode_ms": dec_t * 1000})
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [10000, 100000]
+    results = pd.concat([bench(n) for n in sizes], ignore_index=True)
+    pd.set_option("display.width", 200)
+    print(results.to_string(index=False, float_format=lambda v: "%.1f" % v))
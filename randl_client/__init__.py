@@ -1,6 +1,18 @@
 try:
     from .randl_client import Randl
-    #from . import util
+    from .async_client import AsyncRandl
+    from . import util
+    from . import compact
+    from . import metrics
+    from .config import RandlConfig, BulletinConfig, WindowConfig, DMLConfig, BeamConfig, OctreeConfig
+    from .errors import (RandlError, RandlHTTPError, RandlConnectionError, RandlTimeoutError, RandlDeadlineError,
+                         RandlCircuitOpenError, RandlResponseError)
 except ImportError:
     from .randl_client import Randl
-    #from . import util
\ No newline at end of file
+    from .async_client import AsyncRandl
+    from . import util
+    from . import compact
+    from . import metrics
+    from .config import RandlConfig, BulletinConfig, WindowConfig, DMLConfig, BeamConfig, OctreeConfig
+    from .errors import (RandlError, RandlHTTPError, RandlConnectionError, RandlTimeoutError, RandlDeadlineError,
+                         RandlCircuitOpenError, RandlResponseError)
\ No newline at end of file
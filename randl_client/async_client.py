@@ -0,0 +1,475 @@
+import asyncio
+import functools
+import time
+from .randl_client import Randl
+from . import util
+from . import batching
+from . import surrogate_tables
+from .streaming import StreamingAssociator
+from .errors import (RandlHTTPError, RandlConnectionError, RandlTimeoutError, RandlDeadlineError,
+                     RandlCircuitOpenError)
+from .resilience import overload_statuses, retry_after_seconds
+from .metrics import CallRecord
+
+
+# Randl methods AsyncRandl forwards as they are: setters and methods that only
+# read the client's state. Of these only enable_cache and
+# set_wire_format('auto') make a request, a single short one, and block the
+# event loop while they do.
+forwarded_prefixes = ("set_", "enable_", "disable_")
+forwarded_methods = {"add_metrics_hook", "circuit_state", "server_stats", "cache_stats", "metrics_summary",
+                     "metrics_report", "validate_datetime", "validate_datetime_bulletin"}
+
+
+class AsyncRandl:
+    # Awaitable counterpart to Randl. Settings and setters live on the wrapped
+    # Randl instance, so `arandl.set_beamwidth(30)` works as on the sync client.
+    # Other Randl methods aren't forwarded: every method that makes requests
+    # has an awaitable version here, and the blocking one is still reachable as
+    # arandl.client.<method>.
+    def __init__(self, client=None, max_concurrency=32):
+        self.client = client if client is not None else Randl()
+        self.max_concurrency = max_concurrency
+        self._session = None
+        self._semaphore = None
+        # sessions replaced after a set_max_concurrency, closed with close()
+        self._retired = []
+
+    def __getattr__(self, name):
+        # only reached for names not found on AsyncRandl itself
+        if name in ("client", "_retired"):
+            raise AttributeError(name)
+        value = getattr(self.client, name)
+        if callable(value) and not name.startswith(forwarded_prefixes) and name not in forwarded_methods:
+            raise AttributeError("AsyncRandl has no %s; the blocking Randl.%s is arandl.client.%s" % (name, name, name))
+        return value
+
+    @property
+    def url_base(self):
+        return self.client.url_base
+
+    @url_base.setter
+    def url_base(self, url):
+        self.client.url_base = url
+
+    @property
+    def api_key(self):
+        return self.client.api_key
+
+    @api_key.setter
+    def api_key(self, key):
+        self.client.api_key = key
+
+    def set_max_concurrency(self, n):
+        if type(n) is int and n > 0:
+            self.max_concurrency = n
+            self._semaphore = None
+        else:
+            print("Positive int required")
+
+    async def _open(self):
+        # a connector's limit is fixed when it's made, so a changed
+        # max_concurrency needs a new session. Requests still on the old one
+        # finish there; it's closed with close().
+        if self._session is not None and not self._session.closed \
+                and self._session.connector.limit != self.max_concurrency:
+            self._retired.append(self._session)
+            self._session = None
+        if self._session is None or self._session.closed:
+            try:
+                import aiohttp
+            except ImportError:
+                raise ImportError("AsyncRandl requires aiohttp (pip install aiohttp)")
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+            self._session = aiohttp.ClientSession(connector=connector,
+                headers={"accept": "application/json", "Content-Type": "application/json"})
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+
+    async def close(self):
+        for session in self._retired:
+            await session.close()
+        self._retired = []
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        await self._open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def _request(self, method, endpoint, req=None, parse=None):
+        call = CallRecord(endpoint, method)
+        metrics = self.client.transport.metrics
+        if metrics is None:
+            return await self._attempts(method, endpoint, req, parse, call)
+        try:
+            return await self._attempts(method, endpoint, req, parse, call)
+        except BaseException as e:
+            call.error = type(e).__name__
+            raise
+        finally:
+            metrics.record(call)
+
+    async def _attempts(self, method, endpoint, req, parse, call):
+        import aiohttp
+        session = await self._open()
+        transport = self.client.transport
+        codec = transport.codec
+        headers = {"access_token": str(self.client.api_key)}
+        data = None
+        if req is not None:
+            t = time.perf_counter()
+            data, codec_headers = codec.encode(req)
+            call.serialize = time.perf_counter() - t
+            call.request_bytes = len(data)
+            headers.update(codec_headers)
+
+        cache = transport.cache
+        key = None
+        if cache is not None and cache.caches(endpoint):
+            key = cache.key(endpoint, codec.name, data)
+            hit = cache.get(key)
+            if hit is not None:
+                call.cached = True
+                call.response_bytes = len(hit[0])
+                return transport._decode(*hit, parse, call)
+
+        # same retry policy and circuit breaker as the wrapped client's transport
+        deadline = transport.retry.get_deadline(endpoint)
+        expires = None if deadline is None else time.monotonic() + deadline
+        attempt = 0
+        probe = None
+        try:
+            while True:
+                probe = await self._wait_for_breaker(endpoint, expires, attempt)
+                attempt += 1
+                call.attempts = attempt
+                connect, read = transport.attempt_timeout(endpoint, expires)
+                timeout = aiohttp.ClientTimeout(sock_connect=connect, sock_read=read)
+                async with self._semaphore:
+                    server = await self._acquire_server(transport.servers) if transport.servers is not None else None
+                    url = (self.client.url_base if server is None else server) + endpoint
+                    call.server = server
+                    t = time.perf_counter()
+                    try:
+                        async with session.request(method, url, headers=headers, data=data,
+                                                   timeout=timeout) as response:
+                            content = await response.read()
+                            status = response.status
+                            content_type = response.headers.get("Content-Type")
+                            retry_after = retry_after_seconds(response.headers)
+                    except asyncio.TimeoutError as e:
+                        # aiohttp before 3.10 doesn't tell connect timeouts apart
+                        connect = isinstance(e, getattr(aiohttp, "ConnectionTimeoutError", ()))
+                        error = RandlTimeoutError(endpoint, repr(e), attempt, sent=not connect)
+                    except aiohttp.ClientConnectorError as e:
+                        error = RandlConnectionError(endpoint, repr(e), attempt, sent=False)
+                    except aiohttp.ClientError as e:
+                        error = RandlConnectionError(endpoint, repr(e), attempt)
+                    except BaseException:
+                        transport.release_server(server, None)
+                        raise
+                    else:
+                        error = None
+                        call.response_bytes = len(content)
+                    call.network += time.perf_counter() - t
+                    if error is None and status != 200:
+                        error = RandlHTTPError(endpoint, status, content.decode(errors="replace"), attempt, retry_after)
+                    transport.release_server(server, error)
+                if error is None:
+                    transport._record(True)
+                    if key is not None:
+                        cache.put(key, content, content_type)
+                    return transport._decode(content, content_type, parse, call)
+
+                transport._record(isinstance(error, RandlHTTPError) and error.status not in overload_statuses)
+                if not transport.retry.should_retry(endpoint, error, attempt):
+                    raise error
+                delay = transport.retry.delay(attempt, getattr(error, "retry_after", None))
+                if expires is not None and time.monotonic() + delay >= expires:
+                    raise RandlDeadlineError(endpoint, deadline, attempt, error) from error
+                await asyncio.sleep(delay)
+        finally:
+            if transport.breaker is not None:
+                transport.breaker.end_probe(probe)
+
+    # ServerPool.acquire without blocking the loop: a server due a health check
+    # is checked with this client's session
+    async def _acquire_server(self, servers):
+        while True:
+            url, due = servers.next_server()
+            if url is not None:
+                return url
+            try:
+                servers.mark(due, *await self._check_server(servers, due))
+            finally:
+                servers.checked(due)
+
+    # (answered, version) of a GET /version on one server
+    async def _check_server(self, servers, url):
+        import aiohttp
+        session = await self._open()
+        try:
+            async with session.get(url + "version", headers={"access_token": str(self.client.api_key)},
+                                   timeout=aiohttp.ClientTimeout(total=servers.health_timeout)) as response:
+                if response.status != 200:
+                    return False, None
+                return True, (await response.json(content_type=None)).get("version")
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+            return False, None
+
+    async def _wait_for_breaker(self, endpoint, expires, attempts):
+        breaker = self.client.transport.breaker
+        if breaker is None:
+            return None
+        wait, probe = breaker.admit()
+        while wait > 0:
+            if expires is not None and time.monotonic() + wait >= expires:
+                raise RandlCircuitOpenError(endpoint, wait, attempts)
+            await asyncio.sleep(wait)
+            wait, probe = breaker.admit()
+        return probe
+
+    async def _post(self, endpoint, req, parse=None):
+        return await self._request("POST", endpoint, req, parse)
+
+    async def _get(self, endpoint, parse=None):
+        return await self._request("GET", endpoint, None, parse)
+
+    # Blocking Randl methods that run whole jobs or many requests (the
+    # association loops, sweeps, table builds) are run on the wrapped client in
+    # the default executor, so the event loop keeps going. Their requests go
+    # through the sync client's transport, not this client's session.
+    async def _in_executor(self, method, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(method, *args, **kwargs))
+
+    async def associate_bulletin(self, bulletin, *args, **kwargs):
+        return await self._in_executor(self.client.associate_bulletin, bulletin, *args, **kwargs)
+
+    async def associate_bulletin_parallel(self, bulletin, *args, **kwargs):
+        return await self._in_executor(self.client.associate_bulletin_parallel, bulletin, *args, **kwargs)
+
+    async def sweep(self, bulletin, grid, *args, **kwargs):
+        return await self._in_executor(self.client.sweep, bulletin, grid, *args, **kwargs)
+
+    async def use_surrogate_tables(self, *args, **kwargs):
+        return await self._in_executor(self.client.use_surrogate_tables, *args, **kwargs)
+
+    async def check_servers(self):
+        return await self._in_executor(self.client.check_servers)
+
+    async def wire_formats(self):
+        return await self._in_executor(self.client.wire_formats)
+
+    async def upload_bulletin(self, bulletin):
+        endpoint, req = self.client._upload_bulletin_request(bulletin)
+        parse = lambda response: self.client._bulletin_handle_result(response, bulletin)
+        return await self._post(endpoint, req, parse)
+
+    async def update_bulletin(self, handle, remove_arids=None, append=None):
+        endpoint, req, bulletin = self.client._update_bulletin_request(handle, remove_arids, append)
+        parse = lambda response: self.client._bulletin_handle_result(response, bulletin)
+        return await self._post(endpoint, req, parse)
+
+    async def release_bulletin(self, handle):
+        return await self._post("bulletin_release", {"handle": handle.handle}, self.client._result)
+
+    async def create_bulletin(self, config=None):
+        endpoint, req = self.client._create_bulletin_request(config)
+        return await self._post(endpoint, req, self.client._create_bulletin_result)
+
+    # Windows and DML predictions go through the wrapped client's stage_cache
+    # and dml_batcher when it has them, as on Randl, so an AsyncRandl in a sweep
+    # or alongside blocking clients shares their results and batches
+    async def window_catalog(self, bulletin, config=None):
+        endpoint, req = self.client._window_catalog_request(bulletin, config)
+        compute = lambda: self._post(endpoint, req, self.client._window_catalog_result)
+        cache = self.client.stage_cache
+        if cache is not None:
+            return await cache.aget(endpoint, req, cache.bulletin_key(bulletin), compute)
+        return await compute()
+
+    # Computed locally from a WindowIndex, no request
+    async def window_catalog_local(self, bulletin, associated_arids=None, config=None):
+        return self.client.window_catalog_local(bulletin, associated_arids, config)
+
+    # The batcher waits for other callers to join a batch, so it runs in the
+    # default executor and its requests go through the sync client's transport
+    async def dml_prediction(self, window, config=None):
+        config = self.client._config(config)
+        endpoint, req = self.client._dml_prediction_request(window, config)
+        batcher = self.client.dml_batcher
+        if batcher is not None:
+            compute = lambda: self._in_executor(batcher.predict, window, config)
+        else:
+            compute = lambda: self._post(endpoint, req, self.client._dml_prediction_result)
+        if self.client.stage_cache is not None:
+            return await self.client.stage_cache.aget(endpoint, req, tuple(window['ARID']), compute)
+        return await compute()
+
+    async def beamsearch(self, window, dml_predictions, config=None):
+        endpoint, req = self.client._beamsearch_request(window, dml_predictions, config)
+        return await self._post(endpoint, req, self.client._result)
+
+    async def octree_search(self, bulletin, beam_x, beam_y, beam_z, beam_time, config=None):
+        endpoint, req = self.client._octree_search_request(bulletin, beam_x, beam_y, beam_z, beam_time, config)
+        return await self._post(endpoint, req, self.client._result)
+
+    async def octree_bulletin_refinement(self, bulletin, origins, config=None):
+        endpoint, req = self.client._octree_bulletin_refinement_request(bulletin, origins, config)
+        return await self._post(endpoint, req, self.client._octree_bulletin_refinement_result)
+
+    async def taup_surrogate(self, inputs):
+        return await self._post("taup_surrogate", {"inputs": inputs}, self.client._result)
+
+    async def baz_surrogate(self, inputs):
+        return await self._post("baz_surrogate", {"inputs": inputs}, self.client._result)
+
+    async def baz_geo_surrogate(self, source_lat, source_lon, st_lat, st_lon):
+        req = {"source_lat": source_lat, "source_lon": source_lon, "st_lat": st_lat, "st_lon": st_lon}
+        return await self._post("baz_geo_surrogate", req, self.client._result)
+
+    async def _post_chunks(self, endpoint, reqs, parse=None):
+        parse = parse or self.client._result
+        return await asyncio.gather(*[self._post(endpoint, req, parse) for req in reqs])
+
+    async def dml_prediction_batch(self, windows, config=None):
+        windows = list(windows)
+        cache = self.client.stage_cache
+        if cache is not None and len(windows) > 0:
+            endpoint, req = self.client._dml_prediction_request(windows[0], config)
+            return await cache.aget_many(endpoint, req, [tuple(w['ARID']) for w in windows],
+                                         lambda owned: self._dml_prediction_batch([windows[i] for i in owned],
+                                                                                  config))
+        return await self._dml_prediction_batch(windows, config)
+
+    async def _dml_prediction_batch(self, windows, config=None):
+        if len(windows) == 0:
+            return []
+        endpoint, reqs, bounds = self.client._dml_prediction_batch_requests(windows, config)
+        try:
+            results = await self._post_chunks(endpoint, reqs, self.client._dml_prediction_result)
+        except RandlHTTPError as e:
+            if bounds is None or not self.client._dml_batch_refused(e):
+                raise
+            return await self._dml_prediction_batch(windows, config)
+        return self.client._dml_prediction_batch_results(bounds, results)
+
+    async def _row_batches(self, endpoint, inputs):
+        table = self.client.surrogate_tables.get(endpoint)
+        if table is not None:
+            rows = batching.as_rows(inputs)
+            out, ok = table.lookup(rows, self.client.surrogate_tolerance)
+            if ok.all():
+                return out
+            inputs = rows[~ok]
+        result = batching.concat_rows(await self._post_chunks(endpoint, self.client._row_batch_requests(inputs)))
+        return result if table is None else surrogate_tables.fill(table, out, ok, result)
+
+    async def taup_surrogate_batch(self, inputs):
+        return await self._row_batches("taup_surrogate", inputs)
+
+    async def baz_surrogate_batch(self, inputs):
+        return await self._row_batches("baz_surrogate", inputs)
+
+    async def _column_batches(self, endpoint, names, columns):
+        return await self._post_chunks(endpoint, self.client._column_batch_requests(names, columns))
+
+    async def baz_geo_surrogate_batch(self, source_lat, source_lon, st_lat, st_lon):
+        columns = batching.as_columns(source_lat, source_lon, st_lat, st_lon)
+        result = batching.concat_rows(await self._column_batches("baz_geo_surrogate",
+                                      ["source_lat", "source_lon", "st_lat", "st_lon"], columns))
+        return None if result is None else result.ravel()
+
+    async def lonlat_to_geocentric_batch(self, lon, lat, elev=0, local=None):
+        if self.client._local(local):
+            return util.lonlat_to_geocentric(*batching.as_columns(lon, lat, elev))
+        return batching.concat_columns(await self._column_batches("lonlat_to_geocentric", ["lon", "lat", "elev"],
+                                                                  batching.as_columns(lon, lat, elev)))
+
+    async def geocentric_to_lonlat_batch(self, x, y, z, local=None):
+        if self.client._local(local):
+            return util.geocentric_to_lonlat(*batching.as_columns(x, y, z))
+        return batching.concat_columns(await self._column_batches("geocentric_to_lonlat", ["x", "y", "z"],
+                                                                  batching.as_columns(x, y, z)))
+
+    async def scale_geocentric_batch(self, x, y, z, local=None):
+        if self.client._local(local):
+            return util.scale_geocentric(*batching.as_columns(x, y, z))
+        return batching.concat_columns(await self._column_batches("scale_geocentric", ["x", "y", "z"],
+                                                                  batching.as_columns(x, y, z)))
+
+    async def unscale_geocentric_batch(self, x, y, z, local=None):
+        if self.client._local(local):
+            return util.unscale_geocentric(*batching.as_columns(x, y, z))
+        return batching.concat_columns(await self._column_batches("unscale_geocentric", ["x", "y", "z"],
+                                                                  batching.as_columns(x, y, z)))
+
+    async def scale_time_batch(self, time, local=None):
+        if self.client._local(local):
+            return util.scale_time(batching.as_columns(time)[0])
+        result = batching.concat_rows(await self._column_batches("scale_time", ["time"], batching.as_columns(time)))
+        return None if result is None else result.ravel()
+
+    async def unscale_time_batch(self, time, local=None):
+        if self.client._local(local):
+            return util.unscale_time(batching.as_columns(time)[0])
+        result = batching.concat_rows(await self._column_batches("unscale_time", ["time"], batching.as_columns(time)))
+        return None if result is None else result.ravel()
+
+    async def lonlat_to_geocentric(self, lon, lat, elev=0, local=None):
+        if self.client._local(local):
+            return list(util.lonlat_to_geocentric(lon, lat, elev))
+        return await self._post("lonlat_to_geocentric", {"lon": lon, "lat": lat, "elev": elev}, self.client._result)
+
+    async def geocentric_to_lonlat(self, x, y, z, local=None):
+        if self.client._local(local):
+            return list(util.geocentric_to_lonlat(x, y, z))
+        return await self._post("geocentric_to_lonlat", {"x": x, "y": y, "z": z}, self.client._result)
+
+    async def scale_geocentric(self, x, y, z, local=None):
+        if self.client._local(local):
+            return list(util.scale_geocentric(x, y, z))
+        return await self._post("scale_geocentric", {"x": x, "y": y, "z": z}, self.client._result)
+
+    async def unscale_geocentric(self, x, y, z, local=None):
+        if self.client._local(local):
+            return list(util.unscale_geocentric(x, y, z))
+        return await self._post("unscale_geocentric", {"x": x, "y": y, "z": z}, self.client._result)
+
+    async def scale_time(self, time, local=None):
+        if self.client._local(local):
+            return util.scale_time(time)
+        return await self._post("scale_time", {"time": time}, self.client._result)
+
+    async def unscale_time(self, time, local=None):
+        if self.client._local(local):
+            return util.unscale_time(time)
+        return await self._post("unscale_time", {"time": time}, self.client._result)
+
+    async def version(self):
+        response = await self._get("version")
+        if response is None:
+            return None
+        return response['version']
+
+    async def constants(self):
+        return await self._get("constants")
+
+    # Async generator of origins from an async (or plain) iterable of arrival
+    # batches. The association steps run on the wrapped client in the default
+    # executor, one window at a time, as in Randl.associate_stream.
+    def associate_stream(self, batches, required_phases=5, exclude_associated_phases=False, travel_time=1800,
+                         verbose=True, **kwargs):
+        associator = StreamingAssociator(self.client, required_phases, exclude_associated_phases, travel_time,
+                                         verbose=verbose, **kwargs)
+        return associator.astream(batches)
+
+    def __repr__(self):
+        return "Async " + repr(self.client) + "\nMax concurrency:\t" + str(self.max_concurrency)
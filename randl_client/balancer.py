@@ -0,0 +1,138 @@
+import threading
+import time
+import requests
+
+
+class ServerPool:
+    # Spreads requests over several RaNDL replicas. Strategies:
+    #   'least_outstanding' - the healthy server with the fewest requests in
+    #                         flight relative to its weight
+    #   'round_robin'       - smooth weighted round robin
+    # A server that can't be reached is taken out for health_interval seconds;
+    # after that the next request that would pick it first checks its
+    # /version, and it is only used again if that answers.
+    def __init__(self, urls, strategy="least_outstanding", weights=None, health_interval=30.0, health_timeout=5.0):
+        if strategy not in ("least_outstanding", "round_robin"):
+            raise ValueError("strategy must be 'least_outstanding' or 'round_robin'")
+        self.urls = [u if u.endswith("/") else u + "/" for u in urls]
+        if len(self.urls) == 0:
+            raise ValueError("at least one server URL is required")
+        self.strategy = strategy
+        self.weights = dict(zip(self.urls, weights if weights is not None else [1] * len(self.urls)))
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self.outstanding = dict.fromkeys(self.urls, 0)
+        self.requests = dict.fromkeys(self.urls, 0)
+        self.failures = dict.fromkeys(self.urls, 0)
+        self.down_until = dict.fromkeys(self.urls, 0.0)
+        self.versions = dict.fromkeys(self.urls)
+        self.current = dict.fromkeys(self.urls, 0.0)
+        self.down = set()
+        self.checking = set()
+        self.lock = threading.Lock()
+
+    # locks don't pickle; a pool sent to another process starts with fresh state
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["lock"]
+        state["outstanding"] = dict.fromkeys(self.urls, 0)
+        state["checking"] = set()
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.urls)
+
+    def _candidates(self, now):
+        return [u for u in self.urls if u not in self.down or (self.down_until[u] <= now and u not in self.checking)]
+
+    def _pick(self, candidates):
+        if self.strategy == "round_robin":
+            total = sum(self.weights[u] for u in candidates)
+            for u in candidates:
+                self.current[u] += self.weights[u]
+            url = max(candidates, key=lambda u: self.current[u])
+            self.current[url] -= total
+            return url
+        return min(candidates, key=lambda u: (self.outstanding[u] / self.weights[u], self.requests[u]))
+
+    # Base URL for the next request; pair every acquire with a release.
+    # session and headers are used for health checks (see check).
+    def acquire(self, session=None, headers=None):
+        while True:
+            url, due = self.next_server()
+            if url is not None:
+                return url
+            try:
+                self.check(due, session, headers)
+            finally:
+                self.checked(due)
+
+    # (url, None) with url acquired as acquire would, or (None, url) when the
+    # server picked was taken out and needs a health check first; the caller
+    # checks it, calls checked(url) and asks again. For callers that can't
+    # block on the check (AsyncRandl).
+    def next_server(self):
+        now = time.monotonic()
+        with self.lock:
+            candidates = self._candidates(now)
+            # every server is down: use the one due back first and let the
+            # retry policy deal with the outcome
+            fallback = len(candidates) == 0
+            if fallback:
+                candidates = [min(self.urls, key=lambda u: self.down_until[u])]
+            url = self._pick(candidates)
+            if fallback or url not in self.down:
+                self.outstanding[url] += 1
+                self.requests[url] += 1
+                return url, None
+            self.checking.add(url)
+            return None, url
+
+    def checked(self, url):
+        with self.lock:
+            self.checking.discard(url)
+
+    def release(self, url, ok=True, down=False):
+        with self.lock:
+            self.outstanding[url] = max(self.outstanding[url] - 1, 0)
+            if not ok:
+                self.failures[url] += 1
+            if down:
+                self.down.add(url)
+                self.down_until[url] = time.monotonic() + self.health_interval
+
+    # GET /version on one server; marks it up or down and returns whether it
+    # answered. session is the client's pooled requests session and headers
+    # carry its access_token; without them a plain unauthenticated GET is sent.
+    def check(self, url, session=None, headers=None):
+        try:
+            response = (session or requests).get(url + "version", headers=headers, timeout=self.health_timeout)
+            ok = response.status_code == 200
+            version = response.json().get("version") if ok else None
+        except (requests.exceptions.RequestException, ValueError):
+            ok, version = False, None
+        return self.mark(url, ok, version)
+
+    # Record a health check's outcome
+    def mark(self, url, ok, version=None):
+        with self.lock:
+            self.versions[url] = version
+            if ok:
+                self.down.discard(url)
+                self.down_until[url] = 0.0
+            else:
+                self.down.add(url)
+                self.down_until[url] = time.monotonic() + self.health_interval
+        return ok
+
+    def check_all(self, session=None, headers=None):
+        return {u: (self.versions[u] if self.check(u, session, headers) else None) for u in self.urls}
+
+    def stats(self):
+        with self.lock:
+            return {u: {"weight": self.weights[u], "outstanding": self.outstanding[u], "requests": self.requests[u],
+                        "failures": self.failures[u], "up": u not in self.down} for u in self.urls}
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+
+# 2-D float array from a list of rows, an ndarray or a DataFrame
+def as_rows(inputs):
+    if isinstance(inputs, pd.DataFrame):
+        inputs = inputs.to_numpy()
+    rows = np.asarray(inputs, dtype=np.float64)
+    if rows.ndim == 1:
+        rows = rows.reshape(1, -1)
+    return rows
+
+
+# 1-D float arrays of equal length from scalars, lists, arrays or Series
+def as_columns(*values):
+    return np.broadcast_arrays(*[np.atleast_1d(np.asarray(v, dtype=np.float64)) for v in values])
+
+
+def chunk_bounds(n, max_rows):
+    return [(lo, min(lo + max_rows, n)) for lo in range(0, n, max_rows)]
+
+
+# Consecutive groups of items (e.g. windows) with sizes rows each, as (lo, hi)
+# bounds, holding at most max_rows rows unless a single item has more
+def group_bounds(sizes, max_rows):
+    bounds = []
+    lo, rows = 0, 0
+    for i, n in enumerate(sizes):
+        if i > lo and rows + n > max_rows:
+            bounds.append((lo, i))
+            lo, rows = i, 0
+        rows += n
+    if lo < len(sizes):
+        bounds.append((lo, len(sizes)))
+    return bounds
+
+
+# Results of row-batched endpoints, one block of rows per chunk
+def concat_rows(results):
+    if any(r is None for r in results):
+        return None
+    if len(results) == 0:
+        return np.empty((0,))
+    return np.concatenate([np.asarray(r, dtype=np.float64).reshape(len(r), -1) for r in results])
+
+
+# Results of column-batched endpoints (e.g. [xs, ys, zs] per chunk)
+def concat_columns(results):
+    if any(r is None for r in results):
+        return None
+    if len(results) == 0:
+        return ()
+    return tuple(np.concatenate(c) for c in zip(*[[np.atleast_1d(np.asarray(v, dtype=np.float64)) for v in r]
+                                                  for r in results]))
@@ -0,0 +1,38 @@
+import hashlib
+import pandas as pd
+from .compact import compact_bulletin, is_compact
+
+
+# Content hash of a bulletin, used as the server-side session handle
+def bulletin_hash(bulletin):
+    h = hashlib.sha256()
+    h.update(",".join(str(c) for c in bulletin.columns).encode())
+    h.update(pd.util.hash_pandas_object(bulletin, index=True).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+class BulletinHandle:
+    # Reference to a bulletin uploaded with Randl.upload_bulletin. Endpoint methods
+    # accept a handle wherever they accept a bulletin and send only the handle id.
+    # The local frame is kept so deltas can be mirrored and the handle re-uploaded.
+    def __init__(self, handle, bulletin):
+        self.handle = handle
+        self.bulletin = bulletin
+
+    def __len__(self):
+        return len(self.bulletin)
+
+    def __repr__(self):
+        return "BulletinHandle(" + self.handle[:12] + ", " + str(len(self.bulletin)) + " arrivals)"
+
+
+def apply_delta(bulletin, remove_arids=None, append=None):
+    if remove_arids is not None and len(remove_arids) > 0:
+        bulletin = bulletin[~bulletin['ARID'].isin(remove_arids)]
+    if append is not None and len(append) > 0:
+        compact = is_compact(bulletin)
+        bulletin = pd.concat([bulletin, append], ignore_index=True)
+        # keep a compact bulletin compact when string-form rows are appended
+        if compact:
+            bulletin = compact_bulletin(bulletin)
+    return bulletin
@@ -0,0 +1,145 @@
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+# Endpoints whose result depends only on the request, for a fixed server version
+deterministic_endpoints = {
+    "create_bulletin", "window", "dml_flex_handler", "dml_pwave_handler",
+    "taup_surrogate", "baz_surrogate", "baz_geo_surrogate",
+    "lonlat_to_geocentric", "geocentric_to_lonlat", "scale_geocentric", "unscale_geocentric",
+    "scale_time", "unscale_time",
+}
+
+
+class ResultCache:
+    # Memoizes raw response bodies keyed by a hash of the endpoint, the encoded
+    # request body and the server version. The memory tier is an LRU bounded by
+    # entry count; the optional disk tier is a directory of gzip blobs bounded by
+    # total size, evicting the least recently used files first.
+    def __init__(self, max_entries=1024, directory=None, max_disk_bytes=1 << 30, endpoints=None, version=""):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.endpoints = set(deterministic_endpoints if endpoints is None else endpoints)
+        self.version = str(version)
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.disk_bytes = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            self.disk_bytes = sum(os.path.getsize(p) for p in self._disk_files())
+
+    # locks don't pickle; the memory tier goes along, the disk tier is shared
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def _disk_files(self):
+        return [os.path.join(self.directory, f) for f in os.listdir(self.directory) if f.endswith(".gz")]
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".gz")
+
+    def caches(self, endpoint):
+        return endpoint in self.endpoints
+
+    def key(self, endpoint, codec_name, body):
+        h = hashlib.sha256()
+        for part in (self.version, endpoint, codec_name):
+            h.update(part.encode())
+            h.update(b"\0")
+        h.update(body if body is not None else b"")
+        return h.hexdigest()
+
+    # Returns (content, content_type) or None
+    def get(self, key):
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.memory_hits += 1
+                return self.memory[key]
+
+        if self.directory is not None:
+            path = self._path(key)
+            try:
+                with gzip.open(path, "rb") as f:
+                    content_type, content = f.read().split(b"\n", 1)
+                os.utime(path)
+            except (OSError, ValueError, EOFError):
+                pass
+            else:
+                entry = (content, content_type.decode() or None)
+                with self.lock:
+                    self.disk_hits += 1
+                    self._remember(key, entry)
+                return entry
+
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, content, content_type):
+        entry = (content, content_type)
+        with self.lock:
+            self._remember(key, entry)
+        if self.directory is not None:
+            self._write(key, entry)
+
+    def _remember(self, key, entry):
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def _write(self, key, entry):
+        content, content_type = entry
+        path = self._path(key)
+        tmp = path + "." + str(threading.get_ident()) + ".tmp"
+        with gzip.open(tmp, "wb", compresslevel=3) as f:
+            f.write((content_type or "").encode() + b"\n" + content)
+        old_size = os.path.getsize(path) if os.path.exists(path) else 0
+        os.replace(tmp, path)
+        with self.lock:
+            self.disk_bytes += os.path.getsize(path) - old_size
+            if self.disk_bytes > self.max_disk_bytes:
+                self._evict_disk()
+
+    def _evict_disk(self):
+        files = sorted(self._disk_files(), key=lambda p: os.path.getmtime(p))
+        total = sum(os.path.getsize(p) for p in files)
+        for path in files:
+            if total <= self.max_disk_bytes:
+                break
+            size = os.path.getsize(path)
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+        self.disk_bytes = total
+
+    def clear(self, disk=False):
+        with self.lock:
+            self.memory.clear()
+            if disk and self.directory is not None:
+                for path in self._disk_files():
+                    os.remove(path)
+                self.disk_bytes = 0
+
+    def stats(self):
+        with self.lock:
+            hits = self.memory_hits + self.disk_hits
+            total = hits + self.misses
+            return {"hits": hits, "memory_hits": self.memory_hits, "disk_hits": self.disk_hits,
+                    "misses": self.misses, "hit_rate": hits / total if total else 0.0,
+                    "entries": len(self.memory), "disk_bytes": self.disk_bytes}
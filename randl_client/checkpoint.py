@@ -0,0 +1,70 @@
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+
+# associate_bulletin loop state on disk. A checkpoint is a directory holding
+# state.json (start time/index, associated ARIDs, what the run was started
+# with) and the origins found so far as origins.parquet, or origins.pkl when no
+# Parquet engine is installed. Files are written to a temporary name and
+# renamed, so an interrupted save leaves the previous checkpoint intact.
+
+state_file = "state.json"
+origin_files = {"parquet": "origins.parquet", "pickle": "origins.pkl"}
+
+
+def _json_default(obj):
+    if hasattr(obj, "item"):
+        return obj.item()
+    return str(obj)
+
+
+def _replace(path, write):
+    tmp = path + ".tmp"
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def save_checkpoint(directory, starttime, start_index, associated_arids, origins, key=None):
+    os.makedirs(directory, exist_ok=True)
+    try:
+        _replace(os.path.join(directory, origin_files["parquet"]), lambda p: origins.to_parquet(p, index=False))
+        origins_format = "parquet"
+    except ImportError:
+        _replace(os.path.join(directory, origin_files["pickle"]), origins.to_pickle)
+        origins_format = "pickle"
+
+    state = {"starttime": str(pd.Timestamp(starttime)), "start_index": int(start_index),
+             "associated_arids": list(associated_arids), "n_origins": len(origins),
+             "origins_format": origins_format, "key": key, "saved_at": time.time()}
+
+    def write(p):
+        with open(p, "w") as f:
+            json.dump(state, f, default=_json_default)
+    _replace(os.path.join(directory, state_file), write)
+
+
+# Returns the saved state with its origins frame under "origins", or None if
+# there is no checkpoint in directory
+def load_checkpoint(directory):
+    path = os.path.join(directory, state_file)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        state = json.load(f)
+
+    origins_path = os.path.join(directory, origin_files[state["origins_format"]])
+    if state["origins_format"] == "parquet":
+        origins = pd.read_parquet(origins_path)
+    else:
+        origins = pd.read_pickle(origins_path)
+    # origins are written before the state, so they may be ahead of it
+    origins = origins.iloc[:state["n_origins"]].reset_index(drop=True)
+    # Parquet gives back arrays for list cells
+    for c in origins.columns:
+        if origins[c].dtype == object:
+            origins[c] = [v.tolist() if isinstance(v, np.ndarray) else v for v in origins[c]]
+    state["origins"] = origins
+    state["starttime"] = pd.Timestamp(state["starttime"])
+    return state
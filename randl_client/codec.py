@@ -0,0 +1,285 @@
+import gzip
+import json
+from io import StringIO
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_string_dtype
+from .compact import expand_bulletin
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Request/response body codecs. Endpoint request builders leave DataFrames in
+# the request dict and the transport's codec decides how they go on the wire.
+
+
+def _json_default(obj):
+    if isinstance(obj, pd.DataFrame):
+        return expand_bulletin(obj).to_dict()
+    if isinstance(obj, (np.integer, np.floating, np.bool_)):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    return str(obj)
+
+
+# orjson fast path. A DataFrame is written as the same {column: {label: value}}
+# JSON that to_dict() gives, but straight from the column arrays: numeric and
+# string columns are serialized in one call and split into values, the index
+# labels are serialized once and spliced in front of them. NaN goes out as null.
+_array_dtypes = {np.dtype(t) for t in ("float64", "int8", "int16", "int32", "int64", "uint8", "uint16", "uint32",
+                                      "uint64", "bool")}
+_numpy_option = orjson.OPT_SERIALIZE_NUMPY if orjson is not None else 0
+
+
+def _dumps(obj):
+    # frames nested deeper in the request go through to_dict(), hence the
+    # integer keys
+    return orjson.dumps(obj, default=_json_default, option=_numpy_option | orjson.OPT_NON_STR_KEYS)
+
+
+def _json_keys(index):
+    if index.dtype.kind in "iu":
+        return [b'"%d":' % k for k in index.tolist()]
+    return [orjson.dumps(str(k)) + b":" for k in index.tolist()]
+
+
+def _dumps_column(column, keys):
+    values = column.to_numpy()
+    if values.dtype in _array_dtypes:
+        parts = orjson.dumps(np.ascontiguousarray(values), option=_numpy_option)[1:-1].split(b",")
+        return b"{" + b",".join(map(bytes.__add__, keys, parts)) + b"}"
+    values = column.tolist()
+    if values and all(type(v) is str for v in values):
+        # quotes inside a serialized string are escaped, so '","' only ever
+        # separates two values
+        parts = orjson.dumps(values)[2:-2].split(b'","')
+        return b"{" + b'",'.join(map(bytes.__add__, keys, map(b'"'.__add__, parts))) + b'"}'
+    return b"{" + b",".join(k + _dumps(v) for k, v in zip(keys, values)) + b"}"
+
+
+def _dumps_frame(df):
+    df = expand_bulletin(df)
+    keys = _json_keys(df.index)
+    columns = [orjson.dumps(str(c)) + b":" + _dumps_column(df.iloc[:, i], keys) for i, c in enumerate(df.columns)]
+    return b"{" + b",".join(columns) + b"}"
+
+
+def dumps_request(req):
+    if orjson is None:
+        return json.dumps(req, default=_json_default).encode()
+    if not isinstance(req, dict):
+        return _dumps(req)
+    # frames at the top of the request, where endpoints put them, skip the
+    # default hook
+    return b"{" + b",".join(orjson.dumps(str(k)) + b":" + (_dumps_frame(v) if isinstance(v, pd.DataFrame) else _dumps(v))
+                            for k, v in req.items()) + b"}"
+
+
+def loads(content):
+    if orjson is not None:
+        try:
+            return orjson.loads(content)
+        except orjson.JSONDecodeError:
+            pass  # NaN/Infinity, which Python servers write but orjson rejects
+    return json.loads(content)
+
+
+class JsonCodec:
+    name = "json"
+    content_type = "application/json"
+
+    # fast uses orjson when it is installed, otherwise the json module
+    def __init__(self, fast=True):
+        self.fast = fast and orjson is not None
+
+    def encode(self, req):
+        if self.fast:
+            body = dumps_request(req)
+        else:
+            body = json.dumps(req, default=_json_default).encode()
+        return body, {"Content-Type": self.content_type}
+
+    def decode(self, content, content_type=None):
+        return loads(content) if self.fast else json.loads(content)
+
+
+def _encode_array(values):
+    if values.dtype.kind in "biuf":
+        return {"dtype": values.dtype.str, "data": np.ascontiguousarray(values).tobytes()}
+    if values.dtype.kind == "M":
+        return {"dtype": "object", "data": [str(v) for v in pd.DatetimeIndex(values)]}
+    data = []
+    for v in values.tolist():
+        if v is None or isinstance(v, (str, int, float, bool, list, dict)):
+            data.append(v)
+        else:
+            data.append(str(v))
+    return {"dtype": "object", "data": data}
+
+
+def _decode_array(column):
+    if column["dtype"] == "object":
+        return column["data"]
+    return np.frombuffer(column["data"], dtype=np.dtype(column["dtype"]))
+
+
+# Column-oriented frame: numeric columns travel as typed buffers, everything
+# else as a flat list, instead of an {index: value} dict per column.
+def encode_frame(df):
+    df = expand_bulletin(df)
+    return {"__frame__": 1, "columns": [str(c) for c in df.columns],
+            "index": _encode_array(df.index.to_numpy()),
+            "data": {str(c): _encode_array(df[c].to_numpy()) for c in df.columns}}
+
+
+def decode_frame(frame):
+    data = {c: _decode_array(frame["data"][c]) for c in frame["columns"]}
+    return pd.DataFrame(data, index=pd.Index(_decode_array(frame["index"])), columns=frame["columns"])
+
+
+# pd.read_json for the {column: {label: value}} strings frame endpoints return,
+# with orjson and the same dtype inference: numeric strings become floats,
+# integral floats become int64, and columns read_json treats as dates
+# (keep_default_dates names) are left to read_json itself. Returns None for
+# anything else (other layouts, no rows, labels that aren't small integers) so
+# the caller falls back to read_json.
+min_stamp = 31536000  # read_json parses integer labels above this as epoch dates
+
+
+def _date_column(name):
+    name = name.lower()
+    return name.endswith(("_at", "_time")) or name in ("modified", "date", "datetime") or name.startswith("timestamp")
+
+
+def _numeric_label(name):
+    try:
+        float(name)
+        return True
+    except ValueError:
+        return False
+
+
+def _convert_column(values):
+    data = original = pd.Series(values)
+    if is_string_dtype(data.dtype):
+        try:
+            data = data.astype("float64")
+        except (TypeError, ValueError):
+            pass
+    if len(data) and data.dtype in ("float", "object"):
+        try:
+            integers = original.astype("int64")
+            if (integers == data).all():
+                data = integers
+        except (TypeError, ValueError, OverflowError):
+            pass
+    return data.array
+
+
+def _read_json_fast(text):
+    try:
+        data = orjson.loads(text)
+    except orjson.JSONDecodeError:
+        return None
+    if not isinstance(data, dict) or not data or not all(isinstance(v, dict) for v in data.values()):
+        return None
+    if all(_numeric_label(name) for name in data):
+        return None
+    labels = list(next(iter(data.values())))
+    if not labels or any(list(v) != labels for v in data.values()):
+        return None
+    try:
+        index = np.array(labels).astype(np.int64)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    if len(index) and index.min() > min_stamp:
+        return None
+
+    columns = {}
+    for name, values in data.items():
+        if _date_column(name):
+            columns[name] = pd.read_json(StringIO(orjson.dumps({name: values}).decode()))[name].array
+        else:
+            columns[name] = _convert_column(list(values.values()))
+    return pd.DataFrame(columns, index=pd.Index(index))
+
+
+def read_frame(result, fast=True):
+    # frame endpoints return either a columnar frame or the legacy JSON string
+    if isinstance(result, dict) and result.get("__frame__"):
+        return decode_frame(result)
+    if fast and orjson is not None:
+        frame = _read_json_fast(result)
+        if frame is not None:
+            return frame
+    return pd.read_json(StringIO(result))
+
+
+def _compressor(compression):
+    if compression == "gzip":
+        return lambda data: gzip.compress(data, compresslevel=1)
+    if compression == "zstd":
+        import zstandard
+        return zstandard.ZstdCompressor(level=3).compress
+    return None
+
+
+class ColumnarCodec:
+    name = "columnar"
+    content_type = "application/x-msgpack"
+
+    def __init__(self, compression=None):
+        import msgpack  # fail early if msgpack is not installed
+        self.compression = compression
+
+    def _pack_default(self, obj):
+        if isinstance(obj, pd.DataFrame):
+            return encode_frame(obj)
+        return _json_default(obj)
+
+    def encode(self, req):
+        import msgpack
+        body = msgpack.packb(req, default=self._pack_default, use_bin_type=True)
+        headers = {"Content-Type": self.content_type, "accept": self.content_type + ", application/json"}
+        compress = _compressor(self.compression)
+        if compress is not None:
+            body = compress(body)
+            headers["Content-Encoding"] = self.compression
+        return body, headers
+
+    def decode(self, content, content_type=None):
+        # servers without columnar support still answer in JSON
+        if content_type is not None and content_type.startswith(self.content_type):
+            import msgpack
+            return msgpack.unpackb(content, raw=False)
+        return loads(content)
+
+
+def available_compressions():
+    available = ["gzip"]
+    try:
+        import zstandard
+        available.insert(0, "zstd")
+    except ImportError:
+        pass
+    return available
+
+
+def negotiate_codec(advertised, fast=True):
+    # advertised is the server's wire_formats response, e.g.
+    # {"formats": ["json", "columnar"], "compression": ["gzip", "zstd"]}
+    if not advertised or "columnar" not in advertised.get("formats", []):
+        return JsonCodec(fast)
+    try:
+        import msgpack
+    except ImportError:
+        return JsonCodec(fast)
+    compression = None
+    for c in available_compressions():
+        if c in advertised.get("compression", []):
+            compression = c
+            break
+    return ColumnarCodec(compression)
@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+
+# Compact in-memory layout for bulletins: arrival and origin times as
+# datetime64[ns], station and phase codes as categoricals, and narrower numeric
+# columns where no value changes. The string form the server expects is only
+# rebuilt when a frame is encoded for a request (see expand_bulletin).
+
+time_columns = ("TIME_ARRIV", "ORIG_TIME")
+category_columns = ("STA", "IPHASE")
+coordinate_columns = ("LAT_STA", "LON_STA", "ORIG_LAT", "ORIG_LON")
+integer_columns = ("ARID", "BACK_AZIMUTH")
+
+# pandas 2 infers one format from the first time string, so bulletins mixing
+# whole and fractional seconds need format='ISO8601'. pandas 1 doesn't know
+# that format but parses each string on its own anyway.
+_iso8601 = {"format": "ISO8601"} if int(pd.__version__.split(".")[0]) >= 2 else {}
+
+
+def parse_times(values):
+    return pd.to_datetime(values, **_iso8601)
+
+
+# float32 is used only if every value comes back unchanged through its
+# shortest float32 representation, which is how it is expanded again
+def _float32_safe(values):
+    unique = np.unique(values)
+    return np.array_equal(unique.astype(np.float32).astype(str).astype(np.float64), unique, equal_nan=True)
+
+
+def compact_bulletin(bulletin):
+    compact = bulletin.copy()
+    for c in time_columns:
+        if c in compact.columns and compact[c].dtype.kind != 'M':
+            compact[c] = parse_times(compact[c]).astype('datetime64[ns]')
+    for c in category_columns:
+        if c in compact.columns and not isinstance(compact[c].dtype, pd.CategoricalDtype):
+            compact[c] = compact[c].astype('category')
+    for c in coordinate_columns:
+        if c in compact.columns and compact[c].dtype == np.float64 and _float32_safe(compact[c].to_numpy()):
+            compact[c] = compact[c].astype(np.float32)
+    for c in integer_columns:
+        if c in compact.columns and compact[c].dtype.kind in 'iu':
+            compact[c] = pd.to_numeric(compact[c], downcast='integer')
+    return compact
+
+
+def is_compact(df):
+    return any(dtype.kind == 'M' or dtype == np.float32 or isinstance(dtype, pd.CategoricalDtype)
+               or (dtype.kind in 'iu' and dtype.itemsize < 8) for dtype in df.dtypes)
+
+
+# String form of a compact frame, as create_bulletin returns it. Frames that are
+# already in that form are returned as they are.
+def expand_bulletin(df):
+    if not is_compact(df):
+        return df
+    expanded = df.copy(deep=False)
+    for c in df.columns:
+        dtype = df[c].dtype
+        if dtype.kind == 'M' or isinstance(dtype, pd.CategoricalDtype):
+            expanded[c] = df[c].astype(str)
+        elif dtype == np.float32:
+            expanded[c] = df[c].astype(str).astype(np.float64)
+        elif dtype.kind in 'iu' and dtype.itemsize < 8:
+            expanded[c] = df[c].astype(np.int64)
+    return expanded
+
+
+# Bytes per column of a bulletin in the string and the compact layout
+def memory_report(bulletin):
+    expanded = expand_bulletin(bulletin)
+    compact = compact_bulletin(bulletin)
+    string_bytes = expanded.memory_usage(deep=True, index=False)
+    compact_bytes = compact.memory_usage(deep=True, index=False)
+    report = pd.DataFrame({"string_dtype": expanded.dtypes.astype(str), "string_bytes": string_bytes,
+                           "compact_dtype": compact.dtypes.astype(str), "compact_bytes": compact_bytes})
+    report.loc["total"] = ["", string_bytes.sum(), "", compact_bytes.sum()]
+    report["ratio"] = report["compact_bytes"] / report["string_bytes"]
+    return report
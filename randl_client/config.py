@@ -0,0 +1,240 @@
+import dataclasses
+import functools
+import sys
+from dataclasses import dataclass
+from types import MappingProxyType
+
+# Endpoint settings as frozen dataclasses, one per pipeline stage. They are
+# validated when created and serialized once into the request fragment the
+# endpoints send (the strings the server has always been sent), so a request is
+# the cached fragment plus its frames. Randl keeps a RandlConfig in
+# Randl.config; endpoint methods take config= to override it for one call.
+
+# slots=True needs Python 3.10
+_slotted = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+
+def _check(config, name, types, positive=False, non_negative=False):
+    value = getattr(config, name)
+    # bool is an int subclass, but True isn't a sample count
+    if type(value) not in types:
+        raise TypeError("%s.%s must be %s, got %r" % (type(config).__name__, name,
+                                                     " or ".join(t.__name__ for t in types), value))
+    if positive and value <= 0:
+        raise ValueError("%s.%s must be positive, got %r" % (type(config).__name__, name, value))
+    if non_negative and value < 0:
+        raise ValueError("%s.%s must be non-negative, got %r" % (type(config).__name__, name, value))
+
+
+def _check_fields(config, positive=(), non_negative=()):
+    for f in dataclasses.fields(config):
+        value = getattr(config, f.name)
+        if f.type is float and type(value) is int:
+            object.__setattr__(config, f.name, float(value))
+        elif f.type is tuple and type(value) is list:
+            object.__setattr__(config, f.name, tuple(value))
+        _check(config, f.name, (f.type,), f.name in positive, f.name in non_negative)
+
+
+# The request fragment of a config, built on first use
+@functools.lru_cache(maxsize=256)
+def request_fragment(config):
+    return MappingProxyType(config.request())
+
+
+class _Stage:
+    __slots__ = ()
+
+    def fragment(self):
+        return request_fragment(self)
+
+    def replace(self, **changes):
+        return dataclasses.replace(self, **changes)
+
+
+@dataclass(frozen=True, **_slotted)
+class BulletinConfig(_Stage):
+    start: str = '2024-05-01T00:00:00'
+    end: str = '2024-05-11T00:00:00'
+    n_stations: int = 100
+    n_events: int = 1
+    drop_fraction: float = 0.2
+    seed: int = 555
+
+    def __post_init__(self):
+        _check_fields(self, positive=("n_stations", "n_events"), non_negative=("drop_fraction",))
+        if self.drop_fraction >= 1:
+            raise ValueError("BulletinConfig.drop_fraction must be below 1, got %r" % self.drop_fraction)
+
+    def request(self):
+        return {'n_stations': str(self.n_stations), "n_events": str(self.n_events),
+                "drop_fraction": str(self.drop_fraction), "datetime_start": self.start, "datetime_end": self.end,
+                "seed": str(self.seed)}
+
+
+@dataclass(frozen=True, **_slotted)
+class WindowConfig(_Stage):
+    start: str = '2024-05-10 18:43:15.431390'
+    length: int = 1800
+    min_phases: int = 5
+    exclude_associated_phases: bool = False
+    step_size: int = 1
+
+    def __post_init__(self):
+        _check_fields(self, positive=("length", "step_size"), non_negative=("min_phases",))
+
+    def request(self):
+        return {'window_length': str(self.length), "min_phases_needed": str(self.min_phases),
+                "exclude_associated_phases": str(self.exclude_associated_phases), "step_size": self.step_size,
+                "start_time": self.start}
+
+
+@dataclass(frozen=True, **_slotted)
+class DMLConfig(_Stage):
+    models: tuple = ('flex',)
+    sampling: tuple = ('full',)
+    num_samples: int = 10
+    sta_count: int = 5
+    arids: tuple = ('None',)
+    pwave_model: str = 'None'
+    baz_model: str = 'None'
+    exclude_duplicate_stations: bool = True
+
+    def __post_init__(self):
+        _check_fields(self, positive=("num_samples", "sta_count"))
+        if len(self.models) == 0:
+            raise ValueError("DMLConfig.models must name at least one model")
+
+    @property
+    def endpoint(self):
+        return "dml_flex_handler" if self.models[0] == 'flex' else "dml_pwave_handler"
+
+    def request(self):
+        return {"models": list(self.models), "sampling": list(self.sampling), "num_samples": str(self.num_samples),
+                "sta_count": str(self.sta_count), "arids": list(self.arids), "pwave_model": self.pwave_model,
+                "baz_model": self.baz_model, "exclude_duplicate_stations": str(self.exclude_duplicate_stations)}
+
+
+@dataclass(frozen=True, **_slotted)
+class BeamConfig(_Stage):
+    width: int = 5
+    max_dist: int = 5000
+    max_time: int = 500
+    sequence_dist: int = 500
+    sequence_time: int = 500
+
+    def __post_init__(self):
+        _check_fields(self, positive=("width", "max_dist", "max_time", "sequence_dist", "sequence_time"))
+
+    def request(self):
+        return {"beam_width": str(self.width), "max_dist": str(self.max_dist), "max_time": str(self.max_time),
+                "sequence_dist": str(self.sequence_dist), "sequence_time": str(self.sequence_time)}
+
+
+@dataclass(frozen=True, **_slotted)
+class OctreeConfig(_Stage):
+    time_spacing: int = 15
+    time_samples: int = 11
+    loc_samples: int = 11
+    loc_spacing: float = 0.017
+    time_threshold: int = 10
+    iterations: int = 3
+    # client-side prefiltering of the bulletin (see prefilter.BulletinFilter);
+    # not part of the request
+    prefilter: bool = False
+    prefilter_margin: float = 120.0
+    prefilter_radius: float = 10.0
+    prefilter_max_distance: float = 180.0
+
+    def __post_init__(self):
+        _check_fields(self, positive=("time_spacing", "time_samples", "loc_samples", "loc_spacing", "iterations"),
+                      non_negative=("time_threshold", "prefilter_margin", "prefilter_radius", "prefilter_max_distance"))
+
+    def prefilter_options(self):
+        return {"margin": self.prefilter_margin, "radius": self.prefilter_radius,
+                "max_distance": self.prefilter_max_distance}
+
+    def request(self):
+        return {"time_spacing": str(self.time_spacing), "time_threshold": str(self.time_threshold),
+                "loc_spacing": str(self.loc_spacing), "loc_samples": str(self.loc_samples),
+                "time_samples": str(self.time_samples), "iterations": str(self.iterations)}
+
+
+stages = {"bulletin": BulletinConfig, "window": WindowConfig, "dml": DMLConfig, "beam": BeamConfig,
+          "octree": OctreeConfig}
+
+
+@dataclass(frozen=True, **_slotted)
+class RandlConfig:
+    bulletin: BulletinConfig = BulletinConfig()
+    window: WindowConfig = WindowConfig()
+    dml: DMLConfig = DMLConfig()
+    beam: BeamConfig = BeamConfig()
+    octree: OctreeConfig = OctreeConfig()
+
+    def __post_init__(self):
+        for name, cls in stages.items():
+            if not isinstance(getattr(self, name), cls):
+                raise TypeError("RandlConfig.%s must be a %s" % (name, cls.__name__))
+
+    # A copy with some stages changed. Each keyword is a stage name with either
+    # a config for that stage or a dict of its fields to change, e.g.
+    #   config.override(beam={"width": 7}, window=WindowConfig(length=900))
+    def override(self, **stage_changes):
+        changed = {}
+        for name, change in stage_changes.items():
+            if name not in stages:
+                raise TypeError("Unknown configuration stage: " + name)
+            changed[name] = change if isinstance(change, stages[name]) else getattr(self, name).replace(**change)
+        return dataclasses.replace(self, **changed)
+
+
+# Randl's original string attributes (bulletin_n_stations = '100', ...) map
+# onto config fields. Reading one gives the value as it was stored before,
+# assigning one parses it into the config.
+legacy_attributes = {
+    "bulletin_start": ("bulletin", "start"), "bulletin_end": ("bulletin", "end"),
+    "bulletin_n_stations": ("bulletin", "n_stations"), "bulletin_n_events": ("bulletin", "n_events"),
+    "bulletin_drop_fraction": ("bulletin", "drop_fraction"), "bulletin_seed": ("bulletin", "seed"),
+    "window_start": ("window", "start"), "window_length": ("window", "length"),
+    "window_min_phases_needed": ("window", "min_phases"),
+    "window_exclude_associated_phases": ("window", "exclude_associated_phases"),
+    "window_step_size": ("window", "step_size"),
+    "dml_models": ("dml", "models"), "dml_sampling": ("dml", "sampling"), "dml_num_samples": ("dml", "num_samples"),
+    "dml_sta_count": ("dml", "sta_count"), "dml_arids": ("dml", "arids"),
+    "dml_pwave_modelpath": ("dml", "pwave_model"), "dml_baz_modelpath": ("dml", "baz_model"),
+    "dml_exclude_duplicate_stations": ("dml", "exclude_duplicate_stations"),
+    "beam_width": ("beam", "width"), "beam_max_dist": ("beam", "max_dist"), "beam_max_time": ("beam", "max_time"),
+    "beam_sequence_dist": ("beam", "sequence_dist"), "beam_sequence_timedist": ("beam", "sequence_time"),
+    "octree_time_spacing": ("octree", "time_spacing"), "octree_time_samples": ("octree", "time_samples"),
+    "octree_loc_samples": ("octree", "loc_samples"), "octree_loc_spacing": ("octree", "loc_spacing"),
+    "octree_time_threshold": ("octree", "time_threshold"), "octree_iterations": ("octree", "iterations"),
+    "octree_prefilter": ("octree", "prefilter"), "octree_prefilter_margin": ("octree", "prefilter_margin"),
+    "octree_prefilter_radius": ("octree", "prefilter_radius"),
+    "octree_prefilter_max_distance": ("octree", "prefilter_max_distance"),
+}
+
+# fields that were kept as values rather than strings
+_unconverted = {"window_step_size", "octree_prefilter", "octree_prefilter_margin", "octree_prefilter_radius",
+                "octree_prefilter_max_distance"}
+
+
+def _field_type(stage, field):
+    return {f.name: f.type for f in dataclasses.fields(stages[stage])}[field]
+
+
+def legacy_value(name, value):
+    if name in _unconverted:
+        return value
+    if type(value) is tuple:
+        return list(value)
+    return value if type(value) is str else str(value)
+
+
+def parse_legacy(stage, field, value):
+    t = _field_type(stage, field)
+    if t is bool:
+        return value if type(value) is bool else str(value) == 'True'
+    if t is tuple:
+        return tuple(value)
+    return t(value)
@@ -0,0 +1,97 @@
+import threading
+from concurrent.futures import Future
+import pandas as pd
+
+# Column tagging each window's rows in a batched DML request and its result
+window_id_column = "WINDOW_ID"
+
+
+# One request's catalog: the windows stacked, each tagged with its id
+def stack_windows(windows, ids):
+    return pd.concat([w.assign(**{window_id_column: i}) for w, i in zip(windows, ids)], ignore_index=True)
+
+
+# The predictions for each id, in order, from a batched result. A window the
+# server returned nothing for gets an empty frame with the result's columns.
+def split_predictions(result, ids):
+    if result is None:
+        return [None] * len(ids)
+    columns = [c for c in result.columns if c != window_id_column]
+    parts = {i: part[columns].reset_index(drop=True) for i, part in result.groupby(window_id_column, sort=False)}
+    return [parts[i] if i in parts else pd.DataFrame(columns=columns) for i in ids]
+
+
+class _Group:
+    def __init__(self):
+        self.windows = []
+        self.futures = []
+        self.rows = 0
+        self.closed = threading.Event()
+
+
+class DMLBatcher:
+    # Groups dml_prediction calls made at about the same time on different
+    # threads (the window prefetcher's workers, parallel partitions, sweep
+    # configurations) into dml_prediction_batch requests. The first call with
+    # a given DML config waits up to max_wait seconds for others to join, or
+    # until max_windows windows or client.batch_max_rows rows have, then sends
+    # them all and hands each caller its own window's predictions.
+    def __init__(self, client, max_wait=0.02, max_windows=32):
+        self.client = client
+        self.max_wait = max_wait
+        self.max_windows = max_windows
+        self.lock = threading.Lock()
+        self.groups = {}
+        self.requests = 0
+        self.windows = 0
+
+    # locks don't pickle; a copy in a worker process batches on its own
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["lock"]
+        state["groups"] = {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    # config is the caller's (a RandlConfig); None means the batcher's client's
+    def predict(self, window, config=None):
+        config = self.client._config(config)
+        # the DML stage config is frozen, so calls with the same settings share a key
+        key = config.dml
+        future = Future()
+        with self.lock:
+            group = self.groups.get(key)
+            if group is not None and group.windows and group.rows + len(window) > self.client.batch_max_rows:
+                # full; its leader sends it and this call starts the next one
+                del self.groups[key]
+                group.closed.set()
+                group = None
+            leader = group is None
+            if leader:
+                group = self.groups[key] = _Group()
+            group.windows.append(window)
+            group.futures.append(future)
+            group.rows += len(window)
+            if len(group.windows) >= self.max_windows:
+                del self.groups[key]
+                group.closed.set()
+
+        if leader:
+            group.closed.wait(self.max_wait)
+            with self.lock:
+                if self.groups.get(key) is group:
+                    del self.groups[key]
+                self.requests += 1
+                self.windows += len(group.windows)
+            try:
+                results = self.client._dml_prediction_batch(group.windows, config)
+            except BaseException as e:
+                for f in group.futures:
+                    f.set_exception(e)
+            else:
+                for f, result in zip(group.futures, results):
+                    f.set_result(result)
+        return future.result()
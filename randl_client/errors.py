@@ -0,0 +1,53 @@
+# Exceptions raised when a request to the RaNDL server fails. All of them
+# derive from RandlError and carry the endpoint and the number of attempts made.
+
+
+class RandlError(Exception):
+    def __init__(self, message, endpoint=None, attempts=1):
+        super().__init__(message)
+        self.endpoint = endpoint
+        self.attempts = attempts
+
+
+# The server answered with a status other than 200
+class RandlHTTPError(RandlError):
+    def __init__(self, endpoint, status, body="", attempts=1, retry_after=None):
+        super().__init__("%s returned HTTP %d: %s" % (endpoint, status, body[:200]), endpoint, attempts)
+        self.status = status
+        self.body = body
+        self.retry_after = retry_after
+
+
+# The request could not be sent or no response came back
+class RandlConnectionError(RandlError):
+    def __init__(self, endpoint, cause, attempts=1, sent=True):
+        super().__init__("%s: %s" % (endpoint, cause), endpoint, attempts)
+        self.cause = cause
+        # False when the request can't have reached the server (connect failure)
+        self.sent = sent
+
+
+class RandlTimeoutError(RandlConnectionError):
+    pass
+
+
+# The call's deadline passed before a successful response
+class RandlDeadlineError(RandlError):
+    def __init__(self, endpoint, deadline, attempts=1, last_error=None):
+        super().__init__("%s: no response within the %.1f s deadline after %d attempt(s)" % (endpoint, deadline, attempts),
+                         endpoint, attempts)
+        self.deadline = deadline
+        self.last_error = last_error
+
+
+# The circuit breaker is open and won't close within the call's deadline
+class RandlCircuitOpenError(RandlError):
+    def __init__(self, endpoint, retry_after, attempts=0):
+        super().__init__("%s: circuit open, server marked overloaded for another %.1f s" % (endpoint, retry_after),
+                         endpoint, attempts)
+        self.retry_after = retry_after
+
+
+# A 200 response without the expected content
+class RandlResponseError(RandlError):
+    pass
@@ -0,0 +1,157 @@
+import threading
+import time
+from collections import deque
+import pandas as pd
+
+# Client-side timing of endpoint calls. Transport fills a CallRecord for every
+# request; when a Metrics object is installed (Randl.enable_metrics) the
+# records are kept for percentiles and passed to hooks, otherwise they are
+# dropped.
+
+stages = ("serialize", "network", "deserialize", "wait", "total")
+record_columns = ("endpoint", "method", "server", "attempts", "cached", "error", "request_bytes", "response_bytes") \
+    + stages
+
+
+class CallRecord:
+    # One endpoint call. Times are in seconds:
+    #   serialize   - encoding the request body
+    #   network     - every attempt's round trip, including reading the body
+    #   deserialize - decoding the body and building the result (DataFrames etc.)
+    #   wait        - the rest: backoff, circuit breaker and server pool waits
+    #   total       - the whole call
+    def __init__(self, endpoint, method="POST"):
+        self.endpoint = endpoint
+        self.method = method
+        self.server = None
+        self.attempts = 0
+        self.cached = False
+        self.error = None
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.serialize = 0.0
+        self.network = 0.0
+        self.deserialize = 0.0
+        self.wait = 0.0
+        self.total = 0.0
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+
+    def finish(self):
+        self.total = time.perf_counter() - self.started
+        self.wait = max(self.total - self.serialize - self.network - self.deserialize, 0.0)
+
+    def as_tuple(self):
+        return tuple(getattr(self, c) for c in record_columns)
+
+    def as_dict(self):
+        return dict(zip(record_columns, self.as_tuple()))
+
+
+class Metrics:
+    # Keeps the last max_samples calls. Hooks are called with each finished
+    # CallRecord, from the thread that made the call.
+    def __init__(self, max_samples=100000):
+        self.calls = deque(maxlen=max_samples)
+        self.count = 0
+        self.hooks = []
+        self.lock = threading.Lock()
+
+    # locks and hooks don't pickle; a copy sent to another process starts empty
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["lock"]
+        state.update(calls=deque(maxlen=self.calls.maxlen), count=0, hooks=[])
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook):
+        self.hooks.remove(hook)
+
+    def record(self, call):
+        call.finish()
+        with self.lock:
+            self.count += 1
+            self.calls.append((self.count, call))
+        for hook in self.hooks:
+            try:
+                hook(call)
+            except Exception as e:
+                print("Metrics hook failed:", e)
+
+    # Number of calls recorded so far; pass it to summary(since=...) to only
+    # look at calls made after this point
+    def mark(self):
+        return self.count
+
+    def frame(self, since=0):
+        with self.lock:
+            rows = [call.as_tuple() for n, call in self.calls if n > since]
+        return pd.DataFrame(rows, columns=list(record_columns))
+
+    # Per endpoint: calls, errors, cache hits, attempts, summed call time and
+    # p50/p95/p99 of each stage in milliseconds, mean payload sizes in KiB.
+    # Sorted by summed time, so the endpoint the run spent most time in is first.
+    def summary(self, since=0):
+        df = self.frame(since)
+        g = df.groupby("endpoint")
+        out = pd.DataFrame({"calls": g.size(), "errors": g.error.count(), "cached": g.cached.sum(),
+                            "attempts": g.attempts.sum(), "time_s": g.total.sum()})
+        for stage in stages:
+            for q in (50, 95, 99):
+                out["%s_p%d_ms" % (stage, q)] = g[stage].quantile(q / 100) * 1000
+        out["request_kib"] = g.request_bytes.mean() / 1024
+        out["response_kib"] = g.response_bytes.mean() / 1024
+        return out.sort_values("time_s", ascending=False)
+
+    # summary() as a printable table with one p50/p95/p99 column per stage
+    def report(self, since=0):
+        s = self.summary(since)
+        if len(s) == 0:
+            return "No endpoint calls recorded."
+        table = pd.DataFrame({"calls": s.calls, "errors": s.errors, "time_s": s.time_s.round(2)}, index=s.index)
+        for stage in ("serialize", "network", "deserialize", "total"):
+            table[stage + " ms p50/p95/p99"] = ["%.1f/%.1f/%.1f" % tuple(v) for v in
+                                                s[["%s_p%d_ms" % (stage, q) for q in (50, 95, 99)]].values]
+        table["req/resp KiB"] = ["%.1f/%.1f" % tuple(v) for v in s[["request_kib", "response_kib"]].values]
+        return table.to_string()
+
+    # report() headed by how much of a run of elapsed seconds went to endpoint
+    # calls (summed, so concurrent calls can add up to more than the run)
+    def run_report(self, since, elapsed):
+        calls = self.frame(since)
+        return "\n%d endpoint calls took %.2f s of the %.2f s run\n%s" % (
+            len(calls), calls.total.sum(), elapsed, self.report(since))
+
+    def reset(self):
+        with self.lock:
+            self.calls.clear()
+            self.count = 0
+
+
+# A hook that turns every call into an OpenTelemetry span ("randl.<endpoint>")
+# with the stage times, sizes and attempts as attributes. Needs opentelemetry-api.
+def opentelemetry_hook(tracer=None):
+    try:
+        from opentelemetry import trace
+    except ImportError:
+        raise ImportError("opentelemetry_hook requires opentelemetry-api (pip install opentelemetry-api)")
+    if tracer is None:
+        tracer = trace.get_tracer("randl_client")
+
+    def hook(call):
+        start = int(call.started_at * 1e9)
+        attributes = {k: v for k, v in call.as_dict().items() if v is not None and k != "endpoint"}
+        attributes["cached"] = bool(call.cached)
+        span = tracer.start_span("randl." + call.endpoint, start_time=start,
+                                 attributes={"randl." + k: v for k, v in attributes.items()})
+        if call.error is not None:
+            span.set_status(trace.Status(trace.StatusCode.ERROR, call.error))
+        span.end(end_time=start + int(call.total * 1e9))
+    return hook
@@ -0,0 +1,117 @@
+import copy
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from .compact import parse_times
+from .dml_batch import DMLBatcher
+
+
+# Split a bulletin into consecutive partitions of partition_span seconds. Each
+# partition also carries the following `overlap` seconds of arrivals so events
+# near its end see their complete arrival set. An empty bulletin has no partitions.
+def partition_bulletin(bulletin, partition_span, overlap):
+    if len(bulletin) == 0:
+        return []
+    times = parse_times(bulletin['TIME_ARRIV']).to_numpy(dtype='datetime64[ns]')
+    order = np.argsort(times, kind='stable')
+    bulletin = bulletin.iloc[order]
+    times = times[order]
+
+    span = np.timedelta64(int(partition_span * 1e9), 'ns')
+    overlap = np.timedelta64(int(overlap * 1e9), 'ns')
+    partitions = []
+    # boundaries on whole seconds, since window starts come back at microsecond precision
+    core_start = times[0].astype('datetime64[s]').astype('datetime64[ns]')
+    while core_start <= times[-1]:
+        core_end = core_start + span
+        lo = np.searchsorted(times, core_start, side='left')
+        hi = np.searchsorted(times, core_end + overlap, side='right')
+        partitions.append((pd.Timestamp(core_start), pd.Timestamp(core_end), bulletin.iloc[lo:hi].copy()))
+        core_start = core_end
+    return partitions
+
+
+def _associate_partition(client, partition, kwargs):
+    return client.associate_bulletin(partition, **kwargs)
+
+
+# Combine per-partition origins. An origin is kept by the partition whose core
+# span contains its window start; the overlap zone of one partition is the core
+# of the next. Origins that still share arrivals (an event straddling a
+# boundary found by both neighbours) are settled by confidence: the better
+# origin keeps the shared arrivals, and the other is dropped if most of its
+# arrivals were already claimed or fewer than min_arids remain.
+def merge_partition_origins(results, min_arids=5):
+    owned = []
+    for core_start, core_end, origins in results:
+        if origins is None or len(origins) == 0:
+            continue
+        window_start = pd.to_datetime(origins['Window_start'].astype(str))
+        owned.append(origins[(window_start >= core_start) & (window_start < core_end)])
+    if len(owned) == 0:
+        return None
+    origins = pd.concat(owned, ignore_index=True)
+
+    n_arids = origins['oct_arids'].apply(len)
+    order = origins.assign(_n=n_arids).sort_values(['oct_confidence', '_n'], ascending=False).index
+
+    claimed = set()
+    keep = []
+    settled = {}
+    for i in order:
+        arids = list(origins.at[i, 'oct_arids'])
+        shared = [a for a in arids if a in claimed]
+        if len(shared) * 2 > len(arids):
+            continue
+        remaining = [a for a in arids if a not in claimed]
+        if len(remaining) < min_arids:
+            continue
+        claimed.update(remaining)
+        settled[i] = remaining
+        keep.append(i)
+
+    origins = origins.loc[sorted(keep)].copy()
+    origins['oct_arids'] = [settled[i] for i in origins.index]
+    origins.sort_values(by=['Window_start'], inplace=True)
+    origins.reset_index(drop=True, inplace=True)
+    return origins
+
+
+def associate_bulletin_parallel(client, bulletin, n_workers=4, partition_span=86400, executor='thread',
+                                required_phases=5, exclude_associated_phases=False, travel_time=1800,
+                                verbose=False, **kwargs):
+    partitions = [p for p in partition_bulletin(bulletin, partition_span, travel_time) if len(p[2]) >= 6]
+    kwargs.update({"required_phases": required_phases, "exclude_associated_phases": exclude_associated_phases,
+                   "travel_time": travel_time, "verbose": verbose, "metrics_report": False})
+    # partitions on threads share the client's metrics, so the report covers the
+    # whole run; worker processes record into their own copies, which are lost
+    metrics = client.transport.metrics
+    if metrics is not None:
+        metrics_mark = metrics.mark()
+        run_started = time.perf_counter()
+
+    # each partition runs on its own copy of the client, which keeps its own
+    # octree prefilter index for the partition's bulletin
+    workers = [copy.copy(client) for _ in partitions]
+    # batch_dml: partitions on threads share one batcher, so DML predictions
+    # asked for at about the same time go out in one request. Worker processes
+    # can't share it and only batch their own prefetched windows.
+    if kwargs.get("batch_dml") and executor != 'process':
+        batcher = DMLBatcher(client, max_windows=n_workers * max(1, kwargs.get("pipeline_depth", 0)))
+        for worker in workers:
+            worker.dml_batcher = batcher
+    pool_class = ProcessPoolExecutor if executor == 'process' else ThreadPoolExecutor
+    with pool_class(max_workers=n_workers) as pool:
+        futures = [pool.submit(_associate_partition, w, p[2], kwargs) for w, p in zip(workers, partitions)]
+        results = [(p[0], p[1], f.result()) for p, f in zip(partitions, futures)]
+
+    origins = merge_partition_origins(results)
+    if origins is None:
+        # randl_client imports this module, so its schema is looked up here
+        from .randl_client import origin_columns
+        origins = pd.DataFrame(columns=origin_columns)
+    print(len(origins), "origins found in bulletin across", len(partitions), "partitions.")
+    if metrics is not None and executor != 'process':
+        print(metrics.run_report(metrics_mark, time.perf_counter() - run_started))
+    return origins
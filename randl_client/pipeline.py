@@ -0,0 +1,120 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import pandas as pd
+from .windowing import next_start_index
+from .errors import RandlError
+
+start_format = '%Y-%m-%dT%H:%M:%S'
+
+
+# Start times associate_bulletin may visit after the one at start_index, most
+# likely first: the first arrival 12 minutes on (origin found), the next unique
+# arrival time (weak beam / too few arrivals), +720 s (no quality beam), then
+# further arrival times. start_times is the sorted datetime64 array the loop
+# steps through.
+def upcoming_starts(start_times, start_index, starttime, depth):
+    candidates = []
+    jump = next_start_index(start_times, start_index, starttime + timedelta(minutes=12))
+    candidates.append(pd.Timestamp(start_times[jump]))
+
+    if start_index + 1 < len(start_times):
+        candidates.append(pd.Timestamp(start_times[start_index + 1]))
+    candidates.append(pd.Timestamp(starttime) + timedelta(seconds=720))
+
+    j = start_index + 2
+    while len(candidates) < depth and j < len(start_times):
+        candidates.append(pd.Timestamp(start_times[j]))
+        j += 1
+
+    starts = []
+    for c in candidates:
+        s = c.strftime(start_format)
+        if s not in starts:
+            starts.append(s)
+    return starts[:depth]
+
+
+class WindowPrefetcher:
+    # Fetches windows and DML predictions for upcoming start times on worker
+    # threads while associate_bulletin runs beamsearch/octree on the current one.
+    # A speculative DML result is only used if the window it was computed on has
+    # exactly the same ARIDs as the window after removing associated arrivals;
+    # otherwise it is discarded and the prediction redone. Origins therefore
+    # match the serial loop as long as the server's DML is deterministic.
+    # With a dml_batch.DMLBatcher the speculative predictions, which are asked
+    # for at about the same time, are sent in batched requests.
+    def __init__(self, client, catalog, window_index=None, depth=2, min_arrivals=6, config=None, batcher=None):
+        self.client = client
+        self.batcher = batcher
+        self.config = client._config(config)
+        self.catalog = catalog
+        self.window_index = window_index
+        self.depth = depth
+        self.min_arrivals = min_arrivals
+        self.executor = ThreadPoolExecutor(max_workers=depth)
+        self.pending = {}
+        self.current = None
+        self.hits = 0
+        self.misses = 0
+
+    # each task gets the run's config with its own window start
+    def _config_at(self, start):
+        return self.config.override(window={"start": self.client.validate_datetime(start)})
+
+    def _fetch_window(self, config, associated_arids):
+        if self.window_index is not None:
+            return self.client.window_catalog_local(self.window_index, associated_arids, config)
+        return self.client.window_catalog(self.catalog, config)
+
+    def _speculate(self, start, associated_arids):
+        config = self._config_at(start)
+        window = self._fetch_window(config, associated_arids)
+        if window is None:
+            return None, None, None
+        filtered = window[~window['ARID'].isin(associated_arids)]
+        if len(filtered) < self.min_arrivals:
+            return window, None, None
+        return window, tuple(filtered['ARID']), self.client._dml_prediction(filtered, config, self.batcher)
+
+    def schedule(self, starts, associated_arids):
+        associated = set(associated_arids)
+        for start in starts[:self.depth]:
+            if start not in self.pending:
+                self.pending[start] = self.executor.submit(self._speculate, start, associated)
+
+    # Window at start with associated arrivals removed, as the serial loop sees it
+    def window(self, start, associated_arids):
+        future = self.pending.pop(start, None)
+        # anything earlier than the current start can no longer be visited
+        for key in [k for k in self.pending if k < start]:
+            self.pending.pop(key).cancel()
+
+        window, arids, dml = None, None, None
+        if future is not None:
+            try:
+                window, arids, dml = future.result()
+            except RandlError:
+                # a failed speculative fetch is redone here, where errors reach the caller
+                future = None
+        if future is None or self.window_index is not None:
+            # local windows are cheap and depend on associated arids, so redo them
+            window = self._fetch_window(self._config_at(start), associated_arids)
+        self.current = (start, arids, dml)
+
+        if window is None:
+            return None
+        return window[~window['ARID'].isin(associated_arids)]
+
+    def dml_prediction(self, start, window):
+        current_start, arids, dml = self.current
+        if current_start == start and dml is not None and arids == tuple(window['ARID']):
+            self.hits += 1
+            return dml
+        self.misses += 1
+        return self.client.dml_prediction(window, self._config_at(start))
+
+    def close(self):
+        for future in self.pending.values():
+            future.cancel()
+        self.pending = {}
+        self.executor.shutdown(wait=True)
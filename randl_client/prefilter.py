@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+from .compact import parse_times
+
+# Client-side subsetting of the bulletin sent to octree_search and
+# octree_bulletin_refinement. An arrival can only belong to an origin if it
+# comes after the origin time by about the P travel time to its station, so
+# for each candidate origin only arrivals inside that envelope are sent.
+
+# First-arriving P travel time bounds (s) for a surface source by epicentral
+# distance (deg), rounded outwards from IASP91. Beyond ~100 deg the upper bound
+# follows PKP, which arrives as late as ~1220 s at the antipode.
+tt_distances = np.array([0, 5, 10, 15, 20, 25, 30, 40, 50, 60, 70, 80, 90, 100, 110, 120, 140, 160, 180], dtype=float)
+tt_min = np.array([0, 70, 135, 195, 260, 315, 360, 445, 525, 595, 655, 710, 760, 800, 840, 880, 950, 1010, 1050],
+                  dtype=float)
+tt_max = np.array([10, 85, 155, 220, 285, 335, 380, 465, 545, 615, 675, 730, 780, 1150, 1170, 1185, 1205, 1215,
+                   1225], dtype=float)
+
+
+def travel_time_bounds(distance):
+    return np.interp(distance, tt_distances, tt_min), np.interp(distance, tt_distances, tt_max)
+
+
+def _unit_vectors(lat, lon):
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+class BulletinFilter:
+    # Index over a bulletin built once: arrival times as sorted datetime64 and
+    # a station table with unit vectors, so a candidate origin costs a binary
+    # search plus a distance per station.
+    #
+    # For an origin at (lat, lon, time) an arrival is kept if its station is
+    # within max_distance degrees and it lies in
+    #   [time + tt_min(d - radius) - margin, time + tt_max(d + radius) + margin]
+    # with d the station distance, widened by radius degrees either way for
+    # the octree moving the location, and never later than time + window_length
+    # + margin.
+    def __init__(self, bulletin):
+        times = parse_times(bulletin['TIME_ARRIV']).to_numpy(dtype='datetime64[ns]')
+        order = np.argsort(times, kind='stable')
+        self.bulletin = bulletin
+        self.index = bulletin.index
+        self.order = order
+        self.times = times[order]
+        _, codes = np.unique(bulletin['STA'].astype(str).to_numpy(), return_inverse=True)
+        first = np.unique(codes, return_index=True)[1]
+        self.station_vectors = _unit_vectors(bulletin['LAT_STA'].to_numpy(dtype=float)[first],
+                                             bulletin['LON_STA'].to_numpy(dtype=float)[first])
+        self.codes = codes[order]
+
+    def __len__(self):
+        return len(self.bulletin)
+
+    def station_distances(self, lat, lon):
+        cos = self.station_vectors @ _unit_vectors([lat], [lon])[0]
+        return np.degrees(np.arccos(np.clip(cos, -1, 1)))
+
+    # Positions (into the bulletin) of the arrivals an origin could use
+    def positions(self, lat, lon, time, window_length, margin=120.0, radius=10.0, max_distance=180.0):
+        origin = np.datetime64(pd.Timestamp(time), 'ns')
+        margin_ns = np.timedelta64(int(margin * 1e9), 'ns')
+        end = origin + np.timedelta64(int(min(float(window_length), tt_max[-1]) * 1e9), 'ns') + margin_ns
+        lo = np.searchsorted(self.times, origin - margin_ns, side='left')
+        hi = np.searchsorted(self.times, end, side='right')
+
+        distance = self.station_distances(lat, lon)
+        early, _ = travel_time_bounds(np.clip(distance - radius, 0, 180))
+        _, late = travel_time_bounds(np.clip(distance + radius, 0, 180))
+        early = (early - margin) * 1e9
+        late = (late + margin) * 1e9
+        late[distance > max_distance + radius] = -np.inf
+
+        codes = self.codes[lo:hi]
+        offset = (self.times[lo:hi] - origin).astype(np.int64)
+        keep = (offset >= early[codes]) & (offset <= late[codes])
+        return self.order[lo:hi][keep]
+
+    def subset(self, lat, lon, time, window_length, margin=120.0, radius=10.0, max_distance=180.0):
+        positions = np.sort(self.positions(lat, lon, time, window_length, margin, radius, max_distance))
+        return self.bulletin.iloc[positions]
+
+    # Union of the subsets for several origins, in bulletin order
+    def subset_many(self, lats, lons, times, window_length, margin=120.0, radius=10.0, max_distance=180.0):
+        keep = np.zeros(len(self.bulletin), dtype=bool)
+        for lat, lon, time in zip(lats, lons, times):
+            keep[self.positions(lat, lon, time, window_length, margin, radius, max_distance)] = True
+        return self.bulletin.iloc[np.flatnonzero(keep)]
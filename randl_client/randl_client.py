@@ -1,5 +1,3 @@
-import requests
-import json
 import pandas as pd
 import numpy as np
 import datetime
@@ -7,707 +5,1139 @@ from dateutil import parser
 from datetime import timedelta
 import sys
 import math
+import time
 import ast
-from io import StringIO
-from statistics import mean
+from .transport import Transport
+from .codec import JsonCodec, ColumnarCodec, negotiate_codec, read_frame
+from .bulletin_session import BulletinHandle, bulletin_hash, apply_delta
+from .windowing import WindowIndex, arrival_start_times, next_start_index
+from .pipeline import WindowPrefetcher, upcoming_starts
+from . import parallel
+from . import sweep
+from . import util
+from . import batching
+from concurrent.futures import ThreadPoolExecutor
+from .cache import ResultCache
+from .errors import RandlError, RandlHTTPError, RandlResponseError
+from .resilience import CircuitBreaker, overload_statuses
+from .balancer import ServerPool
+from .compact import compact_bulletin
+from .streaming import StreamingAssociator
+from .checkpoint import save_checkpoint, load_checkpoint
+from .metrics import Metrics
+from .prefilter import BulletinFilter
+from .stepping import DensityStepper
+from .dml_batch import DMLBatcher, stack_windows, split_predictions
+from . import surrogate_tables
+from .config import RandlConfig, stages, legacy_attributes, legacy_value, parse_legacy
 
 client_version = "1.1.0"
 
+origin_columns = ['Window_start', 'Window_end', 'DML_mean_lat', 'DML_mean_lon', 'Beam_lat', 'Beam_lon', 'Beam_depth',
+                  'Beam_time', 'Beam_score', 'Beam_arids', 'oct_lon', 'oct_lat', 'oct_depth', 'oct_time', 'oct_arids',
+                  'oct_confidence']
+
+
+# Window bounds as datetimes at microsecond precision, like dateutil gives
+def _as_datetime(timestamp):
+    return pd.Timestamp(timestamp).to_pydatetime(warn=False)
+
 class Randl:    
-    def __init__(self):        
+    def __init__(self, pool_size=16, keep_alive=True, timeouts=None):        
         self.url_base = "http://seismic-ai.com:8011/randl/"
         #self.url_base = "http://127.0.0.1:8000/randl/"
         self.api_key = ""
+        self.transport = Transport(pool_maxsize=pool_size, keep_alive=keep_alive, timeouts=timeouts)
         
-        self.bulletin_start = '2024-05-01T00:00:00'
-        self.bulletin_end = '2024-05-11T00:00:00' 
-        self.bulletin_n_stations= '100'
-        self.bulletin_n_events= '1' 
-        self.bulletin_drop_fraction = '0.2'
-        self.bulletin_seed = '555'
-        
-        self.window_start = '2024-05-10 18:43:15.431390'
-        self.window_length = '1800'
-        self.window_min_phases_needed= '5'
-        self.window_exclude_associated_phases= 'False'
-        self.window_step_size = 1
-        
-        #TODO finish setters for dml variables
-        self.dml_models = ['flex']
-        self.dml_sampling = ['full']
-        self.dml_num_samples = '10'
-        self.dml_sta_count = '5'
-        self.dml_arids = ['None'] 
-        self.dml_pwave_modelpath = 'None'
-        self.dml_exclude_duplicate_stations= 'True'
-        self.dml_baz_modelpath = 'None'
-        
-        #TODO cleanup beamsearch call
-        self.beam_width = '5'
-        self.beam_max_dist = '5000'
-        self.beam_max_time = '500'
-        self.beam_sequence_dist = '500'
-        self.beam_sequence_timedist = '500'
-
-
-        self.octree_time_spacing = '15'
-        self.octree_time_samples = '11'
-        self.octree_loc_samples = '11'
-        self.octree_loc_spacing = '0.017'
-        self.octree_time_threshold = '10'
-        self.octree_iterations = '3'
-
-
+        # bulletin, window, DML, beam and octree settings (see config.py); the
+        # set_* methods and the old attributes (window_length, beam_width, ...)
+        # replace it with an updated copy, endpoint methods take config= for one call
+        self.config = RandlConfig()
+
+        # with config.octree.prefilter, octree_search/octree_bulletin_refinement
+        # only send the arrivals inside each origin's travel time envelope
+        self._bulletin_filter = None
+
+        # compute lonlat/geocentric conversions and scaling in util instead of over HTTP
+        self.local_conversions = False
+
+        # create_bulletin returns the compact layout (datetime64 times, categorical
+        # STA/IPHASE); requests still send the string form
+        self.compact_bulletins = False
+
+        # JSON bodies and frame results go through orjson when it is installed;
+        # False uses the json module and pd.read_json as before
+        self.fast_json = True
+
+        # a sweep.StageCache shares window and DML results between the clients
+        # of a parameter sweep
+        self.stage_cache = None
+
+        # *_batch calls split inputs into requests of at most batch_max_rows rows
+        # and send up to batch_workers of them at once
+        self.batch_max_rows = 10000
+        self.batch_workers = 4
+
+        # a dml_batch.DMLBatcher groups concurrent dml_prediction calls into
+        # batched requests; dml_batch_supported is False once the server has
+        # turned down a batch (and None until one has been sent)
+        self.dml_batcher = None
+        self.dml_batch_supported = None
+
+        # surrogate_tables.SurrogateTable per surrogate endpoint, answering its
+        # *_batch calls locally to within surrogate_tolerance (see
+        # use_surrogate_tables)
+        self.surrogate_tables = {}
+        self.surrogate_tolerance = 1e-3
+
+
+    # The setters below replace one field of the client's config; the config
+    # checks the value, so a wrong type raises TypeError and an out of range
+    # value ValueError (see config.py)
     def set_octree_time_spacing(self, n):
-        if type(n) is int:
-            self.octree_time_spacing = str(n)
-        else:
-            print("Int required")
+        self._configure("octree", time_spacing=n)
 
     def set_octree_time_samples(self, n):
-        if type(n) is int:
-            self.octree_time_samples = str(n)
-        else:
-            print("Int required")
+        self._configure("octree", time_samples=n)
 
     def set_octree_loc_samples(self, n):
-        if type(n) is int:
-            self.octree_loc_samples = str(n)
-        else:
-            print("Int required")
+        self._configure("octree", loc_samples=n)
 
     def set_octree_loc_spacing(self, n):
-        if type(n) is float:
-            self.octree_loc_spacing = str(n)
-        else:
-            print("Int required")
+        self._configure("octree", loc_spacing=n)
 
     def set_octree_time_threshold(self, n):
-        if type(n) is int:
-            self.octree_time_threshold = str(n)
-        else:
-            print("Int required")
+        self._configure("octree", time_threshold=n)
 
     def set_octree_max_iterations(self, n):
-        if type(n) is int:
-            self.octree_iterations = str(n)
-        else:
-            print("Int required")
-
+        self._configure("octree", iterations=n)
+
+
+    # Send octree_search and octree_bulletin_refinement only the arrivals
+    # inside each beam's P travel time envelope (see prefilter.py). This can
+    # change results: the envelope holds every arrival a travel time
+    # consistent octree could use for an origin within prefilter_radius degrees
+    # and prefilter_margin seconds of the beam, but not arrivals the server
+    # would associate outside it (later phases, origins that move further).
+    def set_octree_prefilter(self, b):
+        self._configure("octree", prefilter=b)
+
+    # margin: seconds added either side of each station's travel time window
+    # radius: degrees the octree may move the origin from the beam location
+    # max_distance: stations further than this (in degrees) are left out
+    def set_octree_prefilter_margin(self, margin=None, radius=None, max_distance=None):
+        changes = {"prefilter_" + name: value for name, value in
+                   (("margin", margin), ("radius", radius), ("max_distance", max_distance)) if value is not None}
+        self._configure("octree", **changes)
 
     def validate_datetime_bulletin(self, timestamp):
-        try:
-            time = parser.parse(timestamp)
-        except:
-            print("Invalid date format")
-        return time.strftime('%Y-%m-%dT%H:%M:%S')
+        return self._parse_datetime(timestamp).strftime('%Y-%m-%dT%H:%M:%S')
     
     def validate_datetime(self, timestamp):
+        return self._parse_datetime(timestamp).strftime('%Y-%m-%d %H:%M:%S.%f')
+
+    def _parse_datetime(self, timestamp):
+        if type(timestamp) is not str:
+            raise TypeError("Date string required, got %r" % (timestamp,))
         try:
-            time = parser.parse(timestamp)
-        except:
-            print("Invalid date format")
-        return time.strftime('%Y-%m-%d %H:%M:%S.%f')
+            return parser.parse(timestamp)
+        except (ValueError, OverflowError) as e:
+            raise ValueError("Invalid date format: %r" % (timestamp,)) from e
     
     
     def set_bulletin_start(self, starttime):
-        try: 
-            time = self.validate_datetime_bulletin(starttime)
-        except:
-            return
-        self.bulletin_start = time   
-        
+        self._configure("bulletin", start=self.validate_datetime_bulletin(starttime))
+
     def set_bulletin_end(self, starttime):
-        try: 
-            time = self.validate_datetime_bulletin(starttime)
-        except:
-            return
-        self.bulletin_end = time
-        
+        self._configure("bulletin", end=self.validate_datetime_bulletin(starttime))
+
     def set_bulletin_n_stations(self, n):
-        if type(n) is int:
-            self.bulletin_n_stations = str(n)
-        else:
-            print("Int required")
+        self._configure("bulletin", n_stations=n)
             
     def set_bulletin_n_events(self, n):
-        if type(n) is int:
-            self.bulletin_n_events = str(n)
-        else:
-            print("Int required")
+        self._configure("bulletin", n_events=n)
             
     def set_bulletin_drop_fraction(self, n):
-        if type(n) is float:
-            self.bulletin_drop_fraction = str(n)
-        else:
-            print("Float required")
+        self._configure("bulletin", drop_fraction=n)
             
     def set_bulletin_seed(self, n):
-        if type(n) is int:
-            self.bulletin_seed = str(n)
-        else:
-            print("Int required") 
+        self._configure("bulletin", seed=n)
                     
     def set_window_start(self, starttime):
-        try: 
-            time = self.validate_datetime(starttime)
-        except:
-            return
-        self.window_start = time
-        
+        self._configure("window", start=self.validate_datetime(starttime))
+
     def set_window_length(self, length):
-        if type(length) is int:
-            self.window_length = str(length)
-        else:
-            print("Int required")
+        self._configure("window", length=length)
             
     def set_window_phases_required(self, phases):
-        if type(phases) is int:
-            self.window_min_phases_needed = str(phases)
-        else:
-            print("Int required")
+        self._configure("window", min_phases=phases)
             
     def set_window_exclude_associated_phases(self, b):
-        if type(b) is bool:
-            self.window_exclude_associated_phases = str(b)
-        else:
-            print("Boolean required")
+        self._configure("window", exclude_associated_phases=b)
             
     def set_dml_exclude_duplicate_stations(self, b):
-        if type(b) is bool:
-            self.dml_exclude_duplicate_stations = str(b)
-        else:
-            print("Boolean required")
+        self._configure("dml", exclude_duplicate_stations=b)
             
     def set_dml_num_samples(self, b):
-        if type(b) is int:
-            self.dml_num_samples = str(b)
-        else:
-            print("Int required")
+        self._configure("dml", num_samples=b)
 
     def set_dml_sta_count(self, b):
-        if type(b) is int:
-            self.dml_sta_count = str(b)
-        else:
-            print("Int required")
+        self._configure("dml", sta_count=b)
   
     
-    # add input checking
     def set_dml_models(self, models):
-        self.dml_models = models
-    # add input checking    
+        self._configure("dml", models=models)
+
     def set_dml_sampling(self, sampling):
-        self.dml_sampling = sampling
+        self._configure("dml", sampling=sampling)
+
     def set_dml_arids(self, arids):
-        list_arids = []
-        for arid in arids:
-            list_arids.append(str(arid))
-        self.dml_arids = list_arids        
+        self._configure("dml", arids=[str(arid) for arid in arids])
+
     def set_dml_pwave_model(self, path):
-        if type(path) is str:
-            self.dml_pwave_modelpath = path
-        else:
-            print("String required")
+        self._configure("dml", pwave_model=path)
+
     def set_dml_baz_model(self, path):
-        if type(path) is str:
-            self.dml_baz_modelpath = path
-        else:
-            print("String required")
+        self._configure("dml", baz_model=path)
         
     def set_beamwidth(self, width):
-        if type(width) is int and width > 0:
-            self.beam_width = str(width)
-        else:
-            print("Positive int required")
+        self._configure("beam", width=width)
             
     def set_beam_maxdist(self, dist):
-        if type(dist) is int and dist > 0:
-            self.beam_max_dist = str(dist)
-        else:
-            print("Positive int required")
+        self._configure("beam", max_dist=dist)
     
     def set_beam_maxtime(self, time):
-        if type(time) is int and time > 0:
-            self.beam_max_time = str(time)
-        else:
-            print("Positive int required")
-            
+        self._configure("beam", max_time=time)
             
     def set_beam_sequencedist(self, dist):
-        if type(dist) is int and dist > 0:
-            self.beam_sequence_dist = str(dist)
-        else:
-            print("Positive int required")
+        self._configure("beam", sequence_dist=dist)
             
     def set_beam_sequencetimedist(self, time):
-        if type(time) is int and time > 0:
-            self.beam_sequence_timedist = str(time)
-        else:
-            print("Positive int required")
+        self._configure("beam", sequence_time=time)
 
-            
-    def create_bulletin(self):
-        
-        req = {'n_stations': self.bulletin_n_stations ,"n_events":self.bulletin_n_events,
-            "drop_fraction": self.bulletin_drop_fraction, 
-            "datetime_start": self.bulletin_start,
-            "datetime_end":self.bulletin_end,
-              "seed": self.bulletin_seed }
-
-        url = self.url_base + 'create_bulletin'
-        headers = {"accept": "application/json", "access_token": str(self.api_key),
-            "Content-Type": "application/json"}
-
-        response = requests.post(url, headers=headers, data=json.dumps(req))
-
-        # Check the response
-        if response.status_code != 200:
-            print("Error:", response.status_code, response.text)
-            return None         
-        
-        bulletin = pd.read_json(StringIO(response.json()["result"]))
-        rename_dic = {"STA_LAT":"LAT_STA", "STA_LON":"LON_STA","TIME":"TIME_ARRIV"}
-        bulletin.rename(rename_dic, axis='columns', inplace=True)
-        bulletin['TIME_ARRIV'] = bulletin.TIME_ARRIV.astype(str)
-        bulletin['ORIG_TIME'] = bulletin.ORIG_TIME.astype(str)
-        bulletin['STA'] = bulletin.STA.astype(str)
-        bulletin["BACK_AZIMUTH"]=0
-        bulletin = bulletin.loc[bulletin.IPHASE == "P", :]
-        bulletin.reset_index(drop=True, inplace=True)
 
-        return bulletin
-    
-    
-    def window_catalog(self, bulletin):    
-        bulletin_dic = bulletin.to_dict()
+    def _configure(self, stage, **changes):
+        self.config = self.config.override(**{stage: changes})
 
-        req = {'window_length': self.window_length ,"min_phases_needed":self.window_min_phases_needed,
-                "exclude_associated_phases": self.window_exclude_associated_phases, "step_size": self.window_step_size ,
-                "start_time":self.window_start, "catalog": bulletin_dic }
+    # The configuration for one call: config may be a RandlConfig, a single
+    # stage's config (replacing that stage of the client's), or None
+    def _config(self, config=None):
+        if config is None:
+            return self.config
+        for name, cls in stages.items():
+            if isinstance(config, cls):
+                return self.config.override(**{name: config})
+        return config
 
-        url = self.url_base + 'window'
-        headers = {"accept": "application/json", "access_token": str(self.api_key),
-            "Content-Type": "application/json"}
+    # parse turns the decoded response into the endpoint's result
+    def _post(self, endpoint, req, parse=None):
+        return self.transport.post(self.url_base + endpoint, endpoint, req, self.api_key, parse)
 
-        response = requests.post(url, headers=headers, data=json.dumps(req))
+    def _get(self, endpoint, parse=None):
+        return self.transport.get(self.url_base + endpoint, endpoint, self.api_key, parse)
 
-        if response.status_code != 200:
-            print("Error:", response.status_code, response.text)
-            return None
-        window = pd.read_json(StringIO(response.json()["result"]))
-        try:
-            window['ORIG_TIME'] = window.ORIG_TIME.astype(str)    
-        except:
-            error = "No ORIG_TIME column"
-            #print("No ORIG_TIME column.")
-        return window
-
-        
-    def dml_prediction(self, window):
-        window_dict = window.to_dict()
-        req = {"models": self.dml_models, "sampling": self.dml_sampling, "num_samples": self.dml_num_samples, "sta_count": self.dml_sta_count,
-               "arids": self.dml_arids, "pwave_model": self.dml_pwave_modelpath, "baz_model": self.dml_baz_modelpath, 
-               "exclude_duplicate_stations": self.dml_exclude_duplicate_stations, "catalog": window_dict }
+    def set_pool_size(self, n):
+        if type(n) is int and n > 0:
+            self.transport.set_pool_size(n)
+        else:
+            print("Positive int required")
 
+    def set_timeout(self, endpoint, timeout):
+        self.transport.set_timeout(endpoint, timeout)
 
-        if self.dml_models[0] == 'flex':
-            url = self.url_base + "dml_flex_handler"
+    # Failed requests (connection errors, timeouts, 429/5xx) are retried with
+    # exponential backoff and jitter, up to max attempts per endpoint and within
+    # an optional deadline per call. Errors that are left raise RandlError
+    # subclasses (see errors.py).
+    def set_max_attempts(self, n, endpoint="default"):
+        if type(n) is int and n > 0:
+            self.transport.retry.set_max_attempts(n, endpoint)
         else:
-            url = self.url_base + "dml_pwave_handler"
-
-        headers = {
-            "accept": "application/json", "access_token": str(self.api_key),
-            "Content-Type": "application/json"
-        }
-        response = requests.post(url, headers=headers, data=json.dumps(req))
-        if response.status_code != 200:
-            print("Error:", response.status_code, response.text)
-            return None
-            
-        return pd.read_json(StringIO(response.json()["result"]))     
-    
-    
-    def beamsearch(self, window, dml_predictions):
-        window_dict = window.to_dict()
-        dml_dict = dml_predictions.to_dict()
-
-        req = {"dml_predictions": dml_dict, "window": window_dict, "beam_width": self.beam_width, "max_dist": self.beam_max_dist,
-              "max_time": self.beam_max_time, "sequence_dist": self.beam_sequence_dist, "sequence_time": self.beam_sequence_timedist, "sta_count": self.dml_sta_count,
-               "pwave_model": self.dml_pwave_modelpath, "baz_model": self.dml_baz_modelpath, "base_url": self.url_base, "api_key": self.api_key}
+            print("Positive int required")
 
+    def set_backoff(self, backoff, max_backoff=None, jitter=None):
+        if type(backoff) in (int, float) and backoff >= 0:
+            self.transport.retry.backoff = backoff
+            if max_backoff is not None:
+                self.transport.retry.max_backoff = max_backoff
+            if jitter is not None:
+                self.transport.retry.jitter = jitter
+        else:
+            print("Non-negative number required")
 
-        url = self.url_base + "beamsearch"
+    # Seconds a call may take in total, retries and waits included; None for no limit
+    def set_deadline(self, seconds, endpoint="default"):
+        if seconds is None or (type(seconds) in (int, float) and seconds > 0):
+            self.transport.retry.set_deadline(seconds, endpoint)
+        else:
+            print("Positive number or None required")
 
-        headers = {
-            "accept": "application/json", "access_token": str(self.api_key),
-            "Content-Type": "application/json"
-        }
-        response = requests.post(url, headers=headers, data=json.dumps(req))
-        if response.status_code != 200:
-            # If the request failed, print the error details
-            print("Error:", response.status_code, response.text)
-            
-        return response.json()["result"]
+    # After failure_threshold consecutive overload failures all requests wait
+    # reset_timeout seconds before a probe request is let through
+    def set_circuit_breaker(self, failure_threshold=5, reset_timeout=30.0):
+        if type(failure_threshold) is int and failure_threshold > 0:
+            self.transport.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        else:
+            print("Positive int required")
 
+    def disable_circuit_breaker(self):
+        self.transport.breaker = None
 
-    def octree_search(self, bulletin, beam_x, beam_y, beam_z, beam_time):
-        bulletin = bulletin.to_dict()
+    def circuit_state(self):
+        return "disabled" if self.transport.breaker is None else self.transport.breaker.state
 
-        req = {"bulletin": bulletin, "time_spacing": self.octree_time_spacing, "time_threshold": self.octree_time_threshold,  
-        "loc_spacing": self.octree_loc_spacing, "loc_samples": self.octree_loc_samples,  "time_samples": self.octree_time_samples,  
-        "base_url": self.url_base,  "api_key": self.api_key, "iterations": self.octree_iterations,
-        "beam_x": beam_x, "beam_y": beam_y, "beam_z": beam_z, "beam_time": beam_time, 'window_length': self.window_length}
+    # Spread requests over several RaNDL replicas. Each attempt goes to the
+    # server the strategy picks ('least_outstanding' or 'round_robin', optionally
+    # weighted); a server that stops answering is skipped until its /version
+    # answers again, checked at most every health_interval seconds. url_base is
+    # set to the first URL and is what requests that name a server use.
+    def set_servers(self, urls, strategy="least_outstanding", weights=None, health_interval=30.0):
+        if type(urls) is str:
+            urls = [urls]
+        try:
+            pool = ServerPool(urls, strategy, weights, health_interval)
+        except ValueError as e:
+            print(e)
+            return
+        self.url_base = pool.urls[0]
+        self.transport.servers = pool if len(pool) > 1 else None
+        # one connection pool per host
+        if len(pool) > self.transport.pool_connections:
+            self.transport.set_pool_size(self.transport.pool_maxsize, len(pool))
+
+    # Health check every server now; returns {url: version or None}
+    def check_servers(self):
+        if self.transport.servers is None:
+            try:
+                return {self.url_base: self.version()}
+            except RandlError:
+                return {self.url_base: None}
+        return self.transport.servers.check_all(self.transport.session, {"access_token": str(self.api_key)})
 
-        url = self.url_base + "octree_search"
+    def server_stats(self):
+        if self.transport.servers is None:
+            return None
+        return self.transport.servers.stats()
 
-        headers = {
-            "accept": "application/json", "access_token": str(self.api_key),
-            "Content-Type": "application/json"
-        }
-        response = requests.post(url, headers=headers, data=json.dumps(req))
-        if response.status_code != 200:
-            # If the request failed, print the error details
-            print("Error:", response.status_code, response.text)
-            
-        return response.json()["result"]
+    def close(self):
+        self.transport.close()
 
-    def octree_bulletin_refinement(self, bulletin, origins):
-        bulletin = bulletin.to_dict()
+    # Memoize deterministic endpoint results in memory (LRU, max_entries) and
+    # optionally in a directory of compressed blobs (max_disk_bytes). Keys include
+    # the server version, so results from an older deployment are never reused.
+    def enable_cache(self, max_entries=1024, directory=None, max_disk_bytes=1 << 30, endpoints=None):
         try:
-            origins['Window_start'] = origins['Window_start'].astype(str)
-            origins['Window_end'] = origins['Window_end'].astype(str)
-            origins['Beamsearch_time'] = origins['Beamsearch_time'].astype(str)
-        except:
-            print("Missing expected beamsearch time columns")
-
-        origins = origins.to_dict()
+            version = self.version()
+        except RandlError as e:
+            print("Could not query server version, cache not enabled:", e)
+            return
+        self.transport.cache = ResultCache(max_entries, directory, max_disk_bytes, endpoints, version)
 
-        req = {"bulletin": bulletin, "predictions": origins, "time_spacing": self.octree_time_spacing, "time_threshold": self.octree_time_threshold,  
-        "loc_spacing": self.octree_loc_spacing, "loc_samples": self.octree_loc_samples,  "time_samples": self.octree_time_samples,  
-        "base_url": self.url_base,  "api_key": self.api_key, "iterations": self.octree_iterations, 'window_length': self.window_length}
+    def disable_cache(self):
+        self.transport.cache = None
 
-        url = self.url_base + "octree_bulletin_refinement"
+    def cache_stats(self):
+        if self.transport.cache is None:
+            return None
+        return self.transport.cache.stats()
 
-        headers = {
-            "accept": "application/json", "access_token": str(self.api_key),
-            "Content-Type": "application/json"
-        }
-        response = requests.post(url, headers=headers, data=json.dumps(req))
-        if response.status_code != 200:
-            # If the request failed, print the error details
-            print("Error:", response.status_code, response.text)
-            
-        return pd.read_json(StringIO(response.json()["result"]))
+    # Record client-side serialize, network and deserialize time, attempts and
+    # payload sizes of every endpoint call (see metrics.py). Hooks are called
+    # with each finished CallRecord, e.g. metrics.opentelemetry_hook().
+    def enable_metrics(self, max_samples=100000):
+        if self.transport.metrics is None:
+            self.transport.metrics = Metrics(max_samples)
+        return self.transport.metrics
 
+    def disable_metrics(self):
+        self.transport.metrics = None
 
+    def add_metrics_hook(self, hook):
+        self.enable_metrics().add_hook(hook)
 
-    def taup_surrogate(self, inputs):
-        req = {"inputs": inputs}
+    # Per endpoint call counts and p50/p95/p99 stage times as a DataFrame
+    def metrics_summary(self, since=0):
+        if self.transport.metrics is None:
+            return None
+        return self.transport.metrics.summary(since)
+
+    def metrics_report(self, since=0):
+        if self.transport.metrics is None:
+            return "Metrics are not enabled."
+        return self.transport.metrics.report(since)
+
+    # 'json' sends DataFrames as to_dict() JSON (the original format), 'columnar'
+    # sends msgpack with typed column buffers, 'auto' asks the server which it supports
+    def set_wire_format(self, wire_format, compression=None):
+        if wire_format == 'json':
+            self.transport.codec = JsonCodec(self.fast_json)
+        elif wire_format == 'columnar':
+            self.transport.codec = ColumnarCodec(compression)
+        elif wire_format == 'auto':
+            self.transport.codec = negotiate_codec(self.wire_formats(), self.fast_json)
+        else:
+            print("Wire format must be 'json', 'columnar' or 'auto'")
 
-        url = self.url_base + "taup_surrogate"
+    def set_fast_json(self, b):
+        if type(b) is bool:
+            self.fast_json = b
+            if isinstance(self.transport.codec, JsonCodec):
+                self.transport.codec = JsonCodec(b)
+        else:
+            print("Boolean required")
 
-        headers = {
-            "accept": "application/json", "access_token": str(self.api_key),
-            "Content-Type": "application/json"
-        }
-        response = requests.post(url, headers=headers, data=json.dumps(req))
-        if response.status_code != 200:
-            print("Error:", response.status_code, response.text)
+    def wire_formats(self):
+        # servers without /wire_formats only speak JSON
+        try:
+            return self.transport.get(self.url_base + "wire_formats", "wire_formats", self.api_key)
+        except RandlError:
             return None
-            
-        return response.json()["result"]
-
 
-    def baz_surrogate(self, inputs):
-        req = {"inputs": inputs}
+    # Each endpoint is split into a request builder and a result parser so that
+    # the blocking client and AsyncRandl share the same payloads.
+    def _result(self, response):
+        if response is None:
+            return None
+        try:
+            return response["result"]
+        except (KeyError, TypeError):
+            raise RandlResponseError("Response without a result: " + str(response)[:200])
+
+    # A BulletinHandle is sent as "<key>_handle" instead of embedding the catalog
+    def _add_catalog(self, req, key, bulletin):
+        if isinstance(bulletin, BulletinHandle):
+            req[key + "_handle"] = bulletin.handle
+        else:
+            req[key] = bulletin
 
-        url = self.url_base + "baz_surrogate"
+    # Upload a bulletin once; the returned handle can be passed to window_catalog,
+    # octree_search and octree_bulletin_refinement in place of the bulletin
+    def _upload_bulletin_request(self, bulletin):
+        return "bulletin_upload", {"handle": bulletin_hash(bulletin), "catalog": bulletin}
 
-        headers = {
-            "accept": "application/json", "access_token": str(self.api_key),
-            "Content-Type": "application/json"
-        }
-        response = requests.post(url, headers=headers, data=json.dumps(req))
-        if response.status_code != 200:
-            print("Error:", response.status_code, response.text)
+    def _bulletin_handle_result(self, response, bulletin):
+        if response is None:
+            return None
+        return BulletinHandle(response["result"]["handle"], bulletin)
+
+    def upload_bulletin(self, bulletin):
+        endpoint, req = self._upload_bulletin_request(bulletin)
+        return self._post(endpoint, req, lambda response: self._bulletin_handle_result(response, bulletin))
+
+    # Remove arrivals by ARID and/or append new arrivals to an uploaded bulletin
+    # without re-sending it. Returns a new handle; the old one stays valid
+    # until released.
+    def _update_bulletin_request(self, handle, remove_arids=None, append=None):
+        bulletin = apply_delta(handle.bulletin, remove_arids, append)
+        req = {"handle": handle.handle, "new_handle": bulletin_hash(bulletin),
+               "remove_arids": [] if remove_arids is None else list(remove_arids)}
+        if append is not None:
+            req["append"] = append
+        return "bulletin_delta", req, bulletin
+
+    def update_bulletin(self, handle, remove_arids=None, append=None):
+        endpoint, req, bulletin = self._update_bulletin_request(handle, remove_arids, append)
+        return self._post(endpoint, req, lambda response: self._bulletin_handle_result(response, bulletin))
+
+    def release_bulletin(self, handle):
+        return self._post("bulletin_release", {"handle": handle.handle}, self._result)
+
+    # Request builders start from the stage's cached request fragment
+    def _create_bulletin_request(self, config=None):
+        return 'create_bulletin', dict(self._config(config).bulletin.fragment())
+
+    def _create_bulletin_result(self, response):
+        if response is None:
             return None
-            
-        return response.json()["result"]
 
+        bulletin = read_frame(response["result"], self.fast_json)
+        rename_dic = {"STA_LAT":"LAT_STA", "STA_LON":"LON_STA","TIME":"TIME_ARRIV"}
+        bulletin.rename(rename_dic, axis='columns', inplace=True)
+        bulletin['TIME_ARRIV'] = bulletin.TIME_ARRIV.astype(str)
+        bulletin['ORIG_TIME'] = bulletin.ORIG_TIME.astype(str)
+        bulletin['STA'] = bulletin.STA.astype(str)
+        bulletin["BACK_AZIMUTH"]=0
+        bulletin = bulletin.loc[bulletin.IPHASE == "P", :]
+        bulletin.reset_index(drop=True, inplace=True)
+        if self.compact_bulletins:
+            bulletin = compact_bulletin(bulletin)
 
-    def baz_geo_surrogate(self, source_lat, source_lon, st_lat, st_lon):
-        req = {"source_lat": source_lat, "source_lon": source_lon, "st_lat": st_lat, "st_lon": st_lon}
+        return bulletin
 
-        url = self.url_base + "baz_geo_surrogate"
+    def create_bulletin(self, config=None):
+        endpoint, req = self._create_bulletin_request(config)
+        return self._post(endpoint, req, self._create_bulletin_result)
+    
+    
+    def _window_catalog_request(self, bulletin, config=None):
+        req = dict(self._config(config).window.fragment())
+        self._add_catalog(req, "catalog", bulletin)
+        return 'window', req
 
-        headers = {
-            "accept": "application/json", "access_token": str(self.api_key),
-            "Content-Type": "application/json"
-        }
-        response = requests.post(url, headers=headers, data=json.dumps(req))
-        if response.status_code != 200:
-            print("Error:", response.status_code, response.text)
+    def _window_catalog_result(self, response):
+        if response is None:
             return None
+        window = read_frame(response["result"], self.fast_json)
+        try:
+            window['ORIG_TIME'] = window.ORIG_TIME.astype(str)    
+        except:
+            error = "No ORIG_TIME column"
+            #print("No ORIG_TIME column.")
+        return window
 
-        return response.json()["result"]
+    def window_catalog(self, bulletin, config=None):
+        endpoint, req = self._window_catalog_request(bulletin, config)
+        if self.stage_cache is not None:
+            return self.stage_cache.get(endpoint, req, self.stage_cache.bulletin_key(bulletin),
+                                        lambda: self._post(endpoint, req, self._window_catalog_result))
+        return self._post(endpoint, req, self._window_catalog_result)
 
 
+    # Same selection as window_catalog, computed locally without a /window request.
+    # Pass a WindowIndex to reuse the parsed time index across many windows.
+    def window_catalog_local(self, bulletin, associated_arids=None, config=None):
+        if not isinstance(bulletin, WindowIndex):
+            bulletin = WindowIndex(bulletin)
+        window = self._config(config).window
+        return bulletin.window(window.start, window.length, window.min_phases, window.exclude_associated_phases,
+                               associated_arids)
 
-    def lonlat_to_geocentric(self, lon, lat, elev=0):
-        req = {"lon": lon, "lat": lat, "elev": elev}
+        
+    def _dml_prediction_request(self, window, config=None):
+        dml = self._config(config).dml
+        req = dict(dml.fragment())
+        req["catalog"] = window
+        return dml.endpoint, req
+
+    def _dml_prediction_result(self, response):
+        if response is None:
+            return None
+        return read_frame(response["result"], self.fast_json)
 
-        url = self.url_base + "lonlat_to_geocentric"
+    def dml_prediction(self, window, config=None):
+        return self._dml_prediction(window, config, self.dml_batcher)
 
-        headers = {
-            "accept": "application/json", "access_token": str(self.api_key),
-            "Content-Type": "application/json"
-        }
-        response = requests.post(url, headers=headers, data=json.dumps(req))
-        if response.status_code != 200:
-            print("Error:", response.status_code, response.text)
+    def _dml_prediction(self, window, config, batcher):
+        config = self._config(config)
+        endpoint, req = self._dml_prediction_request(window, config)
+        if batcher is not None:
+            compute = lambda: batcher.predict(window, config)
+        else:
+            compute = lambda: self._post(endpoint, req, self._dml_prediction_result)
+        if self.stage_cache is not None:
+            return self.stage_cache.get(endpoint, req, tuple(window['ARID']), compute)
+        return compute()
+
+    # Requests for a list of windows: one per window when batches aren't
+    # possible, otherwise windows packed into requests of at most batch_max_rows
+    # rows, each with the windows stacked into one catalog with a WINDOW_ID
+    # column. The predictions come back tagged the same way. Returns the
+    # endpoint, the requests and the (lo, hi) windows of each batch (None for
+    # one request per window).
+    def _dml_prediction_batch_requests(self, windows, config=None):
+        if len(windows) == 1 or self.dml_batch_supported is False:
+            reqs = [self._dml_prediction_request(w, config) for w in windows]
+            return reqs[0][0], [req for _, req in reqs], None
+        bounds = batching.group_bounds([len(w) for w in windows], self.batch_max_rows)
+        reqs = [self._dml_prediction_request(stack_windows(windows[lo:hi], range(lo, hi)), config)
+                for lo, hi in bounds]
+        return reqs[0][0] + "_batch", [req for _, req in reqs], bounds
+
+    def _dml_prediction_batch_results(self, bounds, results):
+        if bounds is None:
+            return results
+        self.dml_batch_supported = True
+        predictions = []
+        for (lo, hi), result in zip(bounds, results):
+            predictions.extend(split_predictions(result, range(lo, hi)))
+        return predictions
+
+    # A server without the batch endpoints turns them down; it gets one request
+    # per window from then on
+    def _dml_batch_refused(self, error):
+        if error.status not in (404, 405, 501):
+            return False
+        print("Server has no batched DML endpoint, predicting one window per request")
+        self.dml_batch_supported = False
+        return True
+
+    # DML predictions for a list of windows, one frame per window as
+    # dml_prediction returns it. Windows are packed into requests of at most
+    # batch_max_rows rows, sent up to batch_workers at once. Servers without
+    # the batch endpoints get one request per window instead.
+    def dml_prediction_batch(self, windows, config=None):
+        windows = list(windows)
+        if self.stage_cache is not None and len(windows) > 0:
+            endpoint, req = self._dml_prediction_request(windows[0], config)
+            return self.stage_cache.get_many(endpoint, req, [tuple(w['ARID']) for w in windows],
+                                             lambda owned: self._dml_prediction_batch([windows[i] for i in owned],
+                                                                                      config))
+        return self._dml_prediction_batch(windows, config)
+
+    def _dml_prediction_batch(self, windows, config=None):
+        if len(windows) == 0:
+            return []
+        endpoint, reqs, bounds = self._dml_prediction_batch_requests(windows, config)
+        try:
+            results = self._post_chunks(endpoint, reqs, self._dml_prediction_result)
+        except RandlHTTPError as e:
+            if bounds is None or not self._dml_batch_refused(e):
+                raise
+            return self._dml_prediction_batch(windows, config)
+        return self._dml_prediction_batch_results(bounds, results)
+    
+    
+    def _beamsearch_request(self, window, dml_predictions, config=None):
+        config = self._config(config)
+        dml = config.dml.fragment()
+        req = {"dml_predictions": dml_predictions, "window": window, **config.beam.fragment(),
+               "sta_count": dml["sta_count"], "pwave_model": dml["pwave_model"], "baz_model": dml["baz_model"],
+               "base_url": self.url_base, "api_key": self.api_key}
+        return "beamsearch", req
+
+    def beamsearch(self, window, dml_predictions, config=None):
+        endpoint, req = self._beamsearch_request(window, dml_predictions, config)
+        return self._post(endpoint, req, self._result)
+
+
+    # The BulletinFilter for a bulletin, built on first use and kept for the
+    # bulletin most recently filtered. Sorting or dropping rows in place gives
+    # the frame a new index, which makes it rebuild.
+    def _prefilter_for(self, bulletin):
+        f = self._bulletin_filter
+        if f is None or f.bulletin is not bulletin or f.index is not bulletin.index:
+            self._bulletin_filter = BulletinFilter(bulletin)
+        return self._bulletin_filter
+
+    def _octree_search_request(self, bulletin, beam_x, beam_y, beam_z, beam_time, config=None):
+        config = self._config(config)
+        octree = config.octree
+        # with a session the bulletin isn't sent anyway
+        if octree.prefilter and isinstance(bulletin, pd.DataFrame):
+            bulletin = self._prefilter_for(bulletin).subset(beam_x, beam_y, beam_time, config.window.length,
+                                                            **octree.prefilter_options())
+        req = {**octree.fragment(), "base_url": self.url_base, "api_key": self.api_key,
+               "beam_x": beam_x, "beam_y": beam_y, "beam_z": beam_z, "beam_time": beam_time,
+               'window_length': config.window.fragment()['window_length']}
+        self._add_catalog(req, "bulletin", bulletin)
+        return "octree_search", req
+
+    def octree_search(self, bulletin, beam_x, beam_y, beam_z, beam_time, config=None):
+        endpoint, req = self._octree_search_request(bulletin, beam_x, beam_y, beam_z, beam_time, config)
+        return self._post(endpoint, req, self._result)
+
+    def _octree_bulletin_refinement_request(self, bulletin, origins, config=None):
+        config = self._config(config)
+        octree = config.octree
+        try:
+            origins['Window_start'] = origins['Window_start'].astype(str)
+            origins['Window_end'] = origins['Window_end'].astype(str)
+            origins['Beamsearch_time'] = origins['Beamsearch_time'].astype(str)
+        except:
+            print("Missing expected beamsearch time columns")
+
+        # the prefilter needs each origin's beam location and time
+        if octree.prefilter and isinstance(bulletin, pd.DataFrame):
+            if {'Beam_lat', 'Beam_lon', 'Beamsearch_time'} <= set(origins.columns):
+                bulletin = self._prefilter_for(bulletin).subset_many(origins['Beam_lat'], origins['Beam_lon'],
+                                                                     origins['Beamsearch_time'],
+                                                                     config.window.length,
+                                                                     **octree.prefilter_options())
+            else:
+                print("Missing expected beamsearch columns, sending the whole bulletin")
+        req = {"predictions": origins, **octree.fragment(), "base_url": self.url_base, "api_key": self.api_key,
+               'window_length': config.window.fragment()['window_length']}
+        self._add_catalog(req, "bulletin", bulletin)
+        return "octree_bulletin_refinement", req
+
+    def _octree_bulletin_refinement_result(self, response):
+        if response is None:
             return None
+        return read_frame(response["result"], self.fast_json)
 
-        return response.json()["result"]     
+    def octree_bulletin_refinement(self, bulletin, origins, config=None):
+        endpoint, req = self._octree_bulletin_refinement_request(bulletin, origins, config)
+        return self._post(endpoint, req, self._octree_bulletin_refinement_result)
 
 
-    def geocentric_to_lonlat(self, x, y, z):
-        req = {"x": x, "y": y, "z": z}
 
-        url = self.url_base + "geocentric_to_lonlat"
+    def taup_surrogate(self, inputs):
+        return self._post("taup_surrogate", {"inputs": inputs}, self._result)
 
-        headers = {
-            "accept": "application/json", "access_token": str(self.api_key),
-            "Content-Type": "application/json"
-        }
-        response = requests.post(url, headers=headers, data=json.dumps(req))
-        if response.status_code != 200:
-            print("Error:", response.status_code, response.text)
-            return None
 
-        return response.json()["result"]  
+    def baz_surrogate(self, inputs):
+        return self._post("baz_surrogate", {"inputs": inputs}, self._result)
 
 
-    def scale_geocentric(self, x, y, z):
-        req = {"x": x, "y": y, "z": z}
+    def baz_geo_surrogate(self, source_lat, source_lon, st_lat, st_lon):
+        req = {"source_lat": source_lat, "source_lon": source_lon, "st_lat": st_lat, "st_lon": st_lon}
+        return self._post("baz_geo_surrogate", req, self._result)
 
-        url = self.url_base + "scale_geocentric"
 
-        headers = {
-            "accept": "application/json", "access_token": str(self.api_key),
-            "Content-Type": "application/json"
-        }
-        response = requests.post(url, headers=headers, data=json.dumps(req))
-        if response.status_code != 200:
-            print("Error:", response.status_code, response.text)
-            return None
 
-        return response.json()["result"] 
+    def set_batch_max_rows(self, n):
+        if type(n) is int and n > 0:
+            self.batch_max_rows = n
+        else:
+            print("Positive int required")
 
+    def set_batch_workers(self, n):
+        if type(n) is int and n > 0:
+            self.batch_workers = n
+        else:
+            print("Positive int required")
 
-    def unscale_geocentric(self, x, y, z):
-        req = {"x": x, "y": y, "z": z}
+    def _post_chunks(self, endpoint, reqs, parse=None):
+        parse = parse or self._result
+        if len(reqs) <= 1:
+            return [self._post(endpoint, req, parse) for req in reqs]
+        with ThreadPoolExecutor(max_workers=min(self.batch_workers, len(reqs))) as pool:
+            return list(pool.map(lambda req: self._post(endpoint, req, parse), reqs))
+
+    def _row_batch_requests(self, inputs):
+        rows = batching.as_rows(inputs)
+        return [{"inputs": rows[lo:hi].tolist()} for lo, hi in batching.chunk_bounds(len(rows), self.batch_max_rows)]
+
+    def _column_batch_requests(self, names, columns):
+        return [{name: column[lo:hi].tolist() for name, column in zip(names, columns)}
+                for lo, hi in batching.chunk_bounds(len(columns[0]), self.batch_max_rows)]
+
+    def _row_batches(self, endpoint, inputs):
+        table = self.surrogate_tables.get(endpoint)
+        if table is not None:
+            rows = batching.as_rows(inputs)
+            out, ok = table.lookup(rows, self.surrogate_tolerance)
+            if ok.all():
+                return out
+            inputs = rows[~ok]
+        result = batching.concat_rows(self._post_chunks(endpoint, self._row_batch_requests(inputs)))
+        return result if table is None else surrogate_tables.fill(table, out, ok, result)
+
+    # Answer taup_surrogate_batch and baz_surrogate_batch from local lookup
+    # tables of the surrogates' outputs over source-station distance, depth,
+    # azimuth and station elevation (see surrogate_tables.py). A table is
+    # built for the server's version() with batched calls, or loaded
+    # memory-mapped from directory if it was built and saved there before. Rows outside a table's grid, or in
+    # a cell where interpolation is off by more than tolerance, go to the
+    # server. A table that disagrees with the server by more than tolerance on
+    # random geometries isn't used.
+    def use_surrogate_tables(self, directory=None, tolerance=1e-3, endpoints=("taup_surrogate", "baz_surrogate")):
+        self.surrogate_tolerance = tolerance
+        for endpoint in endpoints:
+            # built from the server, not from the table being replaced
+            self.surrogate_tables.pop(endpoint, None)
+            table = surrogate_tables.load_or_build(self, endpoint, directory)
+            error = table.validation_error(tolerance)
+            if error is not None and error > tolerance:
+                print("%s table differs from the server by up to %.3g on random geometries, not using it"
+                      % (endpoint, error))
+                continue
+            self.surrogate_tables[endpoint] = table
+
+    def _column_batches(self, endpoint, names, columns):
+        return self._post_chunks(endpoint, self._column_batch_requests(names, columns))
+
+    # Batched surrogates: inputs is a list of rows, a 2-D array or a DataFrame
+    # with one model input vector per row; returns an array with one row per input
+    def taup_surrogate_batch(self, inputs):
+        return self._row_batches("taup_surrogate", inputs)
+
+    def baz_surrogate_batch(self, inputs):
+        return self._row_batches("baz_surrogate", inputs)
+
+    def baz_geo_surrogate_batch(self, source_lat, source_lon, st_lat, st_lon):
+        columns = batching.as_columns(source_lat, source_lon, st_lat, st_lon)
+        result = batching.concat_rows(self._column_batches("baz_geo_surrogate",
+                                      ["source_lat", "source_lon", "st_lat", "st_lon"], columns))
+        return None if result is None else result.ravel()
+
+    # Batched conversions return a tuple of arrays, as the util functions do
+    def lonlat_to_geocentric_batch(self, lon, lat, elev=0, local=None):
+        if self._local(local):
+            return util.lonlat_to_geocentric(*batching.as_columns(lon, lat, elev))
+        return batching.concat_columns(self._column_batches("lonlat_to_geocentric", ["lon", "lat", "elev"],
+                                                            batching.as_columns(lon, lat, elev)))
+
+    def geocentric_to_lonlat_batch(self, x, y, z, local=None):
+        if self._local(local):
+            return util.geocentric_to_lonlat(*batching.as_columns(x, y, z))
+        return batching.concat_columns(self._column_batches("geocentric_to_lonlat", ["x", "y", "z"],
+                                                            batching.as_columns(x, y, z)))
+
+    def scale_geocentric_batch(self, x, y, z, local=None):
+        if self._local(local):
+            return util.scale_geocentric(*batching.as_columns(x, y, z))
+        return batching.concat_columns(self._column_batches("scale_geocentric", ["x", "y", "z"],
+                                                            batching.as_columns(x, y, z)))
+
+    def unscale_geocentric_batch(self, x, y, z, local=None):
+        if self._local(local):
+            return util.unscale_geocentric(*batching.as_columns(x, y, z))
+        return batching.concat_columns(self._column_batches("unscale_geocentric", ["x", "y", "z"],
+                                                            batching.as_columns(x, y, z)))
+
+    def scale_time_batch(self, time, local=None):
+        if self._local(local):
+            return util.scale_time(batching.as_columns(time)[0])
+        result = batching.concat_rows(self._column_batches("scale_time", ["time"], batching.as_columns(time)))
+        return None if result is None else result.ravel()
+
+    def unscale_time_batch(self, time, local=None):
+        if self._local(local):
+            return util.unscale_time(batching.as_columns(time)[0])
+        result = batching.concat_rows(self._column_batches("unscale_time", ["time"], batching.as_columns(time)))
+        return None if result is None else result.ravel()
+
+    def set_compact_bulletins(self, b):
+        if type(b) is bool:
+            self.compact_bulletins = b
+        else:
+            print("Boolean required")
 
-        url = self.url_base + "unscale_geocentric"
+    def set_local_conversions(self, b):
+        if type(b) is bool:
+            self.local_conversions = b
+        else:
+            print("Boolean required")
 
-        headers = {
-            "accept": "application/json", "access_token": str(self.api_key),
-            "Content-Type": "application/json"
-        }
-        response = requests.post(url, headers=headers, data=json.dumps(req))
-        if response.status_code != 200:
-            print("Error:", response.status_code, response.text)
-            return None
+    # The conversion methods below take local=True (or set_local_conversions(True))
+    # to compute with the vectorized util functions; local calls accept arrays.
+    def _local(self, local):
+        return self.local_conversions if local is None else local
 
-        return response.json()["result"] 
+    def lonlat_to_geocentric(self, lon, lat, elev=0, local=None):
+        if self._local(local):
+            return list(util.lonlat_to_geocentric(lon, lat, elev))
+        return self._post("lonlat_to_geocentric", {"lon": lon, "lat": lat, "elev": elev}, self._result)
 
 
+    def geocentric_to_lonlat(self, x, y, z, local=None):
+        if self._local(local):
+            return list(util.geocentric_to_lonlat(x, y, z))
+        return self._post("geocentric_to_lonlat", {"x": x, "y": y, "z": z}, self._result)
 
-    def scale_time(self, time):
-        req = {"time": time}
 
-        url = self.url_base + "scale_time"
+    def scale_geocentric(self, x, y, z, local=None):
+        if self._local(local):
+            return list(util.scale_geocentric(x, y, z))
+        return self._post("scale_geocentric", {"x": x, "y": y, "z": z}, self._result)
 
-        headers = {
-            "accept": "application/json", "access_token": str(self.api_key),
-            "Content-Type": "application/json"
-        }
-        response = requests.post(url, headers=headers, data=json.dumps(req))
-        if response.status_code != 200:
-            print("Error:", response.status_code, response.text)
-            return None
 
-        return response.json()["result"]  
+    def unscale_geocentric(self, x, y, z, local=None):
+        if self._local(local):
+            return list(util.unscale_geocentric(x, y, z))
+        return self._post("unscale_geocentric", {"x": x, "y": y, "z": z}, self._result)
 
 
-    def unscale_time(self, time):
-        req = {"time": time}
 
-        url = self.url_base + "unscale_time"
+    def scale_time(self, time, local=None):
+        if self._local(local):
+            return util.scale_time(time)
+        return self._post("scale_time", {"time": time}, self._result)
 
-        headers = {
-            "accept": "application/json", "access_token": str(self.api_key),
-            "Content-Type": "application/json"
-        }
-        response = requests.post(url, headers=headers, data=json.dumps(req))
-        if response.status_code != 200:
-            print("Error:", response.status_code, response.text)
-            return None
 
-        return response.json()["result"]  
+    def unscale_time(self, time, local=None):
+        if self._local(local):
+            return util.unscale_time(time)
+        return self._post("unscale_time", {"time": time}, self._result)
 
 
     def version(self):
-        url = self.url_base + "version"
-
-        headers = {
-            "accept": "application/json", "access_token": str(self.api_key),
-            "Content-Type": "application/json"
-        }
-        response = requests.get(url, headers=headers)
-        if response.status_code != 200:
-            print("Error:", response.status_code, response.text)
+        response = self._get("version")
+        if response is None:
             return None
 
-        return response.json()['version'] 
+        return response['version'] 
 
 
     def constants(self):
-        url = self.url_base + "constants"
-
-        headers = {
-            "accept": "application/json", "access_token": str(self.api_key),
-            "Content-Type": "application/json"
-        }
-        response = requests.get(url, headers=headers)
-        if response.status_code != 200:
-            print("Error:", response.status_code, response.text)
-            return None
-
-        return response.json() 
+        return self._get("constants")
+
+    # Beamsearch and octree search on one window, with the association thresholds.
+    # Returns the step to take next and the origin found (without its window
+    # bounds), if any:
+    #   'skip' - no beam with 5 arids, try again 720 s later
+    #   'next' - beam score below 0.85, move to the next arrival time
+    #   'jump' - octree search done (origin or not), move on 12 minutes
+    def _search_window(self, window, dml_predictions, catalog, verbose=True, config=None):
+        beam_result = self.beamsearch(window, dml_predictions, config)
+
+        if len(beam_result['used_arids']) < 5:
+            if verbose:
+                print("No quality beams found")
+            return 'skip', None
 
+        if beam_result['score'] < 0.85:
+            print("Beam score too low")
+            return 'next', None
 
-    def associate_bulletin(self, bulletin, required_phases=5, exclude_associated_phases=False, travel_time=1800, verbose=True):
-        origins = pd.DataFrame(columns=['Window_start', 'Window_end', 'DML_mean_lat', 'DML_mean_lon', 'Beam_lat', 
-                                        'Beam_lon', 'Beam_depth', 'Beam_time', 'Beam_score', 'Beam_arids', 'oct_lon',
-                                        'oct_lat', 'oct_depth', 'oct_time', 'oct_arids'])
+        beam_lat = beam_result['unscaled_centroid'][0]
+        beam_lon = beam_result['unscaled_centroid'][1]
+        beam_depth = beam_result['unscaled_centroid'][2]#/1000
+        beam_time = beam_result['time']
 
-        window_length = travel_time
-        self.set_window_length(window_length)
-        self.set_window_phases_required(required_phases)
-        self.set_window_exclude_associated_phases(exclude_associated_phases)
+        try:
+            octree_result = self.octree_search(catalog, beam_lat, beam_lon, beam_depth, beam_time, config)
+            oct_arids = octree_result['used_arids']
+        except RandlHTTPError as e:
+            # the server turning down this one search (a 4xx) skips the window
+            # as before; overload and server errors that outlast the retries
+            # end the run, since every window would fail the same way
+            if e.status in overload_statuses or e.status >= 500:
+                raise
+            print("no octree result:", e)
+            return 'jump', None
+        except RandlResponseError as e:
+            print("no octree result:", e)
+            return 'jump', None
+        except RandlError:
+            # a failed request isn't "no result"; don't skip the window silently
+            raise
+        except Exception:
+            print("no octree result")
+            return 'jump', None
+
+        origin = {'DML_mean_lat': float(np.mean(dml_predictions.LAT_ORIG)),
+                  'DML_mean_lon': float(np.mean(dml_predictions.LON_ORIG)),
+                  'Beam_lat': beam_lat, 'Beam_lon': beam_lon, 'Beam_depth': beam_depth, 'Beam_time': beam_time,
+                  'Beam_score': beam_result['score'], 'Beam_arids': beam_result['used_arids'],
+                  'oct_lon': octree_result['unscaled_loc'][0], 'oct_lat': octree_result['unscaled_loc'][1],
+                  'oct_depth': octree_result['unscaled_loc'][2], 'oct_time': octree_result['time'],
+                  'oct_arids': oct_arids, 'oct_confidence': octree_result['confidence']}
+        return 'jump', origin
+
+    def associate_bulletin(self, bulletin, required_phases=5, exclude_associated_phases=False, travel_time=1800, verbose=True,
+                           use_session=False, local_windowing=False, pipeline_depth=0, checkpoint=None,
+                           checkpoint_every=300, resume_from=None, metrics_report=True, config=None, stepping='fixed',
+                           batch_dml=False):
+        # with metrics enabled, a table of this run's endpoint calls is printed at the end
+        metrics = self.transport.metrics if metrics_report else None
+        if metrics is not None:
+            metrics_mark = metrics.mark()
+            run_started = time.perf_counter()
+
+        # origin fields are collected column-wise and framed once at the end
+        origins = {c: [] for c in origin_columns}
+
+        # the run's settings are a local config, so the client itself isn't
+        # changed and can run other jobs at the same time
+        config = self._config(config).override(window={"length": int(travel_time), "min_phases": int(required_phases),
+                                                       "exclude_associated_phases": bool(exclude_associated_phases)})
 
         bulletin.sort_values(by=['TIME_ARRIV'], inplace=True)
 
-        start_times = bulletin.TIME_ARRIV.value_counts()[:].index.tolist()
-        start_times = sorted(start_times)
+        # local_windowing selects windows client-side and skips /window entirely
+        window_index = WindowIndex(bulletin) if local_windowing else None
+
+        # unique arrival times parsed once; the loop steps through them by index
+        # and binary search
+        start_times = arrival_start_times(bulletin)
         start_index = 0
-        starttime = parser.parse(start_times[start_index])
-        bulletin_end = parser.parse(bulletin.iloc[len(bulletin)-1]['TIME_ARRIV'])
+        starttime = pd.Timestamp(start_times[start_index])
+        bulletin_end = pd.Timestamp(start_times[-1])
 
         associated_arids = []
 
-        while starttime < bulletin_end:
-            self.set_window_start(starttime.strftime('%Y-%m-%dT%H:%M:%S'))
-            window = self.window_catalog(bulletin)
-            #print("Associated arids:", len(associated_arids))
-            #print("Length of window before removing arids:", len(window))
-            window = window[~window['ARID'].isin(associated_arids)]
-            #print("Length of window after removing arids: ", len(window))
-
-            if len(window) < 6:
-                print("Not enough arrivals in window starting at", starttime.strftime('%Y-%m-%dT%H:%M:%S'))
-                try:
-                    start_index += 1
-                    starttime = parser.parse(start_times[start_index])
-                except:
-                    print("Couldn't increment start_idx")
-                    start_index -= 1
-                    break
-                continue
-
-            if verbose:
-                print("Starting window at", starttime.strftime('%Y-%m-%dT%H:%M:%S'))
+        # stepping='density' or 'peaks' picks start times from a histogram of the
+        # arrivals not yet associated (see stepping.py); 'fixed' steps as always
+        stepper = None
+        if stepping != 'fixed':
+            stepper = DensityStepper(bulletin, start_times, config.window.length, config.window.min_phases,
+                                     policy=stepping)
+
+        # checkpoint=<directory> saves the loop state every checkpoint_every
+        # seconds, at the end of the run and when it fails; resume_from=<directory>
+        # continues a run from its last saved state (and keeps checkpointing there)
+        run_key = None
+        if checkpoint is not None or resume_from is not None:
+            run_key = {"bulletin": bulletin_hash(bulletin), "required_phases": required_phases,
+                       "exclude_associated_phases": exclude_associated_phases, "travel_time": travel_time}
+            if stepper is not None:
+                run_key["stepping"] = stepping
+        if resume_from is not None:
+            state = load_checkpoint(resume_from)
+            if state is None:
+                print("No checkpoint in", resume_from, "- starting from the beginning")
+            elif state["key"] != run_key:
+                print("Checkpoint in", resume_from, "is for a different bulletin or settings - starting from the beginning")
+            else:
+                starttime = state["starttime"]
+                start_index = state["start_index"]
+                associated_arids = state["associated_arids"]
+                origins = {c: state["origins"][c].tolist() for c in origin_columns}
+                if stepper is not None:
+                    stepper.associate(associated_arids)
+                print("Resuming at", starttime.strftime('%Y-%m-%dT%H:%M:%S'), "with", len(origins['Window_start']),
+                      "origins")
+            if checkpoint is None:
+                checkpoint = resume_from
+
+        def save():
+            if checkpoint is not None:
+                save_checkpoint(checkpoint, starttime, start_index, associated_arids,
+                                pd.DataFrame(origins, columns=origin_columns), run_key)
+        last_saved = time.monotonic()
+
+        # with use_session the bulletin is uploaded once and windows/octree
+        # searches reference it by handle instead of re-sending it; the session
+        # is released however the run ends
+        catalog = bulletin
+        if use_session:
             try:
-                window_end = parser.parse(window.TIME_ARRIV.iloc[len(window)-1])
-                window_start = parser.parse(window.TIME_ARRIV.iloc[0])
-            except:
-                start_index += 1
-                starttime = parser.parse(start_times[start_index])
-                continue
-
-            dml_predictions = self.dml_prediction(window)
-
-            beam_result = self.beamsearch(window, dml_predictions)
+                catalog = self.upload_bulletin(bulletin)
+            except RandlError as e:
+                print("Bulletin upload failed, sending full bulletin with each request:", e)
+                catalog = bulletin
+
+        # pipeline_depth > 0 fetches windows and DML predictions for up to that
+        # many upcoming start times while the current window is being searched;
+        # with batch_dml their DML predictions go out as one batched request
+        prefetch = None
+        try:
+            if pipeline_depth > 0:
+                batcher = None
+                if batch_dml:
+                    batcher = self.dml_batcher or DMLBatcher(self, max_windows=pipeline_depth)
+                prefetch = WindowPrefetcher(self, catalog, window_index, depth=pipeline_depth, config=config,
+                                            batcher=batcher)
+
+            while starttime < bulletin_end:
+                if checkpoint is not None and time.monotonic() - last_saved >= checkpoint_every:
+                    save()
+                    last_saved = time.monotonic()
+                if stepper is not None:
+                    # windows that can't have enough arrivals are never requested
+                    start_index, starttime = stepper.first_start(start_index, starttime)
+                    if starttime >= bulletin_end:
+                        break
+                start = starttime.strftime('%Y-%m-%dT%H:%M:%S')
+                # same value set_window_start would store, without reparsing it
+                config = config.override(window={"start": starttime.strftime('%Y-%m-%d %H:%M:%S.000000')})
+                if prefetch is not None:
+                    window = prefetch.window(start, associated_arids)
+                    upcoming = upcoming_starts(start_times, start_index, starttime, pipeline_depth)
+                    if stepper is not None:
+                        upcoming = stepper.upcoming(upcoming, start_index, starttime, pipeline_depth)
+                    prefetch.schedule(upcoming, associated_arids)
+                else:
+                    if window_index is not None:
+                        window = self.window_catalog_local(window_index, associated_arids, config)
+                    else:
+                        window = self.window_catalog(catalog, config)
+                    #print("Associated arids:", len(associated_arids))
+                    #print("Length of window before removing arids:", len(window))
+                    window = window[~window['ARID'].isin(associated_arids)]
+                    #print("Length of window after removing arids: ", len(window))
+
+                if len(window) < 6:
+                    print("Not enough arrivals in window starting at", starttime.strftime('%Y-%m-%dT%H:%M:%S'))
+                    try:
+                        start_index += 1
+                        starttime = pd.Timestamp(start_times[start_index])
+                    except:
+                        print("Couldn't increment start_idx")
+                        start_index -= 1
+                        break
+                    continue
 
-            if len(beam_result['used_arids']) < 5:
                 if verbose:
-                    print("No quality beams found")
-                starttime += timedelta(seconds=720)
-                continue
-
-            if beam_result['score'] < 0.85:
-                print("Beam score too low")
+                    print("Starting window at", starttime.strftime('%Y-%m-%dT%H:%M:%S'))
                 try:
-                    start_index += 1
-                    starttime = parser.parse(start_times[start_index])
+                    window_end = _as_datetime(window.TIME_ARRIV.iloc[len(window)-1])
+                    window_start = _as_datetime(window.TIME_ARRIV.iloc[0])
                 except:
-                    print("Couldn't increment start_idx")
-                    start_index -= 1
-                    break
-                continue
-
-
-            dml_lat_mean = mean(dml_predictions.LAT_ORIG)
-            dml_lon_mean = mean(dml_predictions.LON_ORIG)
-
-
-            beam_lat = beam_result['unscaled_centroid'][0]
-            beam_lon = beam_result['unscaled_centroid'][1]
-            beam_depth = beam_result['unscaled_centroid'][2]#/1000
-            beam_time = beam_result['time']
-
-            try:
-                octree_result = self.octree_search(bulletin, beam_lat, beam_lon, beam_depth, beam_time)
-                associated_arids.extend(octree_result['used_arids'])
-            except:
-                print("no octree result")
-                starttime = starttime + datetime.timedelta(minutes=12)
-                while start_index < len(start_times) -1 and parser.parse(start_times[start_index]) < starttime:
                     start_index += 1
-                
-                starttime = parser.parse(start_times[start_index])
-                continue
-
-            result=pd.DataFrame()
-            result['Window_start'] = [window_start]
-            result['Window_end'] = [window_end]
-            result['DML_mean_lat'] = [dml_lat_mean]
-            result['DML_mean_lon'] = [dml_lon_mean]
-            result['Beam_lat'] = [beam_lat]
-            result['Beam_lon'] = [beam_lon]
-            result['Beam_depth'] = [beam_depth]
-            result['Beam_time'] = [beam_time]
-            result['Beam_score'] = [beam_result['score']]
-            result['Beam_arids'] = [beam_result['used_arids']]
-            result['oct_lon'] = [octree_result['unscaled_loc'][0]]
-            result['oct_lat'] = [octree_result['unscaled_loc'][1]]
-            result['oct_depth'] = [octree_result['unscaled_loc'][2]]
-            result['oct_time'] = [octree_result['time']]
-            result['oct_confidence'] = [octree_result['confidence']]
-            result['oct_arids'] = [octree_result['used_arids']]
-            origins = pd.concat([origins, result], ignore_index=True)
-
-            starttime = starttime + datetime.timedelta(minutes=12)
-            while start_index < len(start_times) -1 and parser.parse(start_times[start_index]) < starttime:
-                start_index += 1
-                
-            starttime = parser.parse(start_times[start_index])
-
+                    starttime = pd.Timestamp(start_times[start_index])
+                    continue
+
+                if prefetch is not None:
+                    dml_predictions = prefetch.dml_prediction(start, window)
+                else:
+                    dml_predictions = self.dml_prediction(window, config)
+
+                step, origin = self._search_window(window, dml_predictions, catalog, verbose, config)
+                if step == 'skip':
+                    if stepping == 'peaks':
+                        start_index, starttime = stepper.next_peak(start_index, starttime)
+                    else:
+                        starttime += timedelta(seconds=720)
+                    continue
+                if step == 'next':
+                    try:
+                        start_index += 1
+                        starttime = pd.Timestamp(start_times[start_index])
+                    except:
+                        print("Couldn't increment start_idx")
+                        start_index -= 1
+                        break
+                    continue
+
+                if origin is not None:
+                    associated_arids.extend(origin['oct_arids'])
+                    if stepper is not None:
+                        stepper.associate(origin['oct_arids'])
+                    origin['Window_start'] = window_start
+                    origin['Window_end'] = window_end
+                    for c in origin_columns:
+                        origins[c].append(origin[c])
+
+                if stepping == 'peaks':
+                    start_index, starttime = stepper.next_peak(start_index, starttime)
+                else:
+                    start_index = next_start_index(start_times, start_index, starttime + datetime.timedelta(minutes=12))
+                    starttime = pd.Timestamp(start_times[start_index])
+        except BaseException:
+            # keep what has been found so far; resume_from picks up at this window
+            save()
+            raise
+        finally:
+            if prefetch is not None:
+                prefetch.close()
+            if isinstance(catalog, BulletinHandle):
+                try:
+                    self.release_bulletin(catalog)
+                except RandlError as e:
+                    print("Could not release bulletin session:", e)
+        save()
+
+        if verbose and prefetch is not None:
+            print("Speculative DML predictions used:", prefetch.hits, "recomputed:", prefetch.misses)
+        if verbose and stepper is not None:
+            print("Start times passed over by arrival density:", stepper.skipped)
+
+        if len(origins['Window_start']) > 0:
+            origins = pd.DataFrame(origins, columns=origin_columns)
+        else:
+            origins = pd.DataFrame(columns=origin_columns)
         print(len(origins), "origins found in bulletin.")        
+        if metrics is not None:
+            print(metrics.run_report(metrics_mark, time.perf_counter() - run_started))
         return origins
 
 
 
+    # Split the bulletin into time partitions overlapping by travel_time, associate
+    # them concurrently (executor='thread' or 'process') and merge the results.
+    # With batch_dml=True, partitions on threads send their DML predictions
+    # together in batched requests.
+    def associate_bulletin_parallel(self, bulletin, n_workers=4, partition_span=86400, executor='thread', **kwargs):
+        return parallel.associate_bulletin_parallel(self, bulletin, n_workers, partition_span, executor, **kwargs)
+
+    # Associate the bulletin once per configuration of a parameter grid, sharing
+    # window and DML results between configurations (and with batch_dml=True,
+    # batching DML requests across them). See sweep.sweep.
+    def sweep(self, bulletin, grid, n_workers=4, verbose=False, **kwargs):
+        return sweep.sweep(self, bulletin, grid, n_workers, verbose, **kwargs)
+
+    # Associate arrivals as they come in: batches is an iterable of bulletin
+    # DataFrames and origins (dicts with the associate_bulletin columns) are
+    # yielded as soon as their window is complete. See StreamingAssociator.
+    def associate_stream(self, batches, required_phases=5, exclude_associated_phases=False, travel_time=1800,
+                         verbose=True, **kwargs):
+        associator = StreamingAssociator(self, required_phases, exclude_associated_phases, travel_time,
+                                         verbose=verbose, **kwargs)
+        return associator.stream(batches)
+
             
     def __repr__ (self):
         return "RaNDL Client - Version:" + client_version + "\n\nServer URL:\t" + self.url_base + "\nAPI Key:\t" + self.api_key + "\n\n-Bulletin Parameters-\nStart:\t\t" + self.bulletin_start + "\nEnd:\t\t" + self.bulletin_end \
@@ -723,3 +1153,18 @@ class Randl:
     + "\nSequence time:\t" + self.beam_sequence_timedist + "\n-Octree parameters-\nOctree time spacing:\t" + self.octree_time_spacing \
     + "\nOctree time threshold:\t" + self.octree_time_threshold + "\nOctree time samples:\t" + self.octree_time_samples \
     + "\nOctree loc spacing:\t" + self.octree_loc_spacing + "\nOctree loc samples:\t" + self.octree_loc_samples + "\nOctree max iterations:\t" + self.octree_iterations
+
+
+# The attributes Randl had before config.py (window_length, beam_width, ...)
+# read and write Randl.config
+def _legacy_property(name, stage, field):
+    def get(self):
+        return legacy_value(name, getattr(getattr(self.config, stage), field))
+
+    def set(self, value):
+        self._configure(stage, **{field: parse_legacy(stage, field, value)})
+    return property(get, set)
+
+
+for _name, (_stage, _field) in legacy_attributes.items():
+    setattr(Randl, _name, _legacy_property(_name, _stage, _field))
@@ -0,0 +1,151 @@
+import random
+import threading
+import time
+from .errors import RandlHTTPError, RandlConnectionError
+
+# Statuses that mean the server is overloaded or briefly unavailable
+overload_statuses = (429, 500, 502, 503, 504)
+
+
+class RetryPolicy:
+    # Exponential backoff with full jitter: attempt n waits a random time in
+    # [0, min(max_backoff, backoff * 2**(n-1))], or at least the server's
+    # Retry-After. Attempts and deadlines are per endpoint, with "default" for
+    # the rest; a deadline bounds the whole call including waits.
+    #
+    # RaNDL endpoints compute their result from the request alone (bulletin
+    # sessions are keyed by content hash), so all of them are safe to repeat.
+    # Endpoints listed in non_idempotent are only retried when the server can't
+    # have acted on the request: connect failures, 429 and 503.
+    def __init__(self, max_attempts=3, backoff=0.5, max_backoff=30.0, jitter=True, retry_statuses=overload_statuses,
+                 non_idempotent=()):
+        self.max_attempts = {"default": max_attempts}
+        self.deadlines = {"default": None}
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.retry_statuses = set(retry_statuses)
+        self.non_idempotent = set(non_idempotent)
+
+    def set_max_attempts(self, n, endpoint="default"):
+        self.max_attempts[endpoint] = n
+
+    def get_max_attempts(self, endpoint):
+        return self.max_attempts.get(endpoint, self.max_attempts["default"])
+
+    def set_deadline(self, seconds, endpoint="default"):
+        self.deadlines[endpoint] = seconds
+
+    def get_deadline(self, endpoint):
+        return self.deadlines.get(endpoint, self.deadlines["default"])
+
+    def retryable(self, endpoint, error):
+        if isinstance(error, RandlHTTPError):
+            if endpoint in self.non_idempotent:
+                return error.status in (429, 503)
+            return error.status in self.retry_statuses
+        if isinstance(error, RandlConnectionError):
+            return endpoint not in self.non_idempotent or not error.sent
+        return False
+
+    def should_retry(self, endpoint, error, attempt):
+        return attempt < self.get_max_attempts(endpoint) and self.retryable(endpoint, error)
+
+    def delay(self, attempt, retry_after=None):
+        delay = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+
+class CircuitBreaker:
+    # Shared by every request of a client. After failure_threshold consecutive
+    # overload failures (retryable statuses, connection errors, timeouts) the
+    # circuit opens and requests wait instead of going out. After reset_timeout
+    # one request is let through as a probe: success closes the circuit,
+    # failure opens it again.
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        # number of the latest probe
+        self.probes = 0
+        self.opened = 0
+        self.lock = threading.Lock()
+
+    # locks don't pickle; a breaker sent to another process starts closed
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["lock"]
+        state.update(failures=0, opened_at=None, probing=False)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if self.probing or time.monotonic() >= self.opened_at + self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    # Seconds a request has to wait before it may go out (0 means go now), and
+    # the probe's number if it goes out as the probe
+    def admit(self):
+        with self.lock:
+            if self.opened_at is None:
+                return 0.0, None
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0:
+                return remaining, None
+            if self.probing:
+                # another request is probing; check again shortly
+                return min(0.5, self.reset_timeout), None
+            self.probing = True
+            self.probes += 1
+            return 0.0, self.probes
+
+    def wait_time(self):
+        return self.admit()[0]
+
+    # Called when a probe request is over, however it ended. A probe that
+    # raised before its outcome was recorded (KeyboardInterrupt, a codec error)
+    # would otherwise leave the circuit half-open with nothing let through.
+    def end_probe(self, probe):
+        with self.lock:
+            if probe is not None and self.probing and probe == self.probes:
+                self.probing = False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self.probing:
+                    self.opened += 1
+                self.opened_at = time.monotonic()
+                self.probing = False
+
+    def reset(self):
+        self.record_success()
+
+
+# Retry-After in seconds, if the server sent one as a number
+def retry_after_seconds(headers):
+    value = headers.get("Retry-After") if headers is not None else None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
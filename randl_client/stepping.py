@@ -0,0 +1,171 @@
+import numpy as np
+import pandas as pd
+from .compact import parse_times
+
+# How associate_bulletin moves from one window start to the next:
+#   'fixed'   - the original rules: 12 minutes on after a search, 720 s on when
+#               there's no quality beam, one arrival time on otherwise
+#   'density' - the same steps, but start times whose window can't hold enough
+#               unassociated arrivals are passed over without a request. The
+#               density is an upper bound, so origins are the same as 'fixed'
+#   'peaks'   - as 'density', but after a search, and when no quality beam was
+#               found, the loop moves to the next peak of the unassociated
+#               arrival density instead of 12 minutes / 720 s on. Sparse
+#               stretches are crossed in one step, and events less than 12
+#               minutes apart aren't jumped over
+policies = ('fixed', 'density', 'peaks')
+
+# arrivals per bin are counted in bins this wide
+bin_seconds = 10
+
+
+class DensityStepper:
+    # Histogram of a bulletin's arrival times, all of them and the ones not yet
+    # associated. A window's count is bounded by the bins it touches, so a start
+    # time can be ruled out (fewer than min_arrivals unassociated arrivals or
+    # fewer than required_phases in all) without asking the server.
+    # start_times is the sorted array associate_bulletin steps through.
+    def __init__(self, bulletin, start_times, window_length, required_phases, min_arrivals=6, policy='density',
+                 bin_width=bin_seconds):
+        if policy not in policies[1:]:
+            raise ValueError("Unknown stepping policy: " + str(policy))
+        self.policy = policy
+        self.start_times = start_times
+        self.required_phases = int(required_phases)
+        self.min_arrivals = int(min_arrivals)
+        self.bin_ns = int(bin_width * 1e9)
+        self.length_ns = int(float(window_length) * 1e9)
+        # bins a window starting at a bin's start reaches into
+        self.span = self.length_ns // self.bin_ns
+
+        times = parse_times(bulletin['TIME_ARRIV']).to_numpy(dtype='datetime64[ns]').view('i8')
+        order = np.argsort(times, kind='stable')
+        self.times = times[order]
+        self.arids = pd.Index(np.asarray(bulletin['ARID'])[order])
+        self.origin = int(self.times[0]) if len(self.times) else 0
+        self.bins = (self.times - self.origin) // self.bin_ns
+        n_bins = int(self.bins[-1]) + 1 if len(self.bins) else 1
+        self.all = np.bincount(self.bins, minlength=n_bins)
+        self.unassociated = self.all.copy()
+        self.associated = np.zeros(len(self.times), dtype=bool)
+        # running totals of the histograms, the unassociated one rebuilt after
+        # arrivals are associated
+        self.cumulative_all = np.concatenate(([0], np.cumsum(self.all)))
+        self.cumulative_unassociated = self.cumulative_all
+        # start times passed over without a request
+        self.skipped = 0
+
+    def _bin(self, ns):
+        return np.clip((np.asarray(ns, dtype='i8') - self.origin) // self.bin_ns, -1, len(self.all))
+
+    # Arrivals in bins lo..hi (inclusive), for arrays of bounds, from a running
+    # total of the histogram
+    def _counts(self, cumulative, lo, hi):
+        lo = np.clip(lo, 0, len(cumulative) - 1)
+        hi = np.clip(hi + 1, 0, len(cumulative) - 1)
+        return cumulative[np.maximum(hi, lo)] - cumulative[lo]
+
+    # Which of the start times (datetime64[ns] as int64) could give a window
+    # with enough arrivals. The window itself starts at the whole second, as
+    # associate_bulletin sends it.
+    def _could_qualify(self, starts_ns):
+        starts_ns = starts_ns - starts_ns % 1000000000
+        lo = self._bin(starts_ns)
+        hi = self._bin(starts_ns + self.length_ns)
+        return ((self._counts(self.cumulative_unassociated, lo, hi) >= self.min_arrivals)
+                & (self._counts(self.cumulative_all, lo, hi) >= self.required_phases))
+
+    def could_qualify(self, starttime):
+        return bool(self._could_qualify(np.array([pd.Timestamp(starttime).value]))[0])
+
+    # Mark arrivals as associated; their bins no longer count towards windows
+    def associate(self, arids):
+        if len(arids) == 0:
+            return
+        positions = self.arids.get_indexer(pd.Index(arids).unique())
+        positions = positions[positions >= 0]
+        positions = positions[~self.associated[positions]]
+        self.associated[positions] = True
+        np.subtract.at(self.unassociated, self.bins[positions], 1)
+        self.cumulative_unassociated = np.concatenate(([0], np.cumsum(self.unassociated)))
+
+    def _first_qualifying(self, j, chunk=4096):
+        while j < len(self.start_times):
+            starts = self.start_times[j:j + chunk].view('i8')
+            ok = np.flatnonzero(self._could_qualify(starts))
+            if len(ok):
+                return j + int(ok[0])
+            j += chunk
+        return len(self.start_times) - 1
+
+    # First bin at or after b that is a density peak: a window starting there
+    # has the most unassociated arrivals of any start from b up to a window
+    # length later, and the last bin with that count before it drops
+    def _next_peak_bin(self, b, chunk=None):
+        chunk = chunk or max(1024, 8 * self.span)
+        b = first = max(int(b), 0)
+        while b < len(self.all):
+            bins = np.arange(b - self.span, b + chunk + self.span + 2)
+            windows = self._counts(self.cumulative_unassociated, bins, bins + self.span)
+            # starts before b can't be gone back to
+            windows[bins < first] = -1
+            neighbourhood = pd.Series(windows).rolling(2 * self.span + 1, center=True, min_periods=1).max().to_numpy()
+            candidates = np.arange(self.span, self.span + chunk)
+            peak = ((windows[candidates] >= neighbourhood[candidates])
+                    & (windows[candidates] > windows[candidates + 1])
+                    & (windows[candidates] >= self.min_arrivals)
+                    & (self._counts(self.cumulative_all, bins[candidates], bins[candidates] + self.span)
+                       >= self.required_phases))
+            found = np.flatnonzero(peak)
+            if len(found):
+                return int(bins[candidates[found[0]]])
+            b += chunk
+        return None
+
+    # First unassociated arrival after after_ns in bin b, if any
+    def _first_arrival_in_bin(self, b, after_ns):
+        lo = np.searchsorted(self.times, max(after_ns + 1, self.origin + b * self.bin_ns), side='left')
+        hi = np.searchsorted(self.times, self.origin + (b + 1) * self.bin_ns, side='left')
+        free = np.flatnonzero(~self.associated[lo:hi])
+        return int(self.times[lo + free[0]]) if len(free) else None
+
+    # The start associate_bulletin should search from (start_index, starttime)
+    # on: itself if its window could have enough arrivals, otherwise the next
+    # start time that could. Past the last one it's the last start time, where
+    # the loop ends.
+    def first_start(self, start_index, starttime):
+        if self.could_qualify(starttime):
+            return start_index, starttime
+        j = self._first_qualifying(start_index + 1)
+        self.skipped += j - start_index
+        return j, pd.Timestamp(self.start_times[j])
+
+    # The start of the next density peak after starttime ('peaks' policy)
+    def next_peak(self, start_index, starttime):
+        after_ns = pd.Timestamp(starttime).value
+        b = int(self._bin(after_ns))
+        while True:
+            b = self._next_peak_bin(b)
+            if b is None:
+                return len(self.start_times) - 1, pd.Timestamp(self.start_times[-1])
+            t = self._first_arrival_in_bin(b, after_ns)
+            if t is not None:
+                j = int(np.searchsorted(self.start_times.view('i8'), t, side='left'))
+                return max(j, start_index), pd.Timestamp(t)
+            b += 1
+
+    # Start times (as start_format strings) the loop is likely to visit next,
+    # for the window prefetcher: starts doesn't know about the policy, so
+    # those that can't qualify are dropped and for 'peaks' the next peak is
+    # put first
+    def upcoming(self, starts, start_index, starttime, depth):
+        if self.policy == 'peaks':
+            starts = [self.next_peak(start_index, starttime)[1]] + list(starts)
+        upcoming = []
+        for start in starts:
+            start = pd.Timestamp(start)
+            if self.could_qualify(start):
+                start = start.strftime('%Y-%m-%dT%H:%M:%S')
+                if start not in upcoming:
+                    upcoming.append(start)
+        return upcoming[:depth]
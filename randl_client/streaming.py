@@ -0,0 +1,202 @@
+import asyncio
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+from .windowing import WindowIndex
+from .compact import parse_times
+
+
+class StreamingAssociator:
+    # Incremental associate_bulletin over a feed of arrival batches (DataFrames
+    # in the bulletin layout, roughly in time order). Arrivals are kept in a
+    # rolling buffer that serves as the catalog for /window and octree searches.
+    # A window starting at t is searched once arrivals up to
+    # t + travel_time + delay have been seen, using the same steps and thresholds
+    # as associate_bulletin. Arrivals more than `horizon` seconds (default
+    # travel_time) before the current start are evicted, along with their
+    # associated ARIDs, so memory stays bounded by the feed rate.
+    def __init__(self, client, required_phases=5, exclude_associated_phases=False, travel_time=1800, horizon=None,
+                 delay=0, local_windowing=False, verbose=True):
+        # the window settings go in the associator's own config, so the caller's
+        # client is left alone
+        self.client = client
+        self.config = client.config.override(window={"length": int(travel_time), "min_phases": int(required_phases),
+                                                     "exclude_associated_phases": bool(exclude_associated_phases)})
+        self.travel_time = np.timedelta64(int(travel_time * 1e9), 'ns')
+        self.horizon = self.travel_time if horizon is None else np.timedelta64(int(horizon * 1e9), 'ns')
+        self.delay = np.timedelta64(int(delay * 1e9), 'ns')
+        self.local_windowing = local_windowing
+        self.verbose = verbose
+
+        self.buffer = None
+        self.times = np.empty(0, dtype='datetime64[ns]')
+        self.associated_arids = set()
+        self.watermark = None
+        # next window start; `anchor` is the arrival time the last arrival-based
+        # step landed on, which 'next' steps continue from, as start_index does
+        # in associate_bulletin
+        self.starttime = None
+        self.anchor = None
+        # pending step when the start it needs hasn't arrived yet
+        self.pending = None
+
+        self.windows = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return 0 if self.buffer is None else len(self.buffer)
+
+    def _append(self, batch):
+        if batch is None or len(batch) == 0:
+            return
+        times = parse_times(batch['TIME_ARRIV']).to_numpy(dtype='datetime64[ns]')
+        # arrivals that are already past the horizon can't be associated any more
+        if self.starttime is not None:
+            keep = times >= self._cutoff()
+            if not keep.all():
+                self.evicted += int((~keep).sum())
+                batch = batch[keep]
+                times = times[keep]
+                if len(batch) == 0:
+                    return
+
+        if self.buffer is None:
+            buffer, all_times = batch, times
+        else:
+            buffer = pd.concat([self.buffer, batch], ignore_index=True)
+            all_times = np.concatenate([self.times, times])
+        order = np.argsort(all_times, kind='stable')
+        if np.any(order != np.arange(len(order))):
+            buffer = buffer.iloc[order]
+            all_times = all_times[order]
+        self.buffer = buffer.reset_index(drop=True)
+        self.times = all_times
+
+        latest = pd.Timestamp(self.times[-1])
+        if self.watermark is None or latest > self.watermark:
+            self.watermark = latest
+        if self.starttime is None:
+            self.starttime = pd.Timestamp(self.times[0])
+            self.anchor = self.starttime
+
+    def _cutoff(self):
+        return (min(self.starttime, self.anchor) - pd.Timedelta(self.horizon)).to_datetime64()
+
+    def _evict(self):
+        if self.buffer is None or self.starttime is None:
+            return
+        n = int(np.searchsorted(self.times, self._cutoff(), side='left'))
+        if n == 0:
+            return
+        self.associated_arids.difference_update(self.buffer['ARID'].iloc[:n].tolist())
+        self.buffer = self.buffer.iloc[n:].reset_index(drop=True)
+        self.times = self.times[n:]
+        self.evicted += n
+
+    # Resolve a pending step against the arrivals seen so far. Returns False if
+    # the arrival it needs hasn't come in yet.
+    def _resolve(self, start_times):
+        if self.pending is None:
+            return True
+        step, t = self.pending
+        side = 'right' if step == 'next' else 'left'
+        j = np.searchsorted(start_times, t.to_datetime64(), side=side)
+        if j >= len(start_times):
+            return False
+        self.starttime = self.anchor = pd.Timestamp(start_times[j])
+        self.pending = None
+        return True
+
+    def _ready(self, final):
+        if final:
+            return self.starttime < self.watermark
+        return self.starttime + pd.Timedelta(self.travel_time + self.delay) <= self.watermark
+
+    def _window(self, catalog, window_index):
+        if window_index is not None:
+            window = self.client.window_catalog_local(window_index, self.associated_arids, self.config)
+        else:
+            window = self.client.window_catalog(catalog, self.config)
+        if window is None:
+            return None
+        return window[~window['ARID'].isin(self.associated_arids)]
+
+    # Search every window that is complete; with final=True (end of the feed)
+    # every remaining start is searched, as associate_bulletin would
+    def _process(self, final=False):
+        found = []
+        if self.buffer is None:
+            return found
+        start_times = np.sort(pd.unique(self.times))
+        catalog = self.buffer
+        window_index = WindowIndex(catalog) if self.local_windowing else None
+
+        while self._resolve(start_times) and self._ready(final):
+            starttime = self.starttime
+            self.config = self.config.override(window={"start": starttime.strftime('%Y-%m-%d %H:%M:%S.000000')})
+            window = self._window(catalog, window_index)
+            self.windows += 1
+
+            if window is None or len(window) < 6:
+                print("Not enough arrivals in window starting at", starttime.strftime('%Y-%m-%dT%H:%M:%S'))
+                self.pending = ('next', self.anchor)
+                continue
+
+            if self.verbose:
+                print("Starting window at", starttime.strftime('%Y-%m-%dT%H:%M:%S'))
+            try:
+                window_end = pd.Timestamp(window.TIME_ARRIV.iloc[len(window)-1]).to_pydatetime(warn=False)
+                window_start = pd.Timestamp(window.TIME_ARRIV.iloc[0]).to_pydatetime(warn=False)
+            except:
+                self.pending = ('next', self.anchor)
+                continue
+
+            dml_predictions = self.client.dml_prediction(window, self.config)
+            step, origin = self.client._search_window(window, dml_predictions, catalog, self.verbose, self.config)
+            if step == 'skip':
+                self.starttime = starttime + timedelta(seconds=720)
+                continue
+            if step == 'next':
+                self.pending = ('next', self.anchor)
+                continue
+
+            if origin is not None:
+                self.associated_arids.update(origin['oct_arids'])
+                origin['Window_start'] = window_start
+                origin['Window_end'] = window_end
+                found.append(origin)
+            self.pending = ('jump', max(starttime + timedelta(minutes=12), self.anchor))
+
+        self._evict()
+        return found
+
+    # Add a batch of arrivals; returns the origins confirmed by it
+    def feed(self, batch):
+        self._append(batch)
+        return self._process()
+
+    # End of the feed: search the remaining windows
+    def flush(self):
+        return self._process(final=True)
+
+    def stream(self, batches):
+        for batch in batches:
+            for origin in self.feed(batch):
+                yield origin
+        for origin in self.flush():
+            yield origin
+
+    # Same as stream for an async iterable (or a plain iterable) of batches. The
+    # endpoint calls run in the default executor so the event loop isn't blocked.
+    async def astream(self, batches):
+        loop = asyncio.get_running_loop()
+        if hasattr(batches, '__aiter__'):
+            async for batch in batches:
+                for origin in await loop.run_in_executor(None, self.feed, batch):
+                    yield origin
+        else:
+            for batch in batches:
+                for origin in await loop.run_in_executor(None, self.feed, batch):
+                    yield origin
+        for origin in await loop.run_in_executor(None, self.flush):
+            yield origin
@@ -0,0 +1,282 @@
+import hashlib
+import json
+import os
+import re
+import numpy as np
+from . import util
+
+# Local lookup tables for the taup and baz surrogates. Within a deployment the
+# models behind them are fixed, so their outputs are sampled once per server
+# version on a grid over the source-station geometry and later queries are
+# answered by interpolating in the grid instead of over HTTP.
+#
+# A surrogate input row is taken to be six scaled geocentric coordinates, the
+# station's then the source's. The grid is over
+#   distance  - great-circle distance from station to source, degrees
+#   depth     - source depth below the ellipsoid, km
+#   azimuth   - direction from the station to the source, degrees from north
+#   elevation - station height above the ellipsoid, km
+# with distance and azimuth taken on the sphere between geodetic latitudes and
+# longitudes, as seismological distances usually are. This assumes the models
+# depend on where the pair is only through these (no lateral variation); each
+# table is checked against the server on random geometries when it's built,
+# see SurrogateTable.build.
+
+station_columns = [0, 1, 2]
+source_columns = [3, 4, 5]
+
+# (start, stop, step) of each axis per endpoint: travel time varies with
+# distance and depth, back-azimuth mostly with azimuth
+grids = {
+    "taup_surrogate": {"distance": (0.0, 180.0, 0.5), "depth": (0.0, 700.0, 10.0), "azimuth": (0.0, 360.0, 45.0),
+                       "elevation": (-1.0, 5.0, 3.0)},
+    "baz_surrogate": {"distance": (0.0, 180.0, 5.0), "depth": (0.0, 700.0, 100.0), "azimuth": (0.0, 360.0, 1.0),
+                      "elevation": (-1.0, 5.0, 3.0)},
+}
+axis_names = ("distance", "depth", "azimuth", "elevation")
+
+# A cell's error is only measured at its centre, which underestimates it next
+# to singularities (back-azimuth at 0 and 180 degrees), so lookups use cells
+# whose error there is within this share of the tolerance
+cell_margin = 0.5
+
+
+def _lonlat(rows, columns):
+    lon, lat, elev = util.geocentric_to_lonlat(*util.unscale_geocentric(*rows[:, columns].T))
+    return np.radians(lon), np.radians(lat), elev
+
+
+def _rows(station, source):
+    rows = np.empty((len(station[0]), 6))
+    for columns, (lon, lat, elev) in ((station_columns, station), (source_columns, source)):
+        xyz = util.lonlat_to_geocentric(np.degrees(lon), np.degrees(lat), elev)
+        rows[:, columns] = np.stack(util.scale_geocentric(*xyz), axis=1)
+    return rows
+
+
+# (distance, depth, azimuth, elevation) of surrogate input rows
+def geometry(rows):
+    rows = np.asarray(rows, dtype=np.float64)
+    s_lon, s_lat, s_elev = _lonlat(rows, station_columns)
+    q_lon, q_lat, q_elev = _lonlat(rows, source_columns)
+    d_lon = q_lon - s_lon
+    cos_d = np.sin(s_lat) * np.sin(q_lat) + np.cos(s_lat) * np.cos(q_lat) * np.cos(d_lon)
+    distance = np.degrees(np.arccos(np.clip(cos_d, -1, 1)))
+    azimuth = np.degrees(np.arctan2(np.sin(d_lon) * np.cos(q_lat),
+                                    np.cos(s_lat) * np.sin(q_lat) - np.sin(s_lat) * np.cos(q_lat) * np.cos(d_lon))) % 360
+    return distance, -q_elev / 1000, azimuth, s_elev / 1000
+
+
+# Input rows for a station at (lat, lon) and sources at the given distances,
+# depths and azimuths from it (all arrays, degrees and km)
+def place(lat, lon, distance, depth, azimuth, elevation):
+    lat, lon, d, a = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat, lon, distance, azimuth))
+    q_lat = np.arcsin(np.sin(lat) * np.cos(d) + np.cos(lat) * np.sin(d) * np.cos(a))
+    q_lon = lon + np.arctan2(np.sin(a) * np.sin(d) * np.cos(lat), np.cos(d) - np.sin(lat) * np.sin(q_lat))
+    return _rows((lon, lat, np.asarray(elevation) * 1000.0), (q_lon, q_lat, -np.asarray(depth) * 1000.0))
+
+
+# Input rows for a station on the equator at longitude 0
+def canonical_rows(distance, depth, azimuth, elevation):
+    zeros = np.zeros(len(distance))
+    return place(zeros, zeros, distance, depth, azimuth, elevation)
+
+
+def _axis(start, stop, step):
+    return np.linspace(start, stop, int(round((stop - start) / step)) + 1)
+
+
+def _mesh(*axes):
+    return [m.ravel() for m in np.meshgrid(*axes, indexing="ij")]
+
+
+# Multilinear interpolation of values (one axis per grid axis, then outputs)
+# at fractional grid positions; returns (n, outputs)
+def _interpolate(values, position):
+    lower = [np.clip(np.floor(p).astype(np.int64), 0, n - 2) for p, n in zip(position, values.shape)]
+    frac = [p - lo for p, lo in zip(position, lower)]
+    out = np.zeros((len(position[0]), values.shape[-1]))
+    for corner in range(2 ** len(position)):
+        bits = [(corner >> i) & 1 for i in range(len(position))]
+        weight = np.ones(len(position[0]))
+        for f, bit in zip(frac, bits):
+            weight *= f if bit else 1 - f
+        out += weight[:, None] * values[tuple(lo + bit for lo, bit in zip(lower, bits))]
+    return out
+
+
+class SurrogateTable:
+    # values holds the surrogate's outputs at every grid node; error holds, per
+    # grid cell, how far interpolation was from the server at the cell's centre,
+    # so lookups in cells worse than the tolerance go to the server instead.
+    # validation holds, for random geometries compared with the server when the
+    # table was built, the error of the cell each fell in and how far the
+    # table's answer was from the server's (see validation_error).
+    def __init__(self, endpoint, version, grid, values, error, validation=None):
+        self.endpoint = endpoint
+        self.version = version
+        self.grid = {name: tuple(grid[name]) for name in axis_names}
+        self.axes = [_axis(*self.grid[name]) for name in axis_names]
+        self.values = values
+        self.error = error
+        self.validation = validation
+        # rows answered locally / sent to the server
+        self.local = 0
+        self.remote = 0
+        # set when loaded from files
+        self.path = None
+
+    # a table loaded from files goes to worker processes as its path and is
+    # mapped again there, so they share the pages instead of copies
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if self.path is not None:
+            state["values"] = state["error"] = state["validation"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.path is not None:
+            self.values, self.error, self.validation = _load_arrays(self.path)
+
+    # Samples endpoint on the grid nodes and cell centres with
+    # client.<endpoint>_batch, then compares the table with the server on
+    # `validate` random geometries
+    @classmethod
+    def build(cls, client, endpoint, grid=None, validate=2000, version=None, seed=0):
+        grid = grid or grids[endpoint]
+        batch = getattr(client, endpoint + "_batch")
+        axes = [_axis(*grid[name]) for name in axis_names]
+        values = batch(canonical_rows(*_mesh(*axes)))
+        values = values.reshape(tuple(len(a) for a in axes) + (-1,))
+
+        centres = [(a[:-1] + a[1:]) / 2 for a in axes]
+        at_centres = batch(canonical_rows(*_mesh(*centres)))
+        table = cls(endpoint, version, grid, values, np.zeros(tuple(len(c) for c in centres)))
+        position = table._positions(_mesh(*centres))[1]
+        difference = _interpolate(values, position) - at_centres.reshape(len(at_centres), -1)
+        table.error = np.abs(difference).max(axis=1).reshape(table.error.shape)
+
+        if validate:
+            rows = random_rows(validate, grid, seed)
+            inside, position = table._positions(geometry(rows))
+            difference = _interpolate(values, position) - batch(rows).reshape(len(rows), -1)
+            table.validation = np.stack([np.where(inside, table._cell_error(position), np.inf),
+                                         np.abs(difference).max(axis=1)], axis=1)
+        return table
+
+    # The largest difference from the server seen on the validation
+    # geometries the table answers at this tolerance (None if not validated)
+    def validation_error(self, tolerance):
+        if self.validation is None:
+            return None
+        answered = self.validation[:, 0] <= tolerance * cell_margin
+        return float(self.validation[answered, 1].max()) if answered.any() else 0.0
+
+    def _positions(self, coordinates):
+        position, ok = [], np.ones(len(coordinates[0]), dtype=bool)
+        for value, axis in zip(coordinates, self.axes):
+            p = (value - axis[0]) / (axis[1] - axis[0])
+            # a hair outside (rounding at the surface or at 180 degrees) counts as on the edge
+            ok &= (p >= -1e-6) & (p <= len(axis) - 1 + 1e-6)
+            position.append(np.clip(np.nan_to_num(p), 0, len(axis) - 1))
+        return ok, position
+
+    def _cell_error(self, position):
+        return self.error[tuple(np.minimum(p.astype(np.int64), len(a) - 2) for p, a in zip(position, self.axes))]
+
+    # Interpolated outputs for input rows, with a mask of the rows answered:
+    # inside the grid and in a cell whose error is within tolerance (see
+    # cell_margin). Other rows are left at NaN for the caller to send to the
+    # server.
+    def lookup(self, rows, tolerance=1e-3):
+        rows = np.asarray(rows, dtype=np.float64)
+        if rows.ndim != 2 or rows.shape[1] != 6:
+            self.remote += len(rows)
+            return np.full((len(rows), self.values.shape[-1]), np.nan), np.zeros(len(rows), dtype=bool)
+        ok, position = self._positions(geometry(rows))
+        ok &= self._cell_error(position) <= tolerance * cell_margin
+        out = np.full((len(ok), self.values.shape[-1]), np.nan)
+        if ok.any():
+            out[ok] = _interpolate(self.values, [p[ok] for p in position])
+        self.local += int(ok.sum())
+        self.remote += int((~ok).sum())
+        return out, ok
+
+    def name(self):
+        key = hashlib.sha1(json.dumps(self.grid, sort_keys=True).encode()).hexdigest()[:10]
+        return "%s-%s-%s" % (self.endpoint, re.sub(r"[^A-Za-z0-9_.-]", "_", str(self.version)), key)
+
+    # The arrays go in .npy files so they can be memory-mapped; they are
+    # written under a temporary name and renamed, so processes building the
+    # same table at once don't read half-written files. The .json file goes
+    # last and marks the table as complete.
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, self.name())
+        arrays = {"values": self.values, "error": self.error,
+                  "validation": self.validation if self.validation is not None else np.zeros((0, 2))}
+        for name, array in arrays.items():
+            tmp = "%s.%s.npy.%d.tmp" % (base, name, os.getpid())
+            with open(tmp, "wb") as f:
+                np.save(f, np.ascontiguousarray(array))
+            os.replace(tmp, "%s.%s.npy" % (base, name))
+        tmp = "%s.json.%d.tmp" % (base, os.getpid())
+        with open(tmp, "w") as f:
+            json.dump({"endpoint": self.endpoint, "version": self.version, "grid": self.grid}, f)
+        os.replace(tmp, base + ".json")
+        return base
+
+    # Memory-mapped, so processes using the same table share its pages
+    @classmethod
+    def load(cls, base):
+        with open(base + ".json") as f:
+            meta = json.load(f)
+        table = cls(meta["endpoint"], meta["version"], meta["grid"], *_load_arrays(base))
+        table.path = base
+        return table
+
+
+def _load_arrays(base):
+    values, error, validation = (np.load("%s.%s.npy" % (base, name), mmap_mode="r")
+                                 for name in ("values", "error", "validation"))
+    return values, error, validation if len(validation) else None
+
+
+# Random surrogate inputs with stations anywhere on the surface (0-3 km up) and
+# sources inside the grid's distance and depth range
+def random_rows(n, grid=None, seed=0):
+    grid = grid or grids["taup_surrogate"]
+    rng = np.random.default_rng(seed)
+    lat = np.degrees(np.arcsin(rng.uniform(-1, 1, n)))
+    lon = rng.uniform(-180, 180, n)
+    return place(lat, lon, rng.uniform(*grid["distance"][:2], n), rng.uniform(*grid["depth"][:2], n),
+                 rng.uniform(0, 360, n), rng.uniform(0, 3, n))
+
+
+# The table for endpoint at the server's current version: loaded from
+# directory if it was built before, otherwise built (and saved there)
+def load_or_build(client, endpoint, directory=None, grid=None, validate=2000):
+    version = client.version()
+    grid = grid or grids[endpoint]
+    if directory is not None:
+        base = os.path.join(directory, SurrogateTable(endpoint, version, grid, None, None).name())
+        if os.path.exists(base + ".json"):
+            return SurrogateTable.load(base)
+    table = SurrogateTable.build(client, endpoint, grid, validate, version)
+    if directory is not None:
+        table.save(directory)
+    return table
+
+
+# lookup's outputs with the rows it couldn't answer filled in from missing,
+# the server's outputs for rows[~ok]
+def fill(table, out, ok, missing):
+    if missing is None:
+        return None
+    missing = missing.reshape(int((~ok).sum()), -1)
+    if out.shape[1] != missing.shape[1]:
+        raise ValueError("%s table has %d outputs per row, the server %d" % (table.endpoint, out.shape[1],
+                                                                               missing.shape[1]))
+    out[~ok] = missing
+    return out
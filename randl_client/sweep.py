@@ -0,0 +1,212 @@
+import asyncio
+import copy
+import inspect
+import itertools
+import threading
+import time
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor
+import pandas as pd
+from .errors import RandlError
+from .dml_batch import DMLBatcher
+from .bulletin_session import BulletinHandle, bulletin_hash
+
+
+class StageCache:
+    # Shares window and DML results between the clients of a sweep. A result is
+    # keyed by the endpoint, the request's scalar settings and frame_key, which
+    # stands in for the request's frames (the bulletin's content hash for
+    # /window, see bulletin_key; the window's ARIDs for DML). The first client to ask computes it; clients
+    # asking for the same key meanwhile wait for that result instead of
+    # repeating the request. Results are shared, so callers must not modify them.
+    def __init__(self):
+        self.results = {}
+        self.lock = threading.Lock()
+        self.computed = {}
+        self.reused = {}
+        # id(bulletin) -> (weak reference, content hash)
+        self.hashes = {}
+
+    # Content hash of a bulletin (the handle's id for an uploaded one), hashed
+    # once per frame object. The weak reference makes sure a frame that got a
+    # freed frame's id isn't taken for it. Frames mustn't be changed in place
+    # once they've been used.
+    def bulletin_key(self, bulletin):
+        if isinstance(bulletin, BulletinHandle):
+            return bulletin.handle
+        with self.lock:
+            entry = self.hashes.get(id(bulletin))
+            if entry is not None and entry[0]() is bulletin:
+                return entry[1]
+        key = bulletin_hash(bulletin)
+        with self.lock:
+            self.hashes[id(bulletin)] = (weakref.ref(bulletin), key)
+        return key
+
+    def key(self, endpoint, req, frame_key):
+        settings = tuple(sorted((k, repr(v)) for k, v in req.items() if not isinstance(v, pd.DataFrame)))
+        return endpoint, settings, frame_key
+
+    # The key's future and whether the caller is the one to compute it; called
+    # with the lock held
+    def _claim(self, endpoint, key):
+        future = self.results.get(key)
+        if future is None:
+            future = self.results[key] = Future()
+            self.computed[endpoint] = self.computed.get(endpoint, 0) + 1
+            return future, True
+        self.reused[endpoint] = self.reused.get(endpoint, 0) + 1
+        return future, False
+
+    # waiting clients get the error; later ones try again
+    def _fail(self, keys, futures, error):
+        with self.lock:
+            for key, future in zip(keys, futures):
+                if not future.done():
+                    del self.results[key]
+        for future in futures:
+            if not future.done():
+                future.set_exception(error)
+
+    def get(self, endpoint, req, frame_key, compute):
+        key = self.key(endpoint, req, frame_key)
+        with self.lock:
+            future, owner = self._claim(endpoint, key)
+        if owner:
+            try:
+                future.set_result(compute())
+            except BaseException as e:
+                self._fail([key], [future], e)
+        return future.result()
+
+    # get for AsyncRandl: compute is a coroutine function, and waiting for a
+    # result another client is computing doesn't block the event loop
+    async def aget(self, endpoint, req, frame_key, compute):
+        key = self.key(endpoint, req, frame_key)
+        with self.lock:
+            future, owner = self._claim(endpoint, key)
+        if owner:
+            try:
+                future.set_result(await compute())
+            except BaseException as e:
+                self._fail([key], [future], e)
+        return await asyncio.wrap_future(future)
+
+    def _claim_many(self, endpoint, req, frame_keys):
+        keys = [self.key(endpoint, req, k) for k in frame_keys]
+        with self.lock:
+            claims = [self._claim(endpoint, key) for key in keys]
+        return keys, [future for future, _ in claims], [i for i, (_, owner) in enumerate(claims) if owner]
+
+    # get for several frame keys of one request, e.g. a batch of DML windows.
+    # compute gets the positions of the keys no other client has computed or is
+    # computing, and returns their results in that order.
+    def get_many(self, endpoint, req, frame_keys, compute):
+        keys, futures, owned = self._claim_many(endpoint, req, frame_keys)
+        if owned:
+            try:
+                for i, result in zip(owned, compute(owned)):
+                    futures[i].set_result(result)
+            except BaseException as e:
+                self._fail([keys[i] for i in owned], [futures[i] for i in owned], e)
+        return [f.result() for f in futures]
+
+    async def aget_many(self, endpoint, req, frame_keys, compute):
+        keys, futures, owned = self._claim_many(endpoint, req, frame_keys)
+        if owned:
+            try:
+                for i, result in zip(owned, await compute(owned)):
+                    futures[i].set_result(result)
+            except BaseException as e:
+                self._fail([keys[i] for i in owned], [futures[i] for i in owned], e)
+        return [await asyncio.wrap_future(f) for f in futures]
+
+    def stats(self):
+        with self.lock:
+            endpoints = sorted(set(self.computed) | set(self.reused))
+            return pd.DataFrame({"computed": [self.computed.get(e, 0) for e in endpoints],
+                                 "reused": [self.reused.get(e, 0) for e in endpoints]}, index=endpoints)
+
+
+# A grid is either {name: [values]}, swept over every combination, or a list of
+# {name: value} configurations
+def sweep_configurations(grid):
+    if isinstance(grid, dict):
+        names = list(grid)
+        return [dict(zip(names, values)) for values in itertools.product(*(grid[n] for n in names))]
+    return [dict(c) for c in grid]
+
+
+# Run associate_bulletin once per configuration, n_workers at a time. A name in
+# a configuration is either a setter without its "set_" prefix ("beamwidth",
+# "octree_loc_samples", ...) or an associate_bulletin argument ("travel_time",
+# "required_phases", ...). The runs share a StageCache, so a window or DML
+# prediction is requested once per distinct window/DML settings and window,
+# however many beamsearch/octree configurations use it. With batch_dml=True the
+# runs also share a DMLBatcher, so DML predictions for different windows asked
+# for at about the same time go out in one request.
+#
+# Returns one row per origin with the configuration's index ("config"), its
+# settings, n_origins, elapsed_s and error in front of the origin columns.
+# Configurations without origins (or that failed) get a single row with empty
+# origin columns.
+def sweep(client, bulletin, grid, n_workers=4, verbose=False, **kwargs):
+    configurations = sweep_configurations(grid)
+    association_args = set(inspect.signature(client.associate_bulletin).parameters) - {"bulletin"}
+    for config in configurations:
+        for name in config:
+            if name not in association_args and not callable(getattr(client, "set_" + name, None)):
+                raise ValueError("Unknown sweep parameter: " + name)
+    if kwargs.pop("use_session", False):
+        # each run would upload and release the same bulletin under the others
+        print("use_session isn't supported in sweeps, sending the bulletin")
+
+    # associate_bulletin sorts its bulletin in place, so each run gets its own
+    # copy, sorted once up front. The caller's frame is left alone.
+    bulletin = bulletin.sort_values(by=['TIME_ARRIV'])
+    cache = StageCache()
+    batcher = None
+    if kwargs.get("batch_dml"):
+        batcher = DMLBatcher(client, max_windows=n_workers * max(1, kwargs.get("pipeline_depth", 0)))
+
+    def run(config):
+        worker = copy.copy(client)
+        worker.stage_cache = cache
+        if batcher is not None:
+            worker.dml_batcher = batcher
+        run_kwargs = dict(kwargs, verbose=verbose, metrics_report=False)
+        for name, value in config.items():
+            if name in association_args:
+                run_kwargs[name] = value
+            else:
+                getattr(worker, "set_" + name)(value)
+        started = time.perf_counter()
+        try:
+            origins, error = worker.associate_bulletin(bulletin.copy(), **run_kwargs), None
+        except RandlError as e:
+            origins, error = None, str(e)
+        return origins, error, time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=n_workers) as pool:
+        results = list(pool.map(run, configurations))
+    elapsed = time.perf_counter() - started
+
+    rows = []
+    names = list(dict.fromkeys(name for config in configurations for name in config))
+    for i, (config, (origins, error, run_time)) in enumerate(zip(configurations, results)):
+        n = 0 if origins is None else len(origins)
+        if n == 0:
+            origins = pd.DataFrame(columns=[] if origins is None else origins.columns).reindex([0])
+        info = pd.DataFrame({"config": i, **{name: config.get(name) for name in names}, "n_origins": n,
+                             "elapsed_s": run_time, "error": error}, index=range(len(origins)))
+        rows.append(pd.concat([info, origins.reset_index(drop=True)], axis=1))
+    table = pd.concat(rows, ignore_index=True)
+
+    stats = cache.stats()
+    print(len(configurations), "configurations,", int(table.drop_duplicates("config").n_origins.sum()),
+          "origins in %.1f s." % elapsed, "Shared results computed/reused:",
+          ", ".join("%s %d/%d" % (e, r.computed, r.reused) for e, r in stats.iterrows()))
+    if batcher is not None:
+        print("DML predictions for", batcher.windows, "windows sent in", batcher.requests, "requests.")
+    return table
@@ -0,0 +1,212 @@
+import time
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+from .codec import JsonCodec
+from .errors import RandlHTTPError, RandlConnectionError, RandlTimeoutError, RandlDeadlineError, RandlCircuitOpenError
+from .resilience import RetryPolicy, CircuitBreaker, overload_statuses, retry_after_seconds
+from .metrics import CallRecord
+
+# (connect, read) timeouts in seconds; endpoints without an entry use "default"
+default_timeouts = {
+    "default": (10, 300),
+    "version": (10, 30),
+    "constants": (10, 30),
+    "create_bulletin": (10, 600),
+    "dml_flex_handler": (10, 900),
+    "dml_pwave_handler": (10, 900),
+    "beamsearch": (10, 900),
+    "octree_search": (10, 900),
+    "octree_bulletin_refinement": (10, 3600),
+}
+
+
+# Failures while connecting, before any of the request reached the server
+def _connect_failure(e):
+    if isinstance(e, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(e.args[0], "reason", None) if e.args else None
+    return isinstance(reason, (urllib3.exceptions.NewConnectionError, urllib3.exceptions.ConnectTimeoutError))
+
+
+class Transport:
+    def __init__(self, pool_connections=4, pool_maxsize=16, keep_alive=True, timeouts=None, codec=None, retry=None,
+                 breaker=None):
+        self.codec = codec if codec is not None else JsonCodec()
+        self.cache = None
+        self.retry = retry if retry is not None else RetryPolicy()
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        # a ServerPool spreads requests over several replicas (Randl.set_servers)
+        self.servers = None
+        # a Metrics object records every call (Randl.enable_metrics)
+        self.metrics = None
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.keep_alive = keep_alive
+        self.timeouts = dict(default_timeouts)
+        if timeouts is not None:
+            self.timeouts.update(timeouts)
+        self.session = self._create_session()
+
+    def _create_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers.update({"accept": "application/json", "Content-Type": "application/json"})
+        if not self.keep_alive:
+            session.headers["Connection"] = "close"
+        return session
+
+    def set_pool_size(self, pool_maxsize, pool_connections=None):
+        self.pool_maxsize = pool_maxsize
+        if pool_connections is not None:
+            self.pool_connections = pool_connections
+        self.session.close()
+        self.session = self._create_session()
+
+    def set_timeout(self, endpoint, timeout):
+        self.timeouts[endpoint] = timeout
+
+    def get_timeout(self, endpoint):
+        return self.timeouts.get(endpoint, self.timeouts["default"])
+
+    # Timeout for one attempt, shortened to what is left of the call's deadline
+    def attempt_timeout(self, endpoint, expires=None):
+        connect, read = self.get_timeout(endpoint)
+        if expires is None:
+            return connect, read
+        remaining = max(expires - time.monotonic(), 0.001)
+        return min(connect, remaining), min(read, remaining)
+
+    # parse, if given, turns the decoded response into the result (DataFrames
+    # etc.) and is timed as part of deserializing
+    def request(self, method, url, endpoint, req=None, api_key="", parse=None):
+        call = CallRecord(endpoint, method)
+        if self.metrics is None:
+            return self._request(method, url, endpoint, req, api_key, parse, call)
+        try:
+            return self._request(method, url, endpoint, req, api_key, parse, call)
+        except BaseException as e:
+            call.error = type(e).__name__
+            raise
+        finally:
+            self.metrics.record(call)
+
+    def _decode(self, content, content_type, parse, call):
+        t = time.perf_counter()
+        result = self.codec.decode(content, content_type)
+        if parse is not None:
+            result = parse(result)
+        call.deserialize = time.perf_counter() - t
+        return result
+
+    def _request(self, method, url, endpoint, req, api_key, parse, call):
+        headers = {"access_token": str(api_key)}
+        data = None
+        if req is not None:
+            t = time.perf_counter()
+            data, codec_headers = self.codec.encode(req)
+            call.serialize = time.perf_counter() - t
+            call.request_bytes = len(data)
+            headers.update(codec_headers)
+
+        key = None
+        if self.cache is not None and self.cache.caches(endpoint):
+            key = self.cache.key(endpoint, self.codec.name, data)
+            hit = self.cache.get(key)
+            if hit is not None:
+                call.cached = True
+                call.response_bytes = len(hit[0])
+                return self._decode(*hit, parse, call)
+
+        deadline = self.retry.get_deadline(endpoint)
+        expires = None if deadline is None else time.monotonic() + deadline
+        attempt = 0
+        probe = None
+        try:
+            while True:
+                probe = self._wait_for_breaker(endpoint, expires, attempt)
+                attempt += 1
+                call.attempts = attempt
+                error = None
+                # with a server pool each attempt goes to the server it picks, so
+                # a retry after a failure normally lands on another replica
+                server = None
+                if self.servers is not None:
+                    server = self.servers.acquire(self.session, {"access_token": str(api_key)})
+                call.server = server
+                t = time.perf_counter()
+                try:
+                    response = self.session.request(method, url if server is None else server + endpoint,
+                                                    headers=headers, data=data,
+                                                    timeout=self.attempt_timeout(endpoint, expires))
+                except requests.exceptions.Timeout as e:
+                    error = RandlTimeoutError(endpoint, e, attempt, sent=not _connect_failure(e))
+                except requests.exceptions.RequestException as e:
+                    error = RandlConnectionError(endpoint, e, attempt, sent=not _connect_failure(e))
+                except BaseException:
+                    self.release_server(server, None)
+                    raise
+                call.network += time.perf_counter() - t
+                self.release_server(server, error)
+                if error is None:
+                    call.response_bytes = len(response.content)
+                    if response.status_code == 200:
+                        self._record(True)
+                        content_type = response.headers.get("Content-Type")
+                        if key is not None:
+                            self.cache.put(key, response.content, content_type)
+                        return self._decode(response.content, content_type, parse, call)
+                    error = RandlHTTPError(endpoint, response.status_code, response.text, attempt,
+                                           retry_after_seconds(response.headers))
+
+                overloaded = not isinstance(error, RandlHTTPError) or error.status in overload_statuses
+                self._record(not overloaded)
+                if not self.retry.should_retry(endpoint, error, attempt):
+                    raise error
+                delay = self.retry.delay(attempt, getattr(error, "retry_after", None))
+                if expires is not None and time.monotonic() + delay >= expires:
+                    raise RandlDeadlineError(endpoint, deadline, attempt, error) from error
+                time.sleep(delay)
+        finally:
+            if self.breaker is not None:
+                self.breaker.end_probe(probe)
+
+    def release_server(self, server, error):
+        if server is None:
+            return
+        overloaded = error is not None and (not isinstance(error, RandlHTTPError) or error.status in overload_statuses)
+        # a read timeout means the server took the request and is slow (long
+        # octree searches), not that it's gone
+        down = isinstance(error, RandlConnectionError) and not (isinstance(error, RandlTimeoutError) and error.sent)
+        self.servers.release(server, ok=not overloaded, down=down)
+
+    def _record(self, ok):
+        if self.breaker is None:
+            return
+        if ok:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+
+    # Returns the probe's number if the request goes out as the breaker's probe
+    def _wait_for_breaker(self, endpoint, expires, attempts):
+        if self.breaker is None:
+            return None
+        wait, probe = self.breaker.admit()
+        while wait > 0:
+            if expires is not None and time.monotonic() + wait >= expires:
+                raise RandlCircuitOpenError(endpoint, wait, attempts)
+            time.sleep(wait)
+            wait, probe = self.breaker.admit()
+        return probe
+
+    def post(self, url, endpoint, req, api_key="", parse=None):
+        return self.request("POST", url, endpoint, req, api_key, parse)
+
+    def get(self, url, endpoint, api_key="", parse=None):
+        return self.request("GET", url, endpoint, None, api_key, parse)
+
+    def close(self):
+        self.session.close()
@@ -1,15 +1,19 @@
 import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
-#import pyproj
-from sklearn.preprocessing import MinMaxScaler
 from . import constant_vars
 
-transformer_to_geocent = pyproj.Transformer.from_crs({"proj": 'latlong', "ellps": 'WGS84', "datum": 'WGS84'},{"proj": 'geocent', "ellps": 'WGS84', "datum": 'WGS84'},)
-Geocentric_min_max_scaler = MinMaxScaler(feature_range=(-1,1))
-Geocentric_min_max_scaler.fit_transform([[constant_vars.earth_radius*1000*-1], [constant_vars.earth_radius*1000]])
-Time_min_max_scaler = MinMaxScaler(feature_range=(-1,1))
-Time_min_max_scaler.fit_transform([[-15*60], [15*60]])
+# WGS84 ellipsoid
+wgs84_a = 6378137.0
+wgs84_f = 1 / 298.257223563
+wgs84_b = wgs84_a * (1 - wgs84_f)
+wgs84_e2 = wgs84_f * (2 - wgs84_f)
+wgs84_ep2 = wgs84_e2 / (1 - wgs84_e2)
+
+# Scaling ranges used by the RaNDL models, mapped affinely onto [-1, 1]
+geocentric_range = (constant_vars.earth_radius*1000*-1, constant_vars.earth_radius*1000)
+time_range = (-15*60, 15*60)
+
 
 def load_pyproj_transformer():
     try:
@@ -33,39 +37,78 @@ def load_geocentric_min_max_scaler(v_min=constant_vars.earth_radius*1000*-1, v_m
     return geocentric_min_max_scaler
 
 
-# Function to convert lat/lon to geocentric coordinates
-def lonlat_to_geocentric(lon, lat, elev=0, transformer=transformer_to_geocent):
-    X, Y, Z = transformer.transform(lon, lat, elev)
-    return X, Y, Z
-
-
-# Function to convert lat/lon to geocentric coordinates
-def geocentric_to_lonlat(x, y, z, transformer=transformer_to_geocent):
-    lon, lat, elev = transformer.transform(x, y, z, direction="INVERSE")
-    return lon, lat, elev
-
+# Scalars in give floats back, arrays in give arrays back
+def _as_output(values, *inputs):
+    if all(np.ndim(v) == 0 for v in inputs):
+        return tuple(float(v) for v in values) if isinstance(values, tuple) else float(values)
+    return values
 
-def scale_time(time, scaler=Time_min_max_scaler):
-    scaled_time = scaler.transform([[time]])[0][0]
-    return scaled_time
 
+def _scale(v, v_range):
+    v_min, v_max = v_range
+    return (2.0 * np.asarray(v, dtype=np.float64) - (v_max + v_min)) / (v_max - v_min)
 
-def scale_geocentric(x, y, z, scaler=Geocentric_min_max_scaler):
-    x = Geocentric_min_max_scaler.transform([[x]])[0][0]
-    y = Geocentric_min_max_scaler.transform([[y]])[0][0]
-    z = Geocentric_min_max_scaler.transform([[z]])[0][0]
-    return x, y, z
 
+def _unscale(v, v_range):
+    v_min, v_max = v_range
+    return (np.asarray(v, dtype=np.float64) * (v_max - v_min) + (v_max + v_min)) / 2.0
 
-def unscale_time(time, scaler=Time_min_max_scaler):
-    scaled_time = scaler.inverse_transform([[time]])[0][0]
-    return scaled_time
 
-def unscale_geocentric(x, y, z, scaler=Geocentric_min_max_scaler):
-    x = Geocentric_min_max_scaler.inverse_transform([[x]])[0][0]
-    y = Geocentric_min_max_scaler.inverse_transform([[y]])[0][0]
-    z = Geocentric_min_max_scaler.inverse_transform([[z]])[0][0]
-    return x, y, z
+# Function to convert lat/lon to geocentric coordinates
+def lonlat_to_geocentric(lon, lat, elev=0, transformer=None):
+    if transformer is not None:
+        return transformer.transform(lon, lat, elev)
+    lam = np.radians(np.asarray(lon, dtype=np.float64))
+    phi = np.radians(np.asarray(lat, dtype=np.float64))
+    h = np.asarray(elev, dtype=np.float64)
+    sin_phi = np.sin(phi)
+    cos_phi = np.cos(phi)
+    n = wgs84_a / np.sqrt(1 - wgs84_e2 * sin_phi**2)
+    x = (n + h) * cos_phi * np.cos(lam)
+    y = (n + h) * cos_phi * np.sin(lam)
+    z = (n * (1 - wgs84_e2) + h) * sin_phi
+    return _as_output((x, y, z), lon, lat, elev)
+
+
+# Function to convert geocentric coordinates to lat/lon (Bowring's method)
+def geocentric_to_lonlat(x, y, z, transformer=None):
+    if transformer is not None:
+        return transformer.transform(x, y, z, direction="INVERSE")
+    xa = np.asarray(x, dtype=np.float64)
+    ya = np.asarray(y, dtype=np.float64)
+    za = np.asarray(z, dtype=np.float64)
+    p = np.hypot(xa, ya)
+    theta = np.arctan2(za * wgs84_a, p * wgs84_b)
+    phi = np.arctan2(za + wgs84_ep2 * wgs84_b * np.sin(theta)**3,
+                     p - wgs84_e2 * wgs84_a * np.cos(theta)**3)
+    sin_phi = np.sin(phi)
+    elev = p * np.cos(phi) + za * sin_phi - wgs84_a * np.sqrt(1 - wgs84_e2 * sin_phi**2)
+    lon = np.degrees(np.arctan2(ya, xa))
+    lat = np.degrees(phi)
+    return _as_output((lon, lat, elev), x, y, z)
+
+
+def scale_time(time, scaler=None):
+    if scaler is not None:
+        return scaler.transform([[time]])[0][0]
+    return _as_output(_scale(time, time_range), time)
+
+
+def scale_geocentric(x, y, z, scaler=None):
+    if scaler is not None:
+        return tuple(scaler.transform([[v]])[0][0] for v in (x, y, z))
+    return _as_output((_scale(x, geocentric_range), _scale(y, geocentric_range), _scale(z, geocentric_range)), x, y, z)
+
+
+def unscale_time(time, scaler=None):
+    if scaler is not None:
+        return scaler.inverse_transform([[time]])[0][0]
+    return _as_output(_unscale(time, time_range), time)
+
+def unscale_geocentric(x, y, z, scaler=None):
+    if scaler is not None:
+        return tuple(scaler.inverse_transform([[v]])[0][0] for v in (x, y, z))
+    return _as_output((_unscale(x, geocentric_range), _unscale(y, geocentric_range), _unscale(z, geocentric_range)), x, y, z)
 
 def constants():
-    return {"Earth radius": constant_vars.earth_radius}
\ No newline at end of file
+    return {"Earth radius": constant_vars.earth_radius}
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+from .compact import parse_times
+
+
+# Sorted unique arrival times of a bulletin as datetime64, the start times
+# associate_bulletin steps through
+def arrival_start_times(bulletin):
+    times = parse_times(bulletin['TIME_ARRIV']).to_numpy(dtype='datetime64[ns]')
+    # hash-based unique then sort; much faster than np.unique on datetime64
+    return np.sort(pd.unique(times))
+
+
+# Index of the first start time at or after starttime, never moving back from
+# start_index and stopping at the last start time
+def next_start_index(start_times, start_index, starttime):
+    j = np.searchsorted(start_times, pd.Timestamp(starttime).to_datetime64(), side='left')
+    return max(start_index, min(int(j), len(start_times) - 1))
+
+
+class WindowIndex:
+    # Time-sorted index over a bulletin's TIME_ARRIV, parsed to datetime64 once.
+    # Windows are taken with a binary search and returned as positional slices
+    # of the sorted bulletin, mirroring the /window endpoint:
+    #   - arrivals with start_time <= TIME_ARRIV <= start_time + window_length
+    #   - optionally without arrivals whose ARID is already associated
+    #   - an empty frame if fewer than min_phases_needed arrivals remain
+    # Rows come back in time order, which matches the server for a bulletin
+    # already sorted by TIME_ARRIV (as associate_bulletin does).
+    def __init__(self, bulletin):
+        times = parse_times(bulletin['TIME_ARRIV']).to_numpy(dtype='datetime64[ns]')
+        order = np.argsort(times, kind='stable')
+        if np.any(order != np.arange(len(order))):
+            bulletin = bulletin.iloc[order]
+            times = times[order]
+        self.bulletin = bulletin
+        self.times = times
+
+    def __len__(self):
+        return len(self.bulletin)
+
+    def bounds(self, start_time, window_length):
+        start = np.datetime64(pd.Timestamp(start_time), 'ns')
+        end = start + np.timedelta64(int(float(window_length) * 1e9), 'ns')
+        lo = np.searchsorted(self.times, start, side='left')
+        hi = np.searchsorted(self.times, end, side='right')
+        return lo, hi
+
+    def window(self, start_time, window_length, min_phases_needed=0, exclude_associated_phases=False,
+               associated_arids=None):
+        lo, hi = self.bounds(start_time, window_length)
+        window = self.bulletin.iloc[lo:hi]
+        if exclude_associated_phases and associated_arids is not None and len(associated_arids) > 0:
+            window = window[~window['ARID'].isin(associated_arids)]
+        if len(window) < int(min_phases_needed):
+            return window.iloc[0:0]
+        return window
@@ -0,0 +1,17 @@
+import os
+import sys
+import pytest
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+sys.path.insert(0, os.path.join(root, "benchmarks"))
+
+
+# A mock RaNDL server (benchmarks/mock_server.py) for the module's tests
+@pytest.fixture(scope="module")
+def mock_url():
+    import mock_server
+    process, url = mock_server.start()
+    yield url
+    process.terminate()
+    process.wait()
@@ -0,0 +1,85 @@
+import asyncio
+import pandas as pd
+import pytest
+from randl_client import Randl, AsyncRandl
+from randl_client.dml_batch import DMLBatcher
+from randl_client.sweep import StageCache
+
+pytest.importorskip("aiohttp")
+
+
+@pytest.fixture(scope="module")
+def bulletin(mock_url):
+    client = Randl()
+    client.url_base = mock_url
+    client.set_bulletin_n_events(3)
+    return client.create_bulletin()
+
+
+def client_of(url):
+    client = Randl()
+    client.url_base = url
+    client.enable_metrics()
+    return client
+
+
+def run(arandl, coroutine):
+    async def go():
+        async with arandl:
+            return await coroutine
+    return asyncio.run(go())
+
+
+def calls(client, endpoint):
+    return int((client.transport.metrics.frame().endpoint == endpoint).sum())
+
+
+def windows(bulletin, sizes=(6, 9, 7, 8)):
+    starts = [sum(sizes[:i]) for i in range(len(sizes))]
+    return [bulletin.iloc[lo:lo + n].reset_index(drop=True) for lo, n in zip(starts, sizes)]
+
+
+# An AsyncRandl sharing a stage cache with a blocking client reuses the
+# window and predictions the blocking one has asked for, and the other way round
+def test_async_client_shares_the_stage_cache(mock_url, bulletin):
+    cache = StageCache()
+    sync, wrapped = client_of(mock_url), client_of(mock_url)
+    sync.stage_cache = wrapped.stage_cache = cache
+    arandl = AsyncRandl(wrapped)
+    start = pd.Timestamp(bulletin.TIME_ARRIV.min()).strftime('%Y-%m-%d %H:%M:%S.%f')
+    config = sync.config.override(window={"start": start})
+
+    window = sync.window_catalog(bulletin, config)
+    assert run(arandl, arandl.window_catalog(bulletin, config)) is window
+    ws = windows(bulletin)
+    first = sync.dml_prediction(ws[0])
+
+    async def predict():
+        return await asyncio.gather(arandl.dml_prediction(ws[0]), arandl.dml_prediction_batch(ws))
+    single, batch = run(arandl, predict())
+    assert single is first and batch[0] is first
+    assert all(sync.dml_prediction(w) is b for w, b in zip(ws, batch))
+    assert calls(wrapped, "window") == 0 and calls(wrapped, "dml_flex_handler") == 0
+    assert calls(wrapped, "dml_flex_handler_batch") == 1
+    assert calls(sync, "dml_flex_handler_batch") == 0
+    stats = cache.stats()
+    assert stats.loc["window"].tolist() == [1, 1]
+    assert stats.loc["dml_flex_handler"].tolist() == [len(ws), len(ws) + 2]
+
+
+# Concurrent async predictions are grouped into one batched request by the
+# wrapped client's DMLBatcher
+def test_async_predictions_go_through_the_batcher(mock_url, bulletin):
+    wrapped = client_of(mock_url)
+    wrapped.dml_batcher = DMLBatcher(wrapped, max_wait=0.5, max_windows=4)
+    arandl = AsyncRandl(wrapped)
+    ws = windows(bulletin)
+
+    async def predict():
+        return await asyncio.gather(*[arandl.dml_prediction(w) for w in ws])
+    batched = run(arandl, predict())
+    assert (wrapped.dml_batcher.requests, wrapped.dml_batcher.windows) == (1, len(ws))
+    assert calls(wrapped, "dml_flex_handler_batch") == 1 and calls(wrapped, "dml_flex_handler") == 0
+    single = client_of(mock_url)
+    for b, w in zip(batched, ws):
+        pd.testing.assert_frame_equal(b, single.dml_prediction(w))
@@ -0,0 +1,71 @@
+import socket
+import time
+from collections import Counter
+import mock_server
+from randl_client import Randl
+from randl_client.balancer import ServerPool
+
+
+def spread(pool, n, release=True):
+    picked = []
+    for _ in range(n):
+        url = pool.acquire()
+        picked.append(url)
+        if release:
+            pool.release(url)
+    return picked
+
+
+def test_round_robin_follows_weights():
+    pool = ServerPool(["http://a/", "http://b/", "http://c/"], "round_robin", weights=[2, 1, 1])
+    picked = spread(pool, 8)
+    assert Counter(picked) == {"http://a/": 4, "http://b/": 2, "http://c/": 2}
+    # smooth: the lighter servers get their turns in between
+    assert picked[:4] == ["http://a/", "http://b/", "http://c/", "http://a/"]
+
+
+def test_least_outstanding_prefers_idle_servers():
+    pool = ServerPool(["http://a/", "http://b/", "http://c/"])
+    assert spread(pool, 3, release=False) == ["http://a/", "http://b/", "http://c/"]
+    pool.release("http://b/")
+    assert pool.acquire() == "http://b/"
+    weighted = ServerPool(["http://a/", "http://b/"], weights=[2, 1])
+    assert Counter(spread(weighted, 6, release=False)) == {"http://a/": 4, "http://b/": 2}
+    assert weighted.stats()["http://a/"]["outstanding"] == 4
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# A replica that refuses connections is taken out after its first failure and
+# the request retried on the other; once it answers /version again after
+# health_interval it takes requests again
+def test_failover_from_a_dead_replica(mock_url):
+    port = free_port()
+    dead = "http://127.0.0.1:%d/randl/" % port
+    client = Randl()
+    client.set_backoff(0.01)
+    client.set_servers([dead, mock_url], "round_robin", health_interval=0.5)
+    for i in range(6):
+        assert client.taup_surrogate([[float(i)]]) == [[float(i)]]
+    stats = client.server_stats()
+    assert not stats[dead]["up"]
+    assert stats[dead]["requests"] == 1 and stats[dead]["failures"] == 1
+    assert stats[mock_url]["requests"] == 6
+
+    process, url = mock_server.start(port=port)
+    try:
+        assert url == dead
+        time.sleep(0.5)
+        for i in range(4):
+            assert client.taup_surrogate([[float(i)]]) == [[float(i)]]
+        stats = client.server_stats()
+        assert stats[dead]["up"]
+        assert stats[dead]["requests"] > 1
+        assert client.check_servers() == {dead: "mock-1", mock_url: "mock-1"}
+    finally:
+        process.terminate()
+        process.wait()
@@ -0,0 +1,86 @@
+import contextlib
+import io
+import pytest
+from randl_client import Randl, RandlError, RandlHTTPError
+
+
+# Request bytes per endpoint call of an associate_bulletin run on a bulletin of
+# n_events mock events (100 stations each)
+def request_bytes(url, n_events, use_session):
+    client = Randl()
+    client.url_base = url
+    client.enable_metrics()
+    client.set_bulletin_n_events(n_events)
+    bulletin = client.create_bulletin()
+    client.transport.metrics.reset()
+    with contextlib.redirect_stdout(io.StringIO()):
+        client.associate_bulletin(bulletin, use_session=use_session, verbose=False, metrics_report=False)
+    calls = client.transport.metrics.frame()
+    return len(bulletin), calls.groupby("endpoint").request_bytes.agg(list).to_dict()
+
+
+sizes = (1, 4, 16)
+
+
+@pytest.fixture(scope="module")
+def runs(mock_url):
+    return {(n, s): request_bytes(mock_url, n, s) for n in sizes for s in (False, True)}
+
+
+@pytest.mark.parametrize("endpoint", ["window", "octree_search"])
+def test_request_bytes_stay_flat_with_session(runs, endpoint):
+    sent = set()
+    for n in sizes:
+        arrivals, calls = runs[n, True]
+        assert len(calls["window"]) >= n
+        assert len(calls["bulletin_upload"]) == 1
+        sent.update(calls[endpoint])
+    # the same handle-only request whatever the bulletin's size
+    assert max(sent) < 1024
+    assert max(sent) - min(sent) < 64
+
+
+def test_window_bytes_grow_with_bulletin_without_session(runs):
+    (small, small_calls), (large, large_calls) = runs[sizes[0], False], runs[sizes[-1], False]
+    assert "bulletin_upload" not in large_calls
+    growth = max(large_calls["window"]) / max(small_calls["window"])
+    assert growth > 0.5 * large / small
+    # with a session the upload carries the bulletin once instead
+    assert max(large_calls["window"]) > 100 * max(runs[sizes[-1], True][1]["window"])
+
+
+class FailingSearch(Randl):
+    # keeps the handles it uploads; every octree search raises
+    def __init__(self, error):
+        Randl.__init__(self)
+        self.error = error
+        self.handles = []
+
+    def upload_bulletin(self, bulletin):
+        handle = Randl.upload_bulletin(self, bulletin)
+        self.handles.append(handle)
+        return handle
+
+    def octree_search(self, *args, **kwargs):
+        raise self.error
+
+
+# A run that fails or is interrupted still releases its session on the server
+@pytest.mark.parametrize("error", [KeyboardInterrupt(), RandlError("search failed")])
+@pytest.mark.parametrize("pipeline_depth", [0, 2])
+def test_failed_run_releases_session(mock_url, error, pipeline_depth):
+    client = FailingSearch(error)
+    client.url_base = mock_url
+    client.enable_metrics()
+    client.set_bulletin_n_events(2)
+    bulletin = client.create_bulletin()
+    with contextlib.redirect_stdout(io.StringIO()):
+        with pytest.raises(type(error)):
+            client.associate_bulletin(bulletin, use_session=True, verbose=False, metrics_report=False,
+                                      pipeline_depth=pipeline_depth)
+    calls = client.transport.metrics.frame()
+    assert list(calls.endpoint).count("bulletin_release") == 1
+    [handle] = client.handles
+    with pytest.raises(RandlHTTPError) as e:
+        client.window_catalog(handle)
+    assert e.value.status == 404
@@ -0,0 +1,70 @@
+import os
+import time
+from randl_client import Randl
+from randl_client.cache import ResultCache
+
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = ResultCache(max_entries=2)
+    cache.put("a", b"1", "application/json")
+    cache.put("b", b"2", None)
+    assert cache.get("a") == (b"1", "application/json")
+    cache.put("c", b"3", None)
+    assert cache.get("b") is None
+    assert cache.get("a") == (b"1", "application/json")
+    assert cache.get("c") == (b"3", None)
+    stats = cache.stats()
+    assert (stats["memory_hits"], stats["misses"], stats["entries"]) == (3, 1, 2)
+
+
+def test_disk_tier_round_trip_and_eviction(tmp_path):
+    cache = ResultCache(directory=str(tmp_path), max_disk_bytes=1 << 20)
+    key = cache.key("window", "json", b'{"start_time": "2024-05-01"}')
+    content = os.urandom(1000)
+    cache.put(key, content, "application/x-msgpack")
+
+    # a new cache over the same directory (another process, a later run)
+    reopened = ResultCache(directory=str(tmp_path))
+    assert reopened.disk_bytes == cache.disk_bytes > 0
+    assert reopened.get(key) == (content, "application/x-msgpack")
+    assert reopened.get(key) == (content, "application/x-msgpack")
+    assert (reopened.disk_hits, reopened.memory_hits) == (1, 1)
+
+    # over max_disk_bytes the least recently used files go first
+    small = ResultCache(max_entries=1, directory=str(tmp_path / "small"), max_disk_bytes=2500)
+    for k in ("a", "b"):
+        small.put(k, os.urandom(1000), None)
+        time.sleep(0.01)
+    small.get("a")
+    small.put("c", os.urandom(1000), None)
+    assert sorted(f[0] for f in os.listdir(tmp_path / "small")) == ["a", "c"]
+    assert small.disk_bytes <= 2500
+
+
+def test_keys_depend_on_version_endpoint_and_body():
+    cache = ResultCache(version="1")
+    key = cache.key("window", "json", b"{}")
+    assert key == ResultCache(version="1").key("window", "json", b"{}")
+    assert key != ResultCache(version="2").key("window", "json", b"{}")
+    assert key != cache.key("window", "columnar", b"{}")
+    assert key != cache.key("window", "json", b"{ }")
+    assert cache.caches("window") and not cache.caches("octree_search")
+
+
+def test_client_serves_repeats_from_cache(mock_url, tmp_path):
+    client = Randl()
+    client.url_base = mock_url
+    client.enable_metrics()
+    client.enable_cache(directory=str(tmp_path))
+    assert client.taup_surrogate([[3.0, 4.0]]) == [[5.0]]
+    assert client.taup_surrogate([[3.0, 4.0]]) == [[5.0]]
+    assert client.taup_surrogate([[6.0, 8.0]]) == [[10.0]]
+    calls = client.transport.metrics.frame()
+    assert list(calls[calls.endpoint == "taup_surrogate"].cached) == [False, True, False]
+    assert client.cache_stats()["hits"] == 1
+
+    other = Randl()
+    other.url_base = mock_url
+    other.enable_cache(directory=str(tmp_path))
+    assert other.taup_surrogate([[3.0, 4.0]]) == [[5.0]]
+    assert other.cache_stats()["disk_hits"] == 1
@@ -0,0 +1,83 @@
+import contextlib
+import datetime
+import io
+import pandas as pd
+import pytest
+from randl_client import Randl
+from randl_client.checkpoint import save_checkpoint, load_checkpoint
+from randl_client.randl_client import origin_columns
+
+
+def origins_frame():
+    origins = {c: [1.5, 2.5] for c in origin_columns}
+    origins["Window_start"] = [datetime.datetime(2024, 5, 1, 0, 0, 1, 500000), datetime.datetime(2024, 5, 1, 1)]
+    origins["Window_end"] = [datetime.datetime(2024, 5, 1, 0, 30), datetime.datetime(2024, 5, 1, 1, 30)]
+    origins["Beam_time"] = ["2024-05-01 00:00:10", "2024-05-01 01:00:10"]
+    origins["Beam_arids"] = [[1, 2, 3], [7, 8]]
+    origins["oct_arids"] = [[1, 2], [7, 8, 9]]
+    return pd.DataFrame(origins, columns=origin_columns)
+
+
+def assert_round_trip(directory):
+    origins = origins_frame()
+    save_checkpoint(str(directory), pd.Timestamp("2024-05-01 01:12:00"), 42, [1, 2, 7, 8, 9], origins, {"k": 1})
+    state = load_checkpoint(str(directory))
+    pd.testing.assert_frame_equal(state["origins"], origins)
+    assert state["starttime"] == pd.Timestamp("2024-05-01 01:12:00")
+    assert (state["start_index"], state["associated_arids"], state["key"]) == (42, [1, 2, 7, 8, 9], {"k": 1})
+    return state
+
+
+def test_pickle_round_trip(tmp_path, monkeypatch):
+    def no_parquet(*args, **kwargs):
+        raise ImportError("no parquet engine")
+    monkeypatch.setattr(pd.DataFrame, "to_parquet", no_parquet)
+    assert assert_round_trip(tmp_path)["origins_format"] == "pickle"
+
+
+def test_parquet_round_trip(tmp_path):
+    pytest.importorskip("pyarrow")
+    assert assert_round_trip(tmp_path)["origins_format"] == "parquet"
+
+
+def test_no_checkpoint(tmp_path):
+    assert load_checkpoint(str(tmp_path)) is None
+
+
+class Interrupted(Randl):
+    # raises KeyboardInterrupt on the octree search after `after` of them
+    def __init__(self, after):
+        Randl.__init__(self)
+        self.after = after
+
+    def octree_search(self, *args, **kwargs):
+        if self.after == 0:
+            raise KeyboardInterrupt
+        self.after -= 1
+        return Randl.octree_search(self, *args, **kwargs)
+
+
+def associate(client, bulletin, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return client.associate_bulletin(bulletin.copy(), verbose=False, metrics_report=False, **kwargs)
+
+
+def test_resume_finds_the_uninterrupted_origins(mock_url, tmp_path):
+    client = Randl()
+    client.url_base = mock_url
+    client.set_bulletin_n_events(6)
+    bulletin = client.create_bulletin()
+    expected = associate(client, bulletin)
+    assert len(expected) > 3
+
+    interrupted = Interrupted(after=3)
+    interrupted.url_base = mock_url
+    with pytest.raises(KeyboardInterrupt):
+        associate(interrupted, bulletin, checkpoint=str(tmp_path), checkpoint_every=0)
+    saved = load_checkpoint(str(tmp_path))
+    assert len(saved["origins"]) == 3
+
+    resumed = associate(client, bulletin, resume_from=str(tmp_path))
+    pd.testing.assert_frame_equal(resumed, expected)
+    # a checkpoint of other settings isn't resumed
+    assert len(associate(client, bulletin, resume_from=str(tmp_path), required_phases=6)) == len(expected)
@@ -0,0 +1,58 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from randl_client import Randl
+from randl_client.codec import JsonCodec, read_frame, loads
+
+orjson = pytest.importorskip("orjson")
+
+
+# Frames as a server writes them (to_json), with the columns read_json infers
+# types for: numeric strings, integral floats, NaN, dates, lists
+def server_frames():
+    yield pd.DataFrame({"STA": ["ST001", "ST002", "ST003"], "TIME": ["2024-05-01 00:00:01.5", "2024-05-01 00:00:02",
+                                                                   "2024-05-01 00:00:03.25"],
+                        "LAT": [1.5, -2.25, 3.0], "ARID": [1, 2, 3], "DEPTH": [10.0, 20.0, 30.0],
+                        "CODE": ["7", "8", "9"], "SCORE": [0.5, np.nan, 0.25], "FLAG": [True, False, True],
+                        "oct_arids": [[1, 2], [3], []], "ORIG_TIME": ["2024-05-01 00:00:00"] * 3,
+                        "beam_time": ["2024-05-01 00:00:00", "2024-05-01 00:00:01", "2024-05-01 00:00:02"]})
+    yield pd.DataFrame({"LAT_ORIG": [10.0, 11.5], "LON_ORIG": [20.0, -21.5]}, index=[5, 9])
+    yield pd.DataFrame({"A": [], "B": []})
+
+
+@pytest.mark.parametrize("frame", list(server_frames()))
+def test_orjson_and_stdlib_read_the_same_frame(frame):
+    text = frame.to_json()
+    pd.testing.assert_frame_equal(read_frame(text, fast=True), read_frame(text, fast=False))
+
+
+def test_orjson_and_stdlib_encode_the_same_request():
+    frame = next(server_frames()).drop(columns="SCORE")
+    req = {"catalog": frame, "nested": {"frame": frame.head(1)}, "window_length": "1800", "n": np.int64(3),
+           "values": np.arange(3.0)}
+    fast, _ = JsonCodec(fast=True).encode(req)
+    slow, _ = JsonCodec(fast=False).encode(req)
+    assert json.loads(fast) == json.loads(slow)
+    assert JsonCodec(fast=True).decode(slow) == JsonCodec(fast=False).decode(fast)
+
+
+def test_nan_bodies_fall_back_to_the_json_module():
+    assert np.isnan(loads(b'{"score": NaN}')["score"])
+
+
+def test_client_frames_are_the_same_either_way(mock_url):
+    frames = {}
+    for fast in (True, False):
+        client = Randl()
+        client.url_base = mock_url
+        client.fast_json = fast
+        client.transport.codec = JsonCodec(fast)
+        client.set_bulletin_n_events(2)
+        bulletin = client.create_bulletin()
+        start = pd.Timestamp(bulletin.TIME_ARRIV.min()).strftime('%Y-%m-%d %H:%M:%S.%f')
+        window = client.window_catalog(bulletin, client.config.override(window={"start": start}))
+        frames[fast] = bulletin, window, client.dml_prediction(window)
+    for fast_frame, slow_frame in zip(frames[True], frames[False]):
+        assert len(fast_frame) > 0
+        pd.testing.assert_frame_equal(fast_frame, slow_frame)
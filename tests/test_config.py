@@ -0,0 +1,97 @@
+import pickle
+import pytest
+from randl_client import Randl, RandlConfig, BulletinConfig, WindowConfig, DMLConfig, BeamConfig, OctreeConfig
+from randl_client.config import legacy_attributes
+
+
+@pytest.mark.parametrize("stage, changes, error", [
+    (BeamConfig, {"width": "5"}, TypeError),
+    (BeamConfig, {"width": True}, TypeError),
+    (BeamConfig, {"width": 0}, ValueError),
+    (BulletinConfig, {"n_events": 1.0}, TypeError),
+    (BulletinConfig, {"n_events": 0}, ValueError),
+    (BulletinConfig, {"drop_fraction": 1.0}, ValueError),
+    (BulletinConfig, {"drop_fraction": -0.1}, ValueError),
+    (WindowConfig, {"length": -1}, ValueError),
+    (WindowConfig, {"min_phases": -1}, ValueError),
+    (WindowConfig, {"exclude_associated_phases": "False"}, TypeError),
+    (DMLConfig, {"models": "flex"}, TypeError),
+    (DMLConfig, {"models": ()}, ValueError),
+    (OctreeConfig, {"loc_spacing": "0.1"}, TypeError),
+    (OctreeConfig, {"loc_spacing": 0.0}, ValueError),
+    (OctreeConfig, {"prefilter_radius": -1.0}, ValueError),
+])
+def test_invalid_fields_raise(stage, changes, error):
+    with pytest.raises(error):
+        stage(**changes)
+    with pytest.raises(error):
+        stage().replace(**changes)
+
+
+def test_fields_are_normalized_and_frozen():
+    octree = OctreeConfig(loc_spacing=1, prefilter_margin=60)
+    assert octree.loc_spacing == 1.0 and type(octree.loc_spacing) is float
+    assert DMLConfig(models=["pwave"]).models == ("pwave",)
+    assert DMLConfig(models=["pwave"]).endpoint == "dml_pwave_handler"
+    with pytest.raises(AttributeError):
+        octree.loc_spacing = 2.0
+    with pytest.raises(TypeError):
+        RandlConfig().override(unknown={"x": 1})
+    with pytest.raises(TypeError):
+        RandlConfig(beam=WindowConfig())
+
+
+def test_override_leaves_the_original_alone():
+    config = RandlConfig()
+    changed = config.override(beam={"width": 7}, window=WindowConfig(length=900))
+    assert (changed.beam.width, changed.window.length) == (7, 900)
+    assert (config.beam.width, config.window.length) == (5, 1800)
+    assert changed.beam.fragment()["beam_width"] == "7"
+    assert pickle.loads(pickle.dumps(changed)) == changed
+
+
+def test_setters_raise_on_bad_input():
+    client = Randl()
+    before = client.config
+    bad = [("set_octree_loc_spacing", "0.5", TypeError), ("set_octree_loc_spacing", -0.5, ValueError),
+           ("set_beamwidth", 0, ValueError), ("set_bulletin_n_events", "3", TypeError),
+           ("set_window_exclude_associated_phases", 1, TypeError), ("set_dml_models", [], ValueError),
+           ("set_bulletin_start", "not a date", ValueError), ("set_window_start", None, TypeError),
+           ("set_octree_prefilter_margin", -1, ValueError)]
+    for setter, value, error in bad:
+        with pytest.raises(error):
+            getattr(client, setter)(value)
+    assert client.config is before
+
+    client.set_octree_loc_spacing(2)
+    client.set_bulletin_start("2024-05-01 2:30")
+    client.set_octree_prefilter_margin(margin=30, radius=5)
+    assert client.config.octree.loc_spacing == 2.0
+    assert client.config.bulletin.start == "2024-05-01T02:30:00"
+    assert (client.config.octree.prefilter_margin, client.config.octree.prefilter_radius) == (30.0, 5.0)
+
+
+# The old string attributes read back as they were stored before the config,
+# and assigning what was read leaves the config unchanged
+def test_legacy_attributes_round_trip():
+    client = Randl()
+    assert client.bulletin_n_stations == "100"
+    assert client.window_exclude_associated_phases == "False"
+    assert client.dml_models == ["flex"]
+    assert client.octree_prefilter is False
+    for name in legacy_attributes:
+        config = client.config
+        setattr(client, name, getattr(client, name))
+        assert client.config == config, name
+
+    client.beam_width = "30"
+    client.octree_loc_spacing = "0.5"
+    client.window_exclude_associated_phases = "True"
+    client.dml_sampling = ["random"]
+    assert client.config.beam.width == 30
+    assert client.config.octree.loc_spacing == 0.5
+    assert client.config.window.exclude_associated_phases is True
+    assert client.config.dml.sampling == ("random",)
+    assert (client.beam_width, client.octree_loc_spacing, client.dml_sampling) == ("30", "0.5", ["random"])
+    with pytest.raises(ValueError):
+        client.beam_width = "wide"
@@ -0,0 +1,64 @@
+import contextlib
+import io
+import pandas as pd
+import pytest
+import mock_server
+from randl_client import Randl
+from randl_client.batching import group_bounds
+
+
+@pytest.fixture(scope="module")
+def bulletin(mock_url):
+    client = Randl()
+    client.url_base = mock_url
+    client.set_bulletin_n_events(3)
+    return client.create_bulletin()
+
+
+# Windows of different sizes; the mock's predictions depend on the window's
+# size, so each window's frame is told apart from its neighbours'
+def windows(bulletin, sizes=(3, 5, 2, 7, 4, 1, 6)):
+    starts = [sum(sizes[:i]) for i in range(len(sizes))]
+    return [bulletin.iloc[lo:lo + n].reset_index(drop=True) for lo, n in zip(starts, sizes)]
+
+
+def client_of(url, max_rows):
+    client = Randl()
+    client.url_base = url
+    client.enable_metrics()
+    client.set_batch_max_rows(max_rows)
+    return client
+
+
+def requests(client, endpoint):
+    metrics = client.transport.metrics.frame()
+    return (metrics.endpoint == endpoint).sum()
+
+
+@pytest.mark.parametrize("max_rows", [8, 10, 1000])
+def test_batches_come_back_in_window_order(mock_url, bulletin, max_rows):
+    ws = windows(bulletin)
+    client = client_of(mock_url, max_rows)
+    batched = client.dml_prediction_batch(ws)
+    assert client.dml_batch_supported is True
+    assert requests(client, "dml_flex_handler_batch") == len(group_bounds([len(w) for w in ws], max_rows))
+    single = [client.dml_prediction(w) for w in ws]
+    assert len(batched) == len(ws)
+    for b, s in zip(batched, single):
+        pd.testing.assert_frame_equal(b, s)
+
+
+def test_servers_without_batches_get_one_request_per_window(bulletin):
+    process, url = mock_server.start(args=["--no-dml-batch"])
+    try:
+        ws = windows(bulletin)
+        client = client_of(url, 8)
+        with contextlib.redirect_stdout(io.StringIO()):
+            batched = client.dml_prediction_batch(ws)
+        assert client.dml_batch_supported is False
+        assert requests(client, "dml_flex_handler") == len(ws)
+        for b, w in zip(batched, ws):
+            pd.testing.assert_frame_equal(b, client.dml_prediction(w))
+    finally:
+        process.terminate()
+        process.wait()
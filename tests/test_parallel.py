@@ -0,0 +1,16 @@
+import pandas as pd
+from randl_client.parallel import partition_bulletin
+
+
+def test_partitions_of_mixed_precision_times():
+    bulletin = pd.DataFrame({"TIME_ARRIV": ["2024-05-01 00:00:30.500000", "2024-05-01 00:00:31",
+                                            "2024-05-01 02:00:00", "2024-05-01 01:00:00.250000"],
+                             "ARID": [1, 2, 3, 4]})
+    partitions = partition_bulletin(bulletin, 3600, 600)
+    assert [list(p[2].ARID) for p in partitions] == [[1, 2, 4], [3]]
+    assert partitions[0][0] == pd.Timestamp("2024-05-01 00:00:30")
+    assert partitions[1][1] == pd.Timestamp("2024-05-01 02:00:30")
+
+
+def test_empty_bulletin_has_no_partitions():
+    assert partition_bulletin(pd.DataFrame({"TIME_ARRIV": [], "ARID": []}), 3600, 600) == []
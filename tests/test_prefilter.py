@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+from randl_client import Randl
+from randl_client.prefilter import BulletinFilter, travel_time_bounds
+
+
+def distance(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    cos = np.sin(lat1) * np.sin(lat2) + np.cos(lat1) * np.cos(lat2) * np.cos(lon1 - lon2)
+    return np.degrees(np.arccos(np.clip(cos, -1, 1)))
+
+
+# Events recorded by 150 stations at P travel times inside the IASP91 bounds,
+# one event every 5 minutes
+def physical_bulletin(n_events=20, n_stations=150, seed=0):
+    rng = np.random.default_rng(seed)
+    sta_lat, sta_lon = rng.uniform(-70, 70, n_stations), rng.uniform(-180, 180, n_stations)
+    ev_lat, ev_lon = rng.uniform(-60, 60, n_events), rng.uniform(-180, 180, n_events)
+    ev_time = pd.Timestamp("2024-05-01") + pd.to_timedelta(np.arange(n_events) * 300.0, unit="s")
+    event = np.repeat(np.arange(n_events), n_stations)
+    sta = np.tile(np.arange(n_stations), n_events)
+    early, late = travel_time_bounds(distance(ev_lat[event], ev_lon[event], sta_lat[sta], sta_lon[sta]))
+    tt = early + rng.uniform(0, 1, len(event)) * (late - early)
+    b = pd.DataFrame({"STA": ["ST%03d" % s for s in sta], "LAT_STA": sta_lat[sta], "LON_STA": sta_lon[sta],
+                      "TIME_ARRIV": (ev_time[event] + pd.to_timedelta(tt, unit="s")).astype(str),
+                      "ARID": np.arange(len(event)), "EVENT": event})
+    return b.sort_values("TIME_ARRIV").reset_index(drop=True), ev_lat, ev_lon, ev_time
+
+
+def offset(lat, lon, degrees, azimuth):
+    lat, lon, d, a = map(np.radians, (lat, lon, degrees, azimuth))
+    new_lat = np.arcsin(np.sin(lat) * np.cos(d) + np.cos(lat) * np.sin(d) * np.cos(a))
+    new_lon = lon + np.arctan2(np.sin(a) * np.sin(d) * np.cos(lat), np.cos(d) - np.sin(lat) * np.sin(new_lat))
+    return np.degrees(new_lat), np.degrees(new_lon)
+
+
+# What a travel time octree can associate to an event is its arrivals that fit
+# a P travel time from the event. With the event within the prefilter's radius
+# and margin of the beam, the envelope has to keep all of them.
+def test_envelope_keeps_every_travel_time_consistent_arrival():
+    bulletin, ev_lat, ev_lon, ev_time = physical_bulletin()
+    index = BulletinFilter(bulletin)
+    rng = np.random.default_rng(1)
+    for e in range(len(ev_lat)):
+        beam_lat, beam_lon = offset(ev_lat[e], ev_lon[e], rng.uniform(0, 10), rng.uniform(0, 360))
+        beam_time = ev_time[e] + pd.Timedelta(seconds=rng.uniform(-120, 120))
+        subset = index.subset(beam_lat, beam_lon, beam_time, 1800, margin=120.0, radius=10.0)
+        assert set(bulletin.ARID[bulletin.EVENT == e]) <= set(subset.ARID)
+        assert len(subset) < len(bulletin)
+
+
+# Every other arrival time on a whole second and written without fractional
+# seconds, next to the same times written in full
+def test_mixed_precision_times_filter_the_same():
+    bulletin, ev_lat, ev_lon, ev_time = physical_bulletin(n_events=5)
+    times = pd.to_datetime(bulletin.TIME_ARRIV)
+    times = times.where(bulletin.index % 2 == 0, times.dt.floor("s"))
+    full = bulletin.assign(TIME_ARRIV=times.dt.strftime('%Y-%m-%d %H:%M:%S.%f'))
+    mixed = bulletin.assign(TIME_ARRIV=[t.strftime('%Y-%m-%d %H:%M:%S' if i % 2 else '%Y-%m-%d %H:%M:%S.%f')
+                                        for i, t in enumerate(times)])
+    full_index, mixed_index = BulletinFilter(full), BulletinFilter(mixed)
+    for e in range(len(ev_lat)):
+        subset = mixed_index.subset(ev_lat[e], ev_lon[e], ev_time[e], 1800)
+        assert list(subset.ARID) == list(full_index.subset(ev_lat[e], ev_lon[e], ev_time[e], 1800).ARID)
+        assert set(mixed.ARID[mixed.EVENT == e]) <= set(subset.ARID)
+
+
+def test_refinement_without_beam_columns_sends_whole_bulletin(capsys):
+    bulletin = physical_bulletin(n_events=2)[0]
+    client = Randl()
+    client.set_octree_prefilter(True)
+    origins = pd.DataFrame({"Window_start": ["2024-05-01 00:00:00"], "Window_end": ["2024-05-01 00:30:00"]})
+    endpoint, req = client._octree_bulletin_refinement_request(bulletin, origins)
+    assert req["bulletin"] is bulletin
+    assert "Missing expected beamsearch" in capsys.readouterr().out
@@ -0,0 +1,145 @@
+import contextlib
+import io
+import time
+import pytest
+import mock_server
+from randl_client import (Randl, RandlHTTPError, RandlConnectionError, RandlTimeoutError, RandlDeadlineError)
+
+
+# A mock server injecting faults (see mock_server.py --fault) and a client of
+# it with short backoffs
+@contextlib.contextmanager
+def faulty(*args):
+    process, url = mock_server.start(args=list(args))
+    client = Randl()
+    client.url_base = url
+    client.enable_metrics()
+    client.set_backoff(0.01, max_backoff=0.05)
+    try:
+        yield client
+    finally:
+        client.transport.close()
+        process.terminate()
+        process.wait()
+
+
+def attempts(client):
+    return list(client.transport.metrics.frame().attempts)
+
+
+def test_overload_is_retried_after_retry_after():
+    with faulty("--fault", "taup_surrogate=503x2", "--retry-after", "0.1") as client:
+        t = time.monotonic()
+        assert client.taup_surrogate([[3.0, 4.0]]) == [[5.0]]
+        assert time.monotonic() - t >= 0.2
+        assert attempts(client) == [3]
+        assert client.transport.breaker.state == "closed"
+
+
+def test_retries_run_out_as_http_error():
+    with faulty("--fault", "taup_surrogate=500") as client:
+        client.set_max_attempts(3)
+        with pytest.raises(RandlHTTPError) as e:
+            client.taup_surrogate([[1.0]])
+        assert e.value.status == 500
+        assert e.value.attempts == 3
+        assert e.value.endpoint == "taup_surrogate"
+
+
+def test_client_errors_are_not_retried():
+    with faulty("--fault", "taup_surrogate=400x1") as client:
+        with pytest.raises(RandlHTTPError) as e:
+            client.taup_surrogate([[1.0]])
+        assert e.value.status == 400
+        assert e.value.attempts == 1
+        assert client.taup_surrogate([[1.0]]) == [[1.0]]
+        # a refused request isn't an overload
+        assert client.transport.breaker.failures == 0
+
+
+def test_dropped_connections_are_retried_then_raised():
+    with faulty("--fault", "taup_surrogate=dropx2", "--fault", "baz_surrogate=drop") as client:
+        assert client.taup_surrogate([[1.0]]) == [[1.0]]
+        assert attempts(client) == [3]
+        with pytest.raises(RandlConnectionError) as e:
+            client.baz_surrogate([[1.0]])
+        assert not isinstance(e.value, RandlHTTPError)
+        assert e.value.attempts == 3
+        assert e.value.sent
+
+
+def test_stalls_past_the_read_timeout_raise_timeout_error():
+    with faulty("--fault", "taup_surrogate=stall", "--stall-ms", "500") as client:
+        client.set_timeout("taup_surrogate", (1, 0.1))
+        client.set_max_attempts(2)
+        with pytest.raises(RandlTimeoutError) as e:
+            client.taup_surrogate([[1.0]])
+        assert isinstance(e.value, RandlConnectionError)
+        assert e.value.attempts == 2
+
+
+def test_deadline_bounds_retries_and_waits():
+    with faulty("--fault", "taup_surrogate=503", "--retry-after", "0.2") as client:
+        client.set_max_attempts(10)
+        client.set_deadline(0.5)
+        t = time.monotonic()
+        with pytest.raises(RandlDeadlineError) as e:
+            client.taup_surrogate([[1.0]])
+        assert time.monotonic() - t < 0.5
+        assert 1 <= e.value.attempts < 10
+        assert isinstance(e.value.last_error, RandlHTTPError) and e.value.last_error.status == 503
+
+
+def test_circuit_breaker_opens_probes_and_closes():
+    with faulty("--fault", "taup_surrogate=500") as client:
+        client.set_max_attempts(1)
+        client.set_circuit_breaker(failure_threshold=2, reset_timeout=0.3)
+        breaker = client.transport.breaker
+        for _ in range(2):
+            with pytest.raises(RandlHTTPError):
+                client.taup_surrogate([[1.0]])
+        assert breaker.state == "open"
+        assert breaker.opened == 1
+
+        # requests wait for the reset timeout, then one goes out as the probe;
+        # its success closes the circuit
+        t = time.monotonic()
+        assert client.baz_surrogate([[1.0]]) == [[1.0]]
+        assert time.monotonic() - t >= 0.2
+        assert breaker.state == "closed"
+
+        # a failed probe opens it again
+        for _ in range(2):
+            with pytest.raises(RandlHTTPError):
+                client.taup_surrogate([[1.0]])
+        time.sleep(0.35)
+        assert breaker.state == "half-open"
+        with pytest.raises(RandlHTTPError):
+            client.taup_surrogate([[1.0]])
+        assert breaker.state == "open"
+        assert breaker.opened == 3
+        assert not breaker.probing
+
+
+def associate(client):
+    client.set_bulletin_n_events(2)
+    bulletin = client.create_bulletin()
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        origins = client.associate_bulletin(bulletin, verbose=False, metrics_report=False)
+    return origins, out.getvalue()
+
+
+# An octree search the server turns down skips its window; one failing with
+# a server error ends the run
+def test_refused_octree_search_skips_the_window():
+    with faulty() as client:
+        found, _ = associate(client)
+    with faulty("--fault", "octree_search=400x1") as client:
+        origins, out = associate(client)
+    assert "no octree result" in out
+    assert 0 < len(origins) < len(found)
+    with faulty("--fault", "octree_search=500") as client:
+        client.set_max_attempts(2)
+        with pytest.raises(RandlHTTPError):
+            associate(client)
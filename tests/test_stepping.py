@@ -0,0 +1,47 @@
+import contextlib
+import io
+import pandas as pd
+import pytest
+from randl_client import Randl
+
+
+# 12 mock events in 6 hours, so windows overlap several events
+@pytest.fixture(scope="module")
+def client(mock_url):
+    client = Randl()
+    client.url_base = mock_url
+    client.set_bulletin_n_events(12)
+    client.set_bulletin_start("2024-05-01T00:00:00")
+    client.set_bulletin_end("2024-05-01T06:00:00")
+    return client
+
+
+@pytest.fixture(scope="module")
+def bulletin(client):
+    return client.create_bulletin()
+
+
+def associate(client, bulletin, stepping):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return client.associate_bulletin(bulletin.copy(), stepping=stepping, verbose=False, metrics_report=False)
+
+
+# Every other arrival time on a whole second and written without fractional seconds
+def mixed_precision(bulletin):
+    times = pd.to_datetime(bulletin.TIME_ARRIV.astype(str))
+    return bulletin.assign(TIME_ARRIV=[t.floor("s").strftime('%Y-%m-%d %H:%M:%S') if i % 2 else
+                                       t.strftime('%Y-%m-%d %H:%M:%S.%f') for i, t in enumerate(times)])
+
+
+def test_density_stepping_finds_the_fixed_origins(client, bulletin):
+    fixed = associate(client, bulletin, 'fixed')
+    assert len(fixed) > 1
+    pd.testing.assert_frame_equal(associate(client, bulletin, 'density'), fixed)
+
+
+def test_density_stepping_on_mixed_precision_times(client, bulletin):
+    bulletin = mixed_precision(bulletin)
+    fixed = associate(client, bulletin, 'fixed')
+    assert len(fixed) > 1
+    pd.testing.assert_frame_equal(associate(client, bulletin, 'density'), fixed)
+    assert len(associate(client, bulletin, 'peaks')) > 0
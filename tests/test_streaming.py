@@ -0,0 +1,68 @@
+import asyncio
+import contextlib
+import io
+import numpy as np
+import pandas as pd
+import pytest
+from randl_client import Randl
+from randl_client.compact import parse_times
+from randl_client.randl_client import origin_columns
+from randl_client.streaming import StreamingAssociator
+
+
+# 6 mock events over a day, 3 of them less than an hour apart
+@pytest.fixture(scope="module")
+def client(mock_url):
+    client = Randl()
+    client.url_base = mock_url
+    client.set_bulletin_n_events(6)
+    client.set_bulletin_start("2024-05-01T00:00:00")
+    client.set_bulletin_end("2024-05-02T00:00:00")
+    return client
+
+
+@pytest.fixture(scope="module")
+def bulletin(client):
+    return client.create_bulletin()
+
+
+@pytest.fixture(scope="module")
+def batch_origins(client, bulletin):
+    with contextlib.redirect_stdout(io.StringIO()):
+        origins = client.associate_bulletin(bulletin.copy(), verbose=False, metrics_report=False)
+    assert len(origins) > 1
+    return origins
+
+
+# The bulletin in time order, cut into batches of `minutes` of arrivals
+def batches(bulletin, minutes):
+    times = parse_times(bulletin.TIME_ARRIV)
+    ordered = bulletin.iloc[np.argsort(times.to_numpy(), kind='stable')]
+    key = times.iloc[np.argsort(times.to_numpy(), kind='stable')].dt.floor("%dmin" % minutes).to_numpy()
+    return [b for _, b in ordered.groupby(key, sort=True)]
+
+
+def frame(origins):
+    return pd.DataFrame(origins, columns=origin_columns)
+
+
+@pytest.mark.parametrize("minutes, local_windowing", [(10, False), (60, True), (24 * 60, False)])
+def test_stream_finds_the_batch_origins(client, bulletin, batch_origins, minutes, local_windowing):
+    with contextlib.redirect_stdout(io.StringIO()):
+        origins = list(client.associate_stream(batches(bulletin, minutes), verbose=False,
+                                               local_windowing=local_windowing))
+    pd.testing.assert_frame_equal(frame(origins), batch_origins)
+
+
+def test_async_stream_finds_the_batch_origins(client, bulletin, batch_origins):
+    async def feed():
+        for batch in batches(bulletin, 30):
+            yield batch
+
+    async def collect():
+        associator = StreamingAssociator(client, verbose=False)
+        return [origin async for origin in associator.astream(feed())]
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        origins = asyncio.run(collect())
+    pd.testing.assert_frame_equal(frame(origins), batch_origins)
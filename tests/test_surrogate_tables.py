@@ -0,0 +1,64 @@
+import glob
+import json
+import os
+import numpy as np
+import pytest
+from randl_client import Randl
+from randl_client.surrogate_tables import SurrogateTable
+import record_responses
+
+# How far a table's answer may be from the server's, as use_surrogate_tables
+# allows by default (seconds scaled to [-1, 1] for taup, unit vector
+# components for baz)
+tolerance = 1e-3
+
+# Surrogate answers and tables recorded from real servers by
+# benchmarks/record_responses.py
+fixtures = os.path.join(os.path.dirname(__file__), "fixtures", "surrogates")
+recordings = sorted(glob.glob(os.path.join(fixtures, "*.json")))
+
+
+# (share of the rows the table answers at the tolerance, largest difference
+# from the recorded answer among them) per endpoint
+def table_errors(recording, table_directory):
+    rows = np.asarray(recording["rows"])
+    errors = {}
+    for endpoint, recorded in recording["endpoints"].items():
+        table = SurrogateTable.load(os.path.join(table_directory, recorded["table"]))
+        assert table.version == recording["version"]
+        out, ok = table.lookup(rows, tolerance)
+        expected = np.asarray(recorded["outputs"]).reshape(len(rows), -1)
+        errors[endpoint] = float(ok.mean()), float(np.abs(out[ok] - expected[ok]).max()) if ok.any() else np.inf
+    return errors
+
+
+@pytest.mark.skipif(not recordings, reason="no recorded surrogate answers in tests/fixtures/surrogates; "
+                                          "record them with benchmarks/record_responses.py")
+@pytest.mark.parametrize("path", recordings or [None])
+def test_tables_match_recorded_server(path):
+    with open(path) as f:
+        recording = json.load(f)
+    for endpoint, (share, error) in table_errors(recording, os.path.join(fixtures, "tables")).items():
+        assert share > 0, endpoint
+        assert error <= tolerance, (recording["version"], endpoint, error)
+
+
+# The recorder and the comparison, run against the mock server on a coarse
+# grid. The mock's surrogates don't depend on the geometry alone, so its
+# tables must not pass.
+def test_recording_round_trip(mock_url, tmp_path):
+    client = Randl()
+    client.url_base = mock_url
+    grid = {"distance": (0.0, 180.0, 45.0), "depth": (0.0, 700.0, 350.0), "azimuth": (0.0, 360.0, 90.0),
+            "elevation": (-1.0, 5.0, 6.0)}
+    recording = record_responses.record_surrogates(client, str(tmp_path), n_rows=200,
+                                                   grids={"taup_surrogate": grid, "baz_surrogate": grid})
+    recording = json.loads(json.dumps(recording))
+    rows = np.asarray(recording["rows"])
+    assert rows.shape == (200, 6)
+    for recorded in recording["endpoints"].values():
+        np.testing.assert_allclose(recorded["outputs"], np.sqrt((rows ** 2).sum(axis=1, keepdims=True)))
+    errors = table_errors(recording, str(tmp_path))
+    assert set(errors) == {"taup_surrogate", "baz_surrogate"}
+    for share, error in errors.values():
+        assert share == 0 or error > tolerance
@@ -0,0 +1,147 @@
+import contextlib
+import glob
+import io
+import json
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from randl_client import Randl
+from randl_client.windowing import WindowIndex, arrival_start_times, next_start_index
+import record_responses
+
+# /window answers recorded from real servers by benchmarks/record_responses.py
+recordings = sorted(glob.glob(os.path.join(os.path.dirname(__file__), "fixtures", "window", "*.json")))
+
+
+@pytest.fixture(scope="module")
+def client(mock_url):
+    client = Randl()
+    client.url_base = mock_url
+    client.set_bulletin_n_events(4)
+    return client
+
+
+# A mock bulletin, shuffled so both sides have to sort it
+@pytest.fixture(scope="module")
+def bulletin(client):
+    return client.create_bulletin().sample(frac=1, random_state=0).reset_index(drop=True)
+
+
+def window_config(client, start, length=1800, min_phases=5):
+    return client.config.override(window={"start": pd.Timestamp(start).strftime('%Y-%m-%d %H:%M:%S.%f'),
+                                          "length": length, "min_phases": min_phases})
+
+
+def assert_same_window(client, bulletin, index, config):
+    remote = client.window_catalog(bulletin, config)
+    local = client.window_catalog_local(index, config=config)
+    assert list(local.ARID) == list(remote.ARID)
+    return local
+
+
+def test_windows_match_server(client, bulletin):
+    index = WindowIndex(bulletin)
+    start_times = arrival_start_times(bulletin)
+    non_empty = 0
+    for start in start_times[::7]:
+        non_empty += len(assert_same_window(client, bulletin, index, window_config(client, start))) > 0
+    assert non_empty > 0
+
+
+# The last start time's window holds just the final arrivals; past the end and
+# before the first arrival there is nothing
+def test_last_and_out_of_range_windows_match_server(client, bulletin):
+    index = WindowIndex(bulletin)
+    start_times = arrival_start_times(bulletin)
+    last = pd.Timestamp(start_times[-1])
+    for min_phases in (0, 1, 5):
+        window = assert_same_window(client, bulletin, index, window_config(client, last, min_phases=min_phases))
+        assert len(window) == (0 if min_phases > 1 else 1)
+    for start in (last + pd.Timedelta(seconds=1), pd.Timestamp(start_times[0]) - pd.Timedelta(days=1)):
+        assert len(assert_same_window(client, bulletin, index, window_config(client, start, min_phases=0))) == 0
+
+
+# Windows in the gap between two events, and windows with fewer arrivals than
+# min_phases, come back empty on both sides
+def test_empty_windows_match_server(client, bulletin):
+    index = WindowIndex(bulletin)
+    start_times = arrival_start_times(bulletin)
+    gaps = np.diff(start_times)
+    widest = int(np.argmax(gaps))
+    assert gaps[widest] > np.timedelta64(3600, 's')
+    gap_start = pd.Timestamp(start_times[widest]) + pd.Timedelta(seconds=1)
+    assert len(assert_same_window(client, bulletin, index, window_config(client, gap_start, length=600))) == 0
+    first = pd.Timestamp(start_times[0])
+    full = assert_same_window(client, bulletin, index, window_config(client, first, min_phases=0))
+    assert len(full) > 0
+    assert len(assert_same_window(client, bulletin, index,
+                                  window_config(client, first, min_phases=len(full) + 1))) == 0
+    window = assert_same_window(client, bulletin, index, window_config(client, first, min_phases=len(full)))
+    assert len(window) == len(full)
+
+
+# Arrival times written with and without fractional seconds, as the server
+# accepts them
+def test_mixed_precision_times_match_server(client, bulletin):
+    mixed = record_responses.mixed_precision(bulletin)
+    index = WindowIndex(mixed)
+    for start in arrival_start_times(mixed)[::11]:
+        assert_same_window(client, mixed, index, window_config(client, start))
+
+
+# Local windows for every recorded request. The request carries no associated
+# ARIDs, so with exclude_associated_phases the server has nothing the client
+# knows of to exclude and the local window takes none out either.
+def assert_matches_recording(recording):
+    client = Randl()
+    for name, stored in recording["bulletins"].items():
+        index = WindowIndex(record_responses.json_frame(stored))
+        for case in recording["windows"][name]:
+            local = client.window_catalog_local(index, config=client.config.override(window=case["window"]))
+            assert [int(a) for a in local.ARID] == case["arids"], (recording["version"], name, case["window"])
+
+
+@pytest.mark.skipif(not recordings, reason="no recorded /window answers in tests/fixtures/window; "
+                                          "record them with benchmarks/record_responses.py")
+@pytest.mark.parametrize("path", recordings or [None])
+def test_windows_match_recorded_server(path):
+    with open(path) as f:
+        assert_matches_recording(json.load(f))
+
+
+# The recorder and the comparison, run against the mock server
+def test_recording_round_trip(client):
+    recording = json.loads(json.dumps(record_responses.record_window(client)))
+    windows = recording["windows"]["mixed"]
+    assert any(len(w["arids"]) > 0 for w in windows)
+    assert any(len(w["arids"]) == 0 for w in windows)
+    assert {w["window"]["exclude_associated_phases"] for w in windows} == {False, True}
+    assert_matches_recording(recording)
+
+
+def test_next_start_index_steps_forward_and_stops_at_the_last():
+    start_times = pd.to_datetime(["2024-05-01 00:00:00.0", "2024-05-01 00:05:00.0", "2024-05-01 00:05:00.5",
+                                  "2024-05-01 01:00:00.0"]).to_numpy(dtype='datetime64[ns]')
+    # first start time at or after the target
+    assert next_start_index(start_times, 0, "2024-05-01 00:05:00") == 1
+    assert next_start_index(start_times, 0, "2024-05-01 00:05:00.1") == 2
+    assert next_start_index(start_times, 0, "2024-05-01 00:12:00") == 3
+    # never behind start_index
+    assert next_start_index(start_times, 2, "2024-05-01 00:00:00") == 2
+    # past the end it stays on the last start time
+    assert next_start_index(start_times, 0, "2024-05-02 00:00:00") == 3
+    assert next_start_index(start_times, 3, "2024-05-02 00:00:00") == 3
+
+
+def associate(client, bulletin, local_windowing):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return client.associate_bulletin(bulletin, local_windowing=local_windowing, verbose=False,
+                                         metrics_report=False)
+
+
+def test_local_windowing_finds_the_same_origins(client, bulletin):
+    remote = associate(client, bulletin, False)
+    local = associate(client, bulletin, True)
+    assert len(remote) > 0
+    pd.testing.assert_frame_equal(local, remote)